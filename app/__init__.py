@@ -12,6 +12,7 @@ from app.twin_api import twin_api_bp
 from app.payroll_api import payroll_api_bp
 from app.config_api import config_api_bp
 from app.analytics_api import analytics_api_bp
+from app.services.payroll_run_service import run_payroll_run_worker, start_payroll_run_worker
 
 
 def create_app(config_name: str = "default") -> Flask:
@@ -30,4 +31,14 @@ def create_app(config_name: str = "default") -> Flask:
     app.register_blueprint(config_api_bp, url_prefix="/api")
     app.register_blueprint(analytics_api_bp, url_prefix="/api")
 
+    # 按配置在 Web 进程内启动后台工资单任务 worker（多进程部署时各进程均可认领，靠数据库行级认领互斥）
+    poll_interval = app.config.get("PAYROLL_RUN_POLL_INTERVAL", 2.0)
+    if app.config.get("PAYROLL_RUN_WORKER"):
+        start_payroll_run_worker(db_path, poll_interval=poll_interval)
+
+    @app.cli.command("payroll-worker")
+    def payroll_worker_command():
+        """在前台运行工资单任务 worker（独立进程，Ctrl+C 退出）"""
+        run_payroll_run_worker(db_path, poll_interval=poll_interval)
+
     return app
@@ -3,11 +3,26 @@
 """
 from __future__ import annotations
 
+import os
 import sqlite3
+import threading
+import time
 from datetime import date
+from urllib.parse import urlencode
 
 from flask import Blueprint, current_app, jsonify, request
 
+from app.analytics_backend import (
+    ANALYTICS_BACKENDS,
+    duckdb_available,
+    duckdb_cursor,
+    duckdb_unavailable_reason,
+)
+from app.daos.analytics_cache_dao import AnalyticsCacheDAO, get_cached_payload
+from app.daos.twins.change_dao import twin_change_token
+from app.periods import parse_month
+from app.singleflight import SingleFlight
+
 analytics_api_bp = Blueprint("analytics_api", __name__)
 
 
@@ -18,384 +33,900 @@ def _get_conn() -> sqlite3.Connection:
     return conn
 
 
+# 分析结果依赖的 Twin：其中任一类型有写入即令缓存失效
+ANALYTICS_SOURCE_TWINS = (
+    "payment_item",
+    "client_contract",
+    "internal_project",
+    "internal_project_payment",
+    "person_company_employment",
+    "person_company_payroll",
+    "person_payment_participation",
+)
+
+
+class _CacheStats:
+    """结果缓存命中统计（进程内，按接口）：hits / misses / coalesced（共享在途请求的结果）"""
+
+    _FIELDS = {"HIT": "hits", "MISS": "misses", "COALESCED": "coalesced"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_endpoint: dict = {}
+
+    def record(self, endpoint: str, source: str) -> None:
+        with self._lock:
+            entry = self._by_endpoint.setdefault(endpoint, {"hits": 0, "misses": 0, "coalesced": 0})
+            entry[self._FIELDS[source]] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            by_endpoint = {k: dict(v) for k, v in sorted(self._by_endpoint.items())}
+        hits = sum(v["hits"] for v in by_endpoint.values())
+        misses = sum(v["misses"] for v in by_endpoint.values())
+        coalesced = sum(v["coalesced"] for v in by_endpoint.values())
+        served = hits + misses + coalesced
+        return {
+            "hits": hits,
+            "misses": misses,
+            "coalesced": coalesced,
+            "hit_rate": round((hits + coalesced) / served, 4) if served else 0,
+            "by_endpoint": by_endpoint,
+        }
+
+
+_cache_stats = _CacheStats()
+_analytics_flights = SingleFlight()
+
+
+# 各接口参与计算的查询参数：只有这些参数（规范化后）传给区块函数并进入缓存键，其余参数忽略，
+# 附加无关参数不会产生新的缓存行。backend 不影响结果，不在其中
+_RECEIVABLE_TREND_PARAMS = ("months", "from", "to", "granularity", "client_company", "project_id")
+_PAYROLL_TREND_PARAMS = ("months", "from", "to", "granularity", "company_id")
+_PAYROLL_PERIOD_PARAMS = ("period", "from", "to", "granularity", "company_id")
+_PAYROLL_DISTRIBUTION_PARAMS = _PAYROLL_PERIOD_PARAMS + ("metric", "bins")
+_DASHBOARD_PARAMS = ("sections", "trend_months", "forecast_months", "granularity", "client_company", "project_id")
+_DASHBOARD_SECTION_FILTERS = ("granularity", "client_company", "project_id")
+
+# 整数参数：规范为十进制写法（07 与 7 共用缓存行）；无法解析的原样保留，由区块函数报 400
+_INT_PARAMS = {"months", "bins", "company_id", "project_id", "trend_months", "forecast_months"}
+
+# 只对本次计算有意义的响应字段，不写入缓存（命中缓存时不返回）
+_UNCACHED_FIELDS = ("timings_ms",)
+
+
+def _request_args(params) -> dict:
+    """请求中 params 白名单内的非空参数：去除首尾空白，整数参数规范化"""
+    args = {}
+    for name in params:
+        value = (request.args.get(name) or "").strip()
+        if not value:
+            continue
+        if name in _INT_PARAMS:
+            try:
+                value = str(int(value))
+            except ValueError:
+                pass
+        args[name] = value
+    return args
+
+
+def _cache_key(endpoint: str, args: dict) -> str:
+    """缓存键：日期 + 接口 + 排序后的白名单参数"""
+    return f"{date.today().isoformat()}|{endpoint}?{urlencode(sorted(args.items()))}"
+
+
 def _month_offset(base: date, offset: int) -> str:
     """返回 base 日期偏移 offset 个月后的 YYYY-MM 字符串（offset 可负）"""
     total = base.year * 12 + base.month - 1 + offset
     return f"{total // 12:04d}-{total % 12 + 1:02d}"
 
 
-# ---- 公共 CTE：各实体最新状态 ----
-_LATEST_PAYMENT_ITEMS = """
-WITH latest_pi AS (
-    SELECT pi.id,
-           CAST(json_extract(h.data, '$.client_contract_id') AS INTEGER) AS client_contract_id,
-           json_extract(h.data, '$.period')               AS period,
-           CAST(json_extract(h.data, '$.amount') AS REAL)  AS amount,
-           json_extract(h.data, '$.status')                AS status,
-           json_extract(h.data, '$.planned_payment_date')  AS planned_payment_date,
-           json_extract(h.data, '$.actual_payment_date')   AS actual_payment_date
-    FROM payment_items pi
-    JOIN payment_item_history h ON h.twin_id = pi.id
-    WHERE h.version = (
-        SELECT MAX(v.version) FROM payment_item_history v WHERE v.twin_id = pi.id
-    )
-)
-"""
+# 趋势类接口支持的时间粒度
+GRANULARITIES = ("month", "quarter", "year")
+
+# from / to 最多跨越的月数
+MAX_RANGE_MONTHS = 240
+
 
-_LATEST_CONTRACTS = """
-WITH latest_cc AS (
-    SELECT cc.id,
-           json_extract(h.data, '$.contract_name')                 AS contract_name,
-           json_extract(h.data, '$.client_company')                AS client_company,
-           CAST(json_extract(h.data, '$.contract_amount') AS REAL) AS contract_amount,
-           json_extract(h.data, '$.status')                        AS status
-    FROM client_contracts cc
-    JOIN client_contract_history h ON h.twin_id = cc.id
-    WHERE h.version = (
-        SELECT MAX(v.version) FROM client_contract_history v WHERE v.twin_id = cc.id
+def _month_label(month: str, granularity: str) -> str:
+    """YYYY-MM 所在时间桶的标签：month -> YYYY-MM，quarter -> YYYY-Qn，year -> YYYY"""
+    if granularity == "quarter":
+        return f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}"
+    if granularity == "year":
+        return month[:4]
+    return month
+
+
+def _month_range_args(args, default_from: str, default_to: str):
+    """
+    读取 from / to（YYYY-MM，默认沿用 months 参数推出的区间）与 granularity，
+    返回 (区间内的月份列表, 粒度, 时间桶标签列表)；季 / 年桶只含区间内的月份
+    """
+    granularity = args.get("granularity", "month")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity 仅支持: {', '.join(GRANULARITIES)}")
+    start = parse_month(args.get("from") or default_from)
+    end = parse_month(args.get("to") or default_to)
+    if end < start:
+        raise ValueError("to 不能早于 from")
+    if end - start + 1 > MAX_RANGE_MONTHS:
+        raise ValueError(f"区间不能超过 {MAX_RANGE_MONTHS} 个月")
+    month_list = [f"{total // 12:04d}-{total % 12 + 1:02d}" for total in range(start, end + 1)]
+    labels = list(dict.fromkeys(_month_label(m, granularity) for m in month_list))
+    return month_list, granularity, labels
+
+
+def _rollup_totals(cur, args, basis: str, month_list, granularity: str, status: str = None) -> dict:
+    """
+    从应收汇总 rollup_receivable 按时间桶求和 {标签: 金额}。
+    可选过滤 client_company / project_id（args 中的参数），与 status 一起作用于汇总维度。
+    """
+    conditions = ["basis = ?", "month BETWEEN ? AND ?"]
+    params = [basis, month_list[0], month_list[-1]]
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if args.get("client_company"):
+        conditions.append("client_company = ?")
+        params.append(args["client_company"])
+    if args.get("project_id"):
+        conditions.append("internal_project_id = ?")
+        params.append(int(args["project_id"]))
+    cur.execute(f"""
+        SELECT month, SUM(amount) FROM rollup_receivable
+        WHERE {' AND '.join(conditions)}
+        GROUP BY month
+    """, params)
+    totals: dict = {}
+    for month, amount in cur.fetchall():
+        label = _month_label(month, granularity)
+        totals[label] = totals.get(label, 0) + (amount or 0)
+    return totals
+
+
+# ---- 数据来源：分析事实表 ----
+# 各 Twin 的最新状态由 schema 中的 fact_table 声明、随状态追加在同一事务内维护（见 app/daos/twins/fact_dao.py）：
+#   fact_payment_item(twin_id, client_contract_id, period, amount, status, planned_payment_date, actual_payment_date)
+#   fact_client_contract(twin_id, contract_name, client_company, contract_amount, status)
+#   fact_internal_project(twin_id, name, status, project_manager)
+#   fact_employment(twin_id, person_id, company_id, salary, department)
+#   fact_payroll(twin_id, time_key, person_id, company_id, status, base_amount, social_deduction_total, tax_monthly, total_amount, ...)
+#     每张工资单一行，time_key 为薪资期数 YYYY-MM
+#   fact_payment_participation(twin_id, person_id, payment_item_id, start_date, end_date)
+#   fact_labor_allocation(participation_id, month, person_id, payment_item_id, days, month_days, monthly_cost, cost, source)
+#     参与按月分摊的人力成本（见 app/daos/twins/labor_dao.py）
+# 收款趋势 / 现金流预测读取按 (口径, 月份, 状态, 客户, 内部项目) 预聚合的 rollup_receivable
+# （随款项、合同、项目关联变化增量维护，见 app/daos/twins/rollup_dao.py）
+
+# ---- 各分析区块：(cursor, 请求参数) -> data；单独接口与 dashboard 共用 ----
+
+def _overview_section(cur, args) -> dict:
+    """应收账款概览 KPI"""
+    today = date.today().isoformat()
+    cur.execute("""
+        SELECT COALESCE(SUM(contract_amount), 0) FROM fact_client_contract
+    """)
+    total_contract_amount = cur.fetchone()[0] or 0
+
+    cur.execute("""
+        SELECT
+            COALESCE(SUM(amount), 0) AS total,
+            COALESCE(SUM(CASE WHEN status = '已付款' THEN amount ELSE 0 END), 0) AS collected,
+            COALESCE(SUM(CASE WHEN status = '待付款' THEN amount ELSE 0 END), 0) AS pending,
+            COALESCE(SUM(CASE WHEN status = '待付款'
+                               AND planned_payment_date IS NOT NULL
+                               AND planned_payment_date < ? THEN amount ELSE 0 END), 0) AS overdue,
+            COUNT(CASE WHEN status = '待付款'
+                        AND planned_payment_date IS NOT NULL
+                        AND planned_payment_date < ? THEN 1 END) AS overdue_count
+        FROM fact_payment_item
+    """, (today, today))
+    row = cur.fetchone()
+
+    return {
+        "total_contract_amount": round(total_contract_amount, 2),
+        "total_payment_amount":  round(row[0], 2),
+        "collected_amount":      round(row[1], 2),
+        "pending_amount":        round(row[2], 2),
+        "overdue_amount":        round(row[3], 2),
+        "overdue_count":         row[4],
+    }
+
+
+def _collection_trend_section(cur, args) -> dict:
+    """收款趋势（计划 vs 实收）"""
+    months = int(args.get("months", 12))
+    today = date.today()
+    month_list, granularity, labels = _month_range_args(
+        args, _month_offset(today, -(months - 1)), _month_offset(today, 0)
     )
-)
-"""
+    collected_map = _rollup_totals(cur, args, "actual", month_list, granularity, status="已付款")
+    planned_map = _rollup_totals(cur, args, "planned", month_list, granularity)
+
+    return {
+        "granularity": granularity,
+        "months":    labels,
+        "collected": [round(collected_map.get(m, 0), 2) for m in labels],
+        "planned":   [round(planned_map.get(m, 0), 2)   for m in labels],
+    }
+
 
-_LATEST_PROJECTS = """
-WITH latest_ip AS (
-    SELECT ip.id,
-           json_extract(h.data, '$.name')            AS name,
-           json_extract(h.data, '$.status')          AS status,
-           json_extract(h.data, '$.project_manager') AS project_manager
-    FROM internal_projects ip
-    JOIN internal_project_history h ON h.twin_id = ip.id
-    WHERE h.version = (
-        SELECT MAX(v.version) FROM internal_project_history v WHERE v.twin_id = ip.id
+def _cashflow_forecast_section(cur, args) -> dict:
+    """现金流预测（待付款项按 planned_payment_date）"""
+    months = int(args.get("months", 6))
+    today = date.today()
+    month_list, granularity, labels = _month_range_args(
+        args, _month_offset(today, 0), _month_offset(today, months - 1)
     )
+    forecast_map = _rollup_totals(cur, args, "planned", month_list, granularity, status="待付款")
+
+    return {
+        "granularity": granularity,
+        "months":   labels,
+        "expected": [round(forecast_map.get(m, 0), 2) for m in labels],
+    }
+
+
+def _clients_section(cur, args) -> list:
+    """客户维度分析（按 client_company 聚合）"""
+    cur.execute("""
+        SELECT
+            cc.client_company,
+            COUNT(DISTINCT cc.twin_id)                                               AS contract_count,
+            COALESCE(SUM(cc.contract_amount), 0)                                     AS contract_amount,
+            COALESCE(SUM(CASE WHEN pi.status = '已付款' THEN pi.amount ELSE 0 END), 0) AS collected,
+            COALESCE(SUM(CASE WHEN pi.status = '待付款' THEN pi.amount ELSE 0 END), 0) AS pending
+        FROM fact_client_contract cc
+        LEFT JOIN fact_payment_item pi ON pi.client_contract_id = cc.twin_id
+        WHERE cc.client_company IS NOT NULL AND cc.client_company != ''
+        GROUP BY cc.client_company
+        ORDER BY contract_amount DESC, cc.client_company
+    """)
+    rows = cur.fetchall()
+
+    data = []
+    for r in rows:
+        collected = r[3] or 0
+        pending = r[4] or 0
+        pi_total = collected + pending
+        data.append({
+            "client_company":   r[0],
+            "contract_count":   r[1],
+            "contract_amount":  round(r[2] or 0, 2),
+            "collected_amount": round(collected, 2),
+            "pending_amount":   round(pending, 2),
+            "collection_rate":  round(collected / pi_total, 4) if pi_total > 0 else 0,
+        })
+    return data
+
+
+def _project_profitability_section(cur, args) -> list:
+    """项目收益与人力成本对比
+    人力成本 = 参与按月分摊的成本之和（fact_labor_allocation：当月工资单应发金额或当月生效薪资 × 参与天数 / 当月天数）
+    """
+    cur.execute("""
+        WITH project_revenue AS (
+            SELECT ipa.internal_project_id,
+                   COALESCE(SUM(pi.amount), 0)                                              AS total_revenue,
+                   COALESCE(SUM(CASE WHEN pi.status='已付款' THEN pi.amount ELSE 0 END), 0) AS collected_revenue
+            FROM internal_project_payment_activities ipa
+            JOIN fact_payment_item pi ON pi.twin_id = ipa.payment_item_id
+            GROUP BY ipa.internal_project_id
+        ),
+        project_labor AS (
+            SELECT ipa.internal_project_id,
+                   COUNT(DISTINCT la.person_id) AS head_count,
+                   COALESCE(SUM(la.cost), 0)   AS labor_cost
+            FROM internal_project_payment_activities ipa
+            JOIN fact_labor_allocation la ON la.payment_item_id = ipa.payment_item_id
+            GROUP BY ipa.internal_project_id
+        )
+        SELECT
+            ip.twin_id,
+            ip.name,
+            ip.status,
+            ip.project_manager,
+            COALESCE(pr.total_revenue, 0)     AS total_revenue,
+            COALESCE(pr.collected_revenue, 0)  AS collected_revenue,
+            COALESCE(pl.labor_cost, 0)         AS labor_cost,
+            COALESCE(pl.head_count, 0)         AS head_count,
+            COALESCE(pr.total_revenue, 0) - COALESCE(pl.labor_cost, 0) AS gross_profit
+        FROM fact_internal_project ip
+        LEFT JOIN project_revenue pr ON pr.internal_project_id = ip.twin_id
+        LEFT JOIN project_labor   pl ON pl.internal_project_id = ip.twin_id
+        WHERE COALESCE(pr.total_revenue, 0) > 0
+        ORDER BY total_revenue DESC, ip.twin_id
+    """)
+    rows = cur.fetchall()
+
+    data = []
+    for r in rows:
+        total_revenue = round(r[4], 2)
+        labor_cost    = round(r[6], 2)
+        gross_profit  = round(r[8], 2)
+        margin        = round(gross_profit / total_revenue, 4) if total_revenue > 0 else 0
+        data.append({
+            "project_id":        r[0],
+            "project_name":      r[1] or f"项目 {r[0]}",
+            "status":            r[2],
+            "project_manager":   r[3],
+            "total_revenue":     total_revenue,
+            "collected_revenue": round(r[5], 2),
+            "labor_cost":        labor_cost,
+            "head_count":        r[7],
+            "gross_profit":      gross_profit,
+            "gross_margin":      margin,
+        })
+    return data
+
+
+def _projects_section(cur, args) -> list:
+    """项目维度收入分析"""
+    cur.execute("""
+        SELECT
+            ip.twin_id,
+            ip.name,
+            ip.status,
+            ip.project_manager,
+            COUNT(DISTINCT assoc.payment_item_id)                                    AS pi_count,
+            COALESCE(SUM(pi.amount), 0)                                              AS total_revenue,
+            COALESCE(SUM(CASE WHEN pi.status = '已付款' THEN pi.amount ELSE 0 END), 0) AS collected,
+            COALESCE(SUM(CASE WHEN pi.status = '待付款' THEN pi.amount ELSE 0 END), 0) AS pending
+        FROM fact_internal_project ip
+        LEFT JOIN internal_project_payment_activities assoc
+               ON assoc.internal_project_id = ip.twin_id
+        LEFT JOIN fact_payment_item pi ON pi.twin_id = assoc.payment_item_id
+        GROUP BY ip.twin_id, ip.name, ip.status, ip.project_manager
+        ORDER BY total_revenue DESC, ip.twin_id
+    """)
+    rows = cur.fetchall()
+
+    return [
+        {
+            "project_id":         r[0],
+            "project_name":       r[1] or f"项目 {r[0]}",
+            "status":             r[2],
+            "project_manager":    r[3],
+            "payment_item_count": r[4],
+            "total_revenue":      round(r[5], 2),
+            "collected_revenue":  round(r[6], 2),
+            "pending_revenue":    round(r[7], 2),
+        }
+        for r in rows
+    ]
+
+
+# ---- 薪资分析：读取工资单事实表 fact_payroll（已取消的工资单不计） ----
+
+# 可做分布 / 汇总的工资单金额指标（fact_payroll 的 REAL 列）
+PAYROLL_METRICS = (
+    "employment_salary",
+    "gross_base_part",
+    "gross_perf_actual",
+    "gross_personal_leave",
+    "gross_sick_leave",
+    "reward_punishment_amount",
+    "base_amount",
+    "social_three_insurance",
+    "social_housing_deduction",
+    "social_deduction_total",
+    "tax_monthly",
+    "total_amount",
 )
-"""
 
+# 分布直方图的默认 / 最大分箱数
+DISTRIBUTION_BINS = 10
+MAX_DISTRIBUTION_BINS = 100
 
-@analytics_api_bp.route("/analytics/overview")
-def overview():
-    """应收账款概览 KPI"""
-    today = date.today().isoformat()
-    try:
-        conn = _get_conn()
-        cur = conn.cursor()
-
-        cur.execute(f"""
-            {_LATEST_CONTRACTS}
-            SELECT COALESCE(SUM(contract_amount), 0) FROM latest_cc
-        """)
-        total_contract_amount = cur.fetchone()[0] or 0
-
-        cur.execute(f"""
-            {_LATEST_PAYMENT_ITEMS}
-            SELECT
-                COALESCE(SUM(amount), 0) AS total,
-                COALESCE(SUM(CASE WHEN status = '已付款' THEN amount ELSE 0 END), 0) AS collected,
-                COALESCE(SUM(CASE WHEN status = '待付款' THEN amount ELSE 0 END), 0) AS pending,
-                COALESCE(SUM(CASE WHEN status = '待付款'
-                                   AND planned_payment_date IS NOT NULL
-                                   AND planned_payment_date < ? THEN amount ELSE 0 END), 0) AS overdue,
-                COUNT(CASE WHEN status = '待付款'
-                            AND planned_payment_date IS NOT NULL
-                            AND planned_payment_date < ? THEN 1 END) AS overdue_count
-            FROM latest_pi
-        """, (today, today))
-        row = cur.fetchone()
-        conn.close()
-
-        return jsonify({
-            "success": True,
-            "data": {
-                "total_contract_amount": round(total_contract_amount, 2),
-                "total_payment_amount":  round(row[0], 2),
-                "collected_amount":      round(row[1], 2),
-                "pending_amount":        round(row[2], 2),
-                "overdue_amount":        round(row[3], 2),
-                "overdue_count":         row[4],
-            }
+
+def _month_bucket_sql(column: str, granularity: str) -> str:
+    """YYYY-MM 列的时间桶标签 SQL 表达式（与 _month_label 一致）"""
+    if granularity == "quarter":
+        # 不用整数除法：DuckDB 的 / 为浮点除
+        quarter = (
+            f"CASE WHEN substr({column}, 6, 2) <= '03' THEN '1' WHEN substr({column}, 6, 2) <= '06' THEN '2' "
+            f"WHEN substr({column}, 6, 2) <= '09' THEN '3' ELSE '4' END"
+        )
+        return f"substr({column}, 1, 4) || '-Q' || {quarter}"
+    if granularity == "year":
+        return f"substr({column}, 1, 4)"
+    return column
+
+
+def _payroll_conditions(args, first_month: str, last_month: str, alias: str = "p"):
+    """fact_payroll 的过滤条件：薪资期数区间（走 (time_key, company_id) 索引）、可选 company_id、排除已取消"""
+    conditions = [f"{alias}.time_key BETWEEN ? AND ?", f"COALESCE({alias}.status, '') != '已取消'"]
+    params = [first_month, last_month]
+    if args.get("company_id"):
+        conditions.append(f"{alias}.company_id = ?")
+        params.append(int(args["company_id"]))
+    return " AND ".join(conditions), params
+
+
+def _payroll_period_args(cur, args):
+    """
+    读取 period（单个薪资期数）或 from / to，返回 (起始期数, 结束期数)；
+    都未指定时取最近一个有工资单的期数（无工资单时为 (None, None)）
+    """
+    if args.get("period"):
+        parse_month(args["period"])
+        return args["period"], args["period"]
+    if args.get("from") or args.get("to"):
+        first_month = args.get("from") or args.get("to")
+        month_list, _, _ = _month_range_args(args, first_month, args.get("to") or first_month)
+        return month_list[0], month_list[-1]
+    cur.execute("SELECT MAX(time_key) FROM fact_payroll WHERE COALESCE(status, '') != '已取消'")
+    latest = cur.fetchone()[0]
+    return latest, latest
+
+
+def _payroll_cost_trend_section(cur, args) -> dict:
+    """薪资成本趋势：每个时间桶的应发、社保公积金、个税、实发合计与发薪人数，并按公司拆分"""
+    months = int(args.get("months", 24))
+    today = date.today()
+    month_list, granularity, labels = _month_range_args(
+        args, _month_offset(today, -(months - 1)), _month_offset(today, 0)
+    )
+    where, params = _payroll_conditions(args, month_list[0], month_list[-1])
+    cur.execute(f"""
+        SELECT {_month_bucket_sql("p.time_key", granularity)} AS bucket,
+               p.company_id,
+               COALESCE(SUM(p.base_amount), 0),
+               COALESCE(SUM(p.social_deduction_total), 0),
+               COALESCE(SUM(p.tax_monthly), 0),
+               COALESCE(SUM(p.total_amount), 0),
+               COUNT(DISTINCT p.person_id)
+        FROM fact_payroll p
+        WHERE {where}
+        GROUP BY bucket, p.company_id
+        ORDER BY bucket, p.company_id
+    """, params)
+    rows = cur.fetchall()
+
+    metrics = ("gross", "social", "tax", "net")
+    totals = {label: dict.fromkeys(metrics, 0) for label in labels}
+    by_company: dict = {}
+    for bucket, company_id, gross, social, tax, net, headcount in rows:
+        for metric, value in zip(metrics, (gross, social, tax, net)):
+            totals[bucket][metric] += value
+        company = by_company.setdefault(company_id, {
+            "company_id": company_id,
+            **{metric: [0] * len(labels) for metric in metrics},
+            "headcount": [0] * len(labels),
         })
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        index = labels.index(bucket)
+        for metric, value in zip(metrics, (gross, social, tax, net)):
+            company[metric][index] = round(value, 2)
+        company["headcount"][index] = headcount
+
+    # 跨公司的发薪人数需按人员去重，不能由各公司人数相加
+    cur.execute(f"""
+        SELECT {_month_bucket_sql("p.time_key", granularity)} AS bucket, COUNT(DISTINCT p.person_id)
+        FROM fact_payroll p
+        WHERE {where}
+        GROUP BY bucket
+    """, params)
+    headcount = dict(cur.fetchall())
+
+    return {
+        "granularity": granularity,
+        "periods":   labels,
+        **{metric: [round(totals[label][metric], 2) for label in labels] for metric in metrics},
+        "headcount": [headcount.get(label, 0) for label in labels],
+        "by_company": [by_company[key] for key in sorted(by_company)],
+    }
+
+
+def _payroll_departments_section(cur, args) -> dict:
+    """
+    按公司 / 部门汇总薪资：默认最近一个薪资期数，可指定 period 或 from / to。
+    部门取该人员在该公司最新一条聘用记录的当前部门（fact_employment 只保存最新状态，非发薪当期的部门）。
+    """
+    first_month, last_month = _payroll_period_args(cur, args)
+    if first_month is None:
+        return {"from": None, "to": None, "departments": []}
+    where, params = _payroll_conditions(args, first_month, last_month)
+    cur.execute(f"""
+        WITH latest_employment AS (
+            SELECT person_id, company_id, MAX(twin_id) AS twin_id
+            FROM fact_employment
+            GROUP BY person_id, company_id
+        )
+        SELECT p.company_id,
+               COALESCE(NULLIF(e.department, ''), '未分配') AS department,
+               COUNT(DISTINCT p.person_id),
+               COUNT(*),
+               COALESCE(SUM(p.base_amount), 0),
+               COALESCE(SUM(p.social_deduction_total), 0),
+               COALESCE(SUM(p.tax_monthly), 0),
+               COALESCE(SUM(p.total_amount), 0)
+        FROM fact_payroll p
+        LEFT JOIN latest_employment le ON le.person_id = p.person_id AND le.company_id = p.company_id
+        LEFT JOIN fact_employment e ON e.twin_id = le.twin_id
+        WHERE {where}
+        GROUP BY p.company_id, department
+        ORDER BY p.company_id, 5 DESC, department
+    """, params)
+    return {
+        "from": first_month,
+        "to":   last_month,
+        "departments": [
+            {
+                "company_id":    r[0],
+                "department":    r[1],
+                "headcount":     r[2],
+                "payslip_count": r[3],
+                "gross":         round(r[4], 2),
+                "social":        round(r[5], 2),
+                "tax":           round(r[6], 2),
+                "net":           round(r[7], 2),
+            }
+            for r in cur.fetchall()
+        ],
+    }
 
 
-@analytics_api_bp.route("/analytics/collection-trend")
-def collection_trend():
-    """近 N 个月收款趋势（计划 vs 实收）"""
-    months = int(request.args.get("months", 12))
+def _payroll_headcount_section(cur, args) -> dict:
+    """发薪人数趋势：每个时间桶有工资单的人数（按人员去重），并按公司拆分"""
+    months = int(args.get("months", 24))
     today = date.today()
-    month_list = [_month_offset(today, -(months - 1 - i)) for i in range(months)]
+    month_list, granularity, labels = _month_range_args(
+        args, _month_offset(today, -(months - 1)), _month_offset(today, 0)
+    )
+    where, params = _payroll_conditions(args, month_list[0], month_list[-1])
+    bucket = _month_bucket_sql("p.time_key", granularity)
+    cur.execute(f"""
+        SELECT {bucket} AS bucket, p.company_id, COUNT(DISTINCT p.person_id)
+        FROM fact_payroll p
+        WHERE {where}
+        GROUP BY bucket, p.company_id
+        ORDER BY p.company_id
+    """, params)
+    by_company: dict = {}
+    for label, company_id, count in cur.fetchall():
+        by_company.setdefault(company_id, [0] * len(labels))[labels.index(label)] = count
+    cur.execute(f"""
+        SELECT {bucket} AS bucket, COUNT(DISTINCT p.person_id)
+        FROM fact_payroll p
+        WHERE {where}
+        GROUP BY bucket
+    """, params)
+    totals = dict(cur.fetchall())
+    return {
+        "granularity": granularity,
+        "periods":   labels,
+        "headcount": [totals.get(label, 0) for label in labels],
+        "by_company": [
+            {"company_id": company_id, "headcount": counts}
+            for company_id, counts in sorted(by_company.items())
+        ],
+    }
+
+
+def _percentile(values: list, q: float) -> float:
+    """已排序列表的分位数（线性插值）"""
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _payroll_distribution_section(cur, args) -> dict:
+    """
+    某工资单指标（metric，默认 total_amount）在一个期数区间内的分布：
+    默认最近一个薪资期数，可指定 period 或 from / to；返回统计量、分位数与等宽直方图（bins，默认 10）
+    """
+    metric = args.get("metric", "total_amount")
+    if metric not in PAYROLL_METRICS:
+        raise ValueError(f"metric 仅支持: {', '.join(PAYROLL_METRICS)}")
+    bins = int(args.get("bins", DISTRIBUTION_BINS))
+    if not 1 <= bins <= MAX_DISTRIBUTION_BINS:
+        raise ValueError(f"bins 应在 1 到 {MAX_DISTRIBUTION_BINS} 之间")
+    first_month, last_month = _payroll_period_args(cur, args)
+    result = {"metric": metric, "from": first_month, "to": last_month, "count": 0}
+    if first_month is None:
+        return result
+    where, params = _payroll_conditions(args, first_month, last_month)
+    cur.execute(f"""
+        SELECT p.{metric} FROM fact_payroll p
+        WHERE {where} AND p.{metric} IS NOT NULL
+        ORDER BY p.{metric}
+    """, params)
+    values = [row[0] for row in cur.fetchall()]
+    if not values:
+        return result
+
+    low, high = values[0], values[-1]
+    width = (high - low) / bins
+    counts = [0] * bins
+    for value in values:
+        index = int((value - low) / width) if width else 0
+        counts[min(index, bins - 1)] += 1
+    result.update({
+        "count": len(values),
+        "min":   round(low, 2),
+        "max":   round(high, 2),
+        "avg":   round(sum(values) / len(values), 2),
+        "sum":   round(sum(values), 2),
+        "percentiles": {
+            f"p{int(q * 100)}": round(_percentile(values, q), 2) for q in (0.25, 0.5, 0.75, 0.9)
+        },
+        "histogram": [
+            {"from": round(low + width * i, 2), "to": round(low + width * (i + 1), 2), "count": count}
+            for i, count in enumerate(counts)
+        ],
+    })
+    return result
+
+
+# dashboard 的区块：名称 -> (计算函数, dashboard 请求中该区块 months 参数的名称)
+DASHBOARD_SECTIONS = {
+    "overview":              (_overview_section, None),
+    "collection_trend":      (_collection_trend_section, "trend_months"),
+    "cashflow_forecast":     (_cashflow_forecast_section, "forecast_months"),
+    "clients":               (_clients_section, None),
+    "projects":              (_projects_section, None),
+    "project_profitability": (_project_profitability_section, None),
+}
+
+
+def _analytics_backend() -> str:
+    """
+    本次请求使用的查询后端：?backend= 优先，否则为配置 ANALYTICS_BACKEND（默认 sqlite）；
+    请求 duckdb 而未安装 duckdb 或未预装其 sqlite 扩展时回退到 sqlite
+    """
+    backend = request.args.get("backend") or current_app.config.get("ANALYTICS_BACKEND", "sqlite")
+    if backend not in ANALYTICS_BACKENDS:
+        raise ValueError(f"backend 仅支持: {', '.join(ANALYTICS_BACKENDS)}")
+    if backend == "duckdb" and not duckdb_available():
+        return "sqlite"
+    return backend
+
+
+def _fill_cache(cur, cache_key: str, token: str, compute, backend: str):
+    """
+    未命中时计算并填充缓存，返回 (响应体 JSON, 来源)。
+    跨 worker：取得填充租约者计算；未取得者等待持有者写入缓存（来源 HIT），等不到再自行计算。
+    duckdb 后端直接读数据库文件、不在令牌所在的快照内，其结果可能与令牌不一致，因此不写缓存、也不取租约。
+    """
+    if backend == "duckdb":
+        with duckdb_cursor(current_app.config["DATABASE_PATH"]) as duck_cur:
+            body = compute(duck_cur)
+        return jsonify(body).get_data(as_text=True), "MISS"
 
+    cache_dao = AnalyticsCacheDAO(db_path=str(current_app.config["DATABASE_PATH"]))
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    try:
+        leased = cache_dao.acquire_fill(cache_key, token, owner)
+    except sqlite3.Error:
+        leased = True  # 租约表写锁繁忙时不等待，直接计算
+    if not leased:
+        payload = cache_dao.wait_for_fill(cache_key, token)
+        if payload is not None:
+            return payload, "HIT"
+    try:
+        body = compute(cur)
+        payload = jsonify(body).get_data(as_text=True)
+        if not body.get("errors"):
+            cached = {key: value for key, value in body.items() if key not in _UNCACHED_FIELDS}
+            try:
+                cache_dao.put(cache_key, token, jsonify(cached).get_data(as_text=True))
+            except sqlite3.Error:
+                pass  # 缓存写入失败（如写锁繁忙）不影响本次响应
+    finally:
+        if leased:
+            try:
+                cache_dao.release_fill(cache_key, owner)
+            except sqlite3.Error:
+                pass  # 租约到期后自动失效
+    return payload, "MISS"
+
+
+def _snapshot_response(endpoint: str, args: dict, compute):
+    """
+    在只读事务（一致性快照）内计算并返回 JSON；compute(cursor) -> 响应体 dict，
+    args 为参与计算的请求参数（_request_args），与 endpoint 一起构成缓存键。
+    同一快照内先读变更令牌与缓存：命中则直接返回缓存的响应体（不读事实 / 状态表），
+    未命中则计算并以该令牌写入缓存（不含 _UNCACHED_FIELDS）。参数错误（ValueError）返回 400、不缓存。
+    duckdb 后端下命中的缓存（由 sqlite 在快照内算出）照常返回，未命中时由 DuckDB 计算、结果不缓存。
+    同一时刻的相同请求只计算一次：进程内由 single-flight 合并，跨 worker 由填充租约合并。
+    响应头 X-Cache: HIT / MISS / COALESCED（共享了进程内在途请求的结果）；
+    计算所用后端见 X-Analytics-Backend（HIT 时为 cache）。
+    """
+    cache_key = _cache_key(endpoint, args)
     try:
+        backend = _analytics_backend()
         conn = _get_conn()
-        cur = conn.cursor()
-
-        cur.execute(f"""
-            {_LATEST_PAYMENT_ITEMS}
-            SELECT substr(actual_payment_date, 1, 7) AS month,
-                   COALESCE(SUM(amount), 0)          AS total
-            FROM latest_pi
-            WHERE status = '已付款'
-              AND actual_payment_date IS NOT NULL
-              AND substr(actual_payment_date, 1, 7) >= ?
-            GROUP BY month
-        """, (month_list[0],))
-        collected_map = {row[0]: row[1] for row in cur.fetchall()}
-
-        cur.execute(f"""
-            {_LATEST_PAYMENT_ITEMS}
-            SELECT substr(planned_payment_date, 1, 7) AS month,
-                   COALESCE(SUM(amount), 0)           AS total
-            FROM latest_pi
-            WHERE planned_payment_date IS NOT NULL
-              AND substr(planned_payment_date, 1, 7) >= ?
-            GROUP BY month
-        """, (month_list[0],))
-        planned_map = {row[0]: row[1] for row in cur.fetchall()}
-
-        conn.close()
-        return jsonify({
-            "success": True,
-            "data": {
-                "months":    month_list,
-                "collected": [round(collected_map.get(m, 0), 2) for m in month_list],
-                "planned":   [round(planned_map.get(m, 0), 2)   for m in month_list],
-            }
-        })
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute("BEGIN")  # WAL 下首次读取即固定快照
+            cur = conn.cursor()
+            token = twin_change_token(cur, ANALYTICS_SOURCE_TWINS)
+            payload = get_cached_payload(cur, cache_key, token)
+            source = "HIT"
+            if payload is None:
+                (payload, source), shared = _analytics_flights.do(
+                    (str(current_app.config["DATABASE_PATH"]), cache_key, token, backend),
+                    lambda: _fill_cache(cur, cache_key, token, compute, backend),
+                )
+                if shared:
+                    source = "COALESCED"
+        finally:
+            conn.rollback()
+            conn.close()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+    _cache_stats.record(endpoint, source)
+    response = current_app.response_class(payload, mimetype="application/json")
+    response.headers["X-Cache"] = source
+    response.headers["X-Analytics-Backend"] = "cache" if source == "HIT" else backend
+    return response
+
+
+def _section_response(endpoint: str, section, params=()):
+    """单个区块接口；params 为该区块读取的查询参数"""
+    args = _request_args(params)
+    return _snapshot_response(endpoint, args, lambda cur: {"success": True, "data": section(cur, args)})
+
+
+@analytics_api_bp.route("/analytics/overview")
+def overview():
+    """应收账款概览 KPI"""
+    return _section_response("overview", _overview_section)
+
+
+@analytics_api_bp.route("/analytics/collection-trend")
+def collection_trend():
+    """
+    收款趋势（计划 vs 实收）：默认近 N 个月（months），
+    也可指定 from / to（YYYY-MM）与 granularity（month / quarter / year）
+    """
+    return _section_response("collection-trend", _collection_trend_section, _RECEIVABLE_TREND_PARAMS)
+
 
 @analytics_api_bp.route("/analytics/cashflow-forecast")
 def cashflow_forecast():
-    """未来 N 个月现金流预测（待付款项按 planned_payment_date）"""
-    months = int(request.args.get("months", 6))
-    today = date.today()
-    month_list = [_month_offset(today, i) for i in range(months)]
-
-    try:
-        conn = _get_conn()
-        cur = conn.cursor()
-
-        cur.execute(f"""
-            {_LATEST_PAYMENT_ITEMS}
-            SELECT substr(planned_payment_date, 1, 7) AS month,
-                   COALESCE(SUM(amount), 0)           AS total
-            FROM latest_pi
-            WHERE status = '待付款'
-              AND planned_payment_date IS NOT NULL
-              AND substr(planned_payment_date, 1, 7) BETWEEN ? AND ?
-            GROUP BY month
-        """, (month_list[0], month_list[-1]))
-        forecast_map = {row[0]: row[1] for row in cur.fetchall()}
-        conn.close()
-
-        return jsonify({
-            "success": True,
-            "data": {
-                "months":   month_list,
-                "expected": [round(forecast_map.get(m, 0), 2) for m in month_list],
-            }
-        })
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    """
+    现金流预测（待付款项按 planned_payment_date）：默认未来 N 个月（months），
+    也可指定 from / to（YYYY-MM）与 granularity（month / quarter / year）
+    """
+    return _section_response("cashflow-forecast", _cashflow_forecast_section, _RECEIVABLE_TREND_PARAMS)
 
 
 @analytics_api_bp.route("/analytics/clients")
 def clients():
     """客户维度分析（按 client_company 聚合）"""
-    try:
-        conn = _get_conn()
-        cur = conn.cursor()
-
-        cur.execute(f"""
-            {_LATEST_CONTRACTS},
-            {_LATEST_PAYMENT_ITEMS.replace('WITH ', '')}
-            SELECT
-                cc.client_company,
-                COUNT(DISTINCT cc.id)                                                    AS contract_count,
-                COALESCE(SUM(cc.contract_amount), 0)                                     AS contract_amount,
-                COALESCE(SUM(CASE WHEN pi.status = '已付款' THEN pi.amount ELSE 0 END), 0) AS collected,
-                COALESCE(SUM(CASE WHEN pi.status = '待付款' THEN pi.amount ELSE 0 END), 0) AS pending
-            FROM latest_cc cc
-            LEFT JOIN latest_pi pi ON pi.client_contract_id = cc.id
-            WHERE cc.client_company IS NOT NULL AND cc.client_company != ''
-            GROUP BY cc.client_company
-            ORDER BY contract_amount DESC
-        """)
-        rows = cur.fetchall()
-        conn.close()
-
-        data = []
-        for r in rows:
-            collected = r[3] or 0
-            pending = r[4] or 0
-            pi_total = collected + pending
-            data.append({
-                "client_company":   r[0],
-                "contract_count":   r[1],
-                "contract_amount":  round(r[2] or 0, 2),
-                "collected_amount": round(collected, 2),
-                "pending_amount":   round(pending, 2),
-                "collection_rate":  round(collected / pi_total, 4) if pi_total > 0 else 0,
-            })
-
-        return jsonify({"success": True, "data": data})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    return _section_response("clients", _clients_section)
 
 
-# ---- 辅助 CTE：人员最新雇佣月薪 ----
-_LATEST_EMP_SALARY = """
-WITH latest_emp AS (
-    SELECT emp.person_id,
-           CAST(json_extract(h.data, '$.salary') AS REAL) AS monthly_salary
-    FROM person_company_employment_activities emp
-    JOIN person_company_employment_history h ON h.twin_id = emp.id
-    WHERE h.version = (
-        SELECT MAX(v.version) FROM person_company_employment_history v WHERE v.twin_id = emp.id
-    )
-)
-"""
+@analytics_api_bp.route("/analytics/project-profitability")
+def project_profitability():
+    """项目收益与估算人力成本对比"""
+    return _section_response("project-profitability", _project_profitability_section)
 
-_LATEST_PPP = """
-WITH latest_ppp AS (
-    SELECT ppp.id,
-           ppp.person_id,
-           ppp.payment_item_id,
-           json_extract(h.data, '$.start_date') AS start_date,
-           json_extract(h.data, '$.end_date')   AS end_date
-    FROM person_payment_participation_activities ppp
-    JOIN person_payment_participation_history h ON h.twin_id = ppp.id
-    WHERE h.version = (
-        SELECT MAX(v.version) FROM person_payment_participation_history v WHERE v.twin_id = ppp.id
-    )
-)
-"""
 
+@analytics_api_bp.route("/analytics/projects")
+def projects():
+    """项目维度收入分析"""
+    return _section_response("projects", _projects_section)
 
-@analytics_api_bp.route("/analytics/project-profitability")
-def project_profitability():
-    """项目收益与估算人力成本对比
-    人力成本 = SUM(月薪 × 参与月数)，参与月数由 start_date/end_date 计算
+
+@analytics_api_bp.route("/analytics/payroll-cost-trend")
+def payroll_cost_trend():
+    """
+    薪资成本趋势（应发 / 社保公积金 / 个税 / 实发 / 发薪人数）：默认近 24 个月（months），
+    也可指定 from / to（YYYY-MM）与 granularity（month / quarter / year）；company_id 只看某公司
+    """
+    return _section_response("payroll-cost-trend", _payroll_cost_trend_section, _PAYROLL_TREND_PARAMS)
+
+
+@analytics_api_bp.route("/analytics/payroll-departments")
+def payroll_departments():
+    """按公司 / 部门汇总薪资：period 或 from / to（默认最近一个薪资期数），company_id 只看某公司"""
+    return _section_response("payroll-departments", _payroll_departments_section, _PAYROLL_PERIOD_PARAMS)
+
+
+@analytics_api_bp.route("/analytics/payroll-headcount")
+def payroll_headcount():
+    """发薪人数趋势：参数同 payroll-cost-trend"""
+    return _section_response("payroll-headcount", _payroll_headcount_section, _PAYROLL_TREND_PARAMS)
+
+
+@analytics_api_bp.route("/analytics/payroll-distribution")
+def payroll_distribution():
+    """某工资单指标的分布：metric（默认 total_amount）、bins、period 或 from / to、company_id"""
+    return _section_response("payroll-distribution", _payroll_distribution_section, _PAYROLL_DISTRIBUTION_PARAMS)
+
+
+@analytics_api_bp.route("/analytics/dashboard")
+def dashboard():
+    """
+    经营分析看板：一次请求返回全部区块，在同一只读事务（一致性快照）内依次计算；整体按参数缓存。
+    参数：trend_months / forecast_months（默认 12 / 6），granularity、client_company、project_id 作用于趋势区块；
+    sections=overview,clients 只计算指定区块。
+    返回 data: {区块名: data}，errors: {区块名: 错误}（单区块失败不影响其他区块，且不缓存），
+    以及本次实际计算时的 timings_ms: {区块名: 耗时}（命中缓存时不返回）。
     """
+    request_args = _request_args(_DASHBOARD_PARAMS)
+    wanted = sorted({name.strip() for name in request_args.get("sections", "").split(",") if name.strip()})
+    unknown = [name for name in wanted if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        return jsonify({"success": False, "error": f"未知区块: {', '.join(unknown)}"}), 400
+    if wanted:
+        request_args["sections"] = ",".join(wanted)
+
+    def _compute(cur):
+        started = time.perf_counter()
+        data, timings, errors = {}, {}, {}
+        for name in wanted or DASHBOARD_SECTIONS:
+            section, months_param = DASHBOARD_SECTIONS[name]
+            args = {key: request_args[key] for key in _DASHBOARD_SECTION_FILTERS if key in request_args}
+            if months_param and request_args.get(months_param):
+                args["months"] = request_args[months_param]
+            section_started = time.perf_counter()
+            try:
+                data[name] = section(cur, args)
+            except Exception as e:
+                errors[name] = str(e)
+            timings[name] = round((time.perf_counter() - section_started) * 1000, 2)
+        result = {
+            "success": True,
+            "data": data,
+            "timings_ms": dict(timings, total=round((time.perf_counter() - started) * 1000, 2)),
+        }
+        if errors:
+            result["errors"] = errors
+        return result
+
+    return _snapshot_response("dashboard", request_args, _compute)
+
+
+@analytics_api_bp.route("/analytics/cache-stats")
+def cache_stats():
+    """结果缓存命中与请求合并统计（当前 worker 进程自启动以来）、缓存行数（全部 worker 共享）"""
     try:
-        conn = _get_conn()
-        cur = conn.cursor()
-
-        cur.execute(f"""
-            {_LATEST_PROJECTS},
-            {_LATEST_PAYMENT_ITEMS.replace('WITH ', '')},
-            {_LATEST_EMP_SALARY.replace('WITH ', '')},
-            {_LATEST_PPP.replace('WITH ', '')},
-            project_revenue AS (
-                SELECT ipa.internal_project_id,
-                       COALESCE(SUM(pi.amount), 0)                                              AS total_revenue,
-                       COALESCE(SUM(CASE WHEN pi.status='已付款' THEN pi.amount ELSE 0 END), 0) AS collected_revenue
-                FROM internal_project_payment_activities ipa
-                JOIN latest_pi pi ON pi.id = ipa.payment_item_id
-                GROUP BY ipa.internal_project_id
-            ),
-            project_labor AS (
-                SELECT ipa.internal_project_id,
-                       COUNT(DISTINCT ppp.person_id)  AS head_count,
-                       COALESCE(SUM(
-                           emp.monthly_salary *
-                           MAX(1.0, ROUND(
-                               (julianday(ppp.end_date) - julianday(ppp.start_date)) / 30.0, 1
-                           ))
-                       ), 0) AS labor_cost
-                FROM internal_project_payment_activities ipa
-                JOIN latest_ppp ppp ON ppp.payment_item_id = ipa.payment_item_id
-                JOIN latest_emp emp ON emp.person_id = ppp.person_id
-                WHERE ppp.start_date IS NOT NULL AND ppp.end_date IS NOT NULL
-                GROUP BY ipa.internal_project_id
-            )
-            SELECT
-                ip.id,
-                ip.name,
-                ip.status,
-                ip.project_manager,
-                COALESCE(pr.total_revenue, 0)     AS total_revenue,
-                COALESCE(pr.collected_revenue, 0)  AS collected_revenue,
-                COALESCE(pl.labor_cost, 0)         AS labor_cost,
-                COALESCE(pl.head_count, 0)         AS head_count,
-                COALESCE(pr.total_revenue, 0) - COALESCE(pl.labor_cost, 0) AS gross_profit
-            FROM latest_ip ip
-            LEFT JOIN project_revenue pr ON pr.internal_project_id = ip.id
-            LEFT JOIN project_labor   pl ON pl.internal_project_id = ip.id
-            WHERE COALESCE(pr.total_revenue, 0) > 0
-            ORDER BY total_revenue DESC
-        """)
-        rows = cur.fetchall()
-        conn.close()
-
-        data = []
-        for r in rows:
-            total_revenue = round(r[4], 2)
-            labor_cost    = round(r[6], 2)
-            gross_profit  = round(r[8], 2)
-            margin        = round(gross_profit / total_revenue, 4) if total_revenue > 0 else 0
-            data.append({
-                "project_id":        r[0],
-                "project_name":      r[1] or f"项目 {r[0]}",
-                "status":            r[2],
-                "project_manager":   r[3],
-                "total_revenue":     total_revenue,
-                "collected_revenue": round(r[5], 2),
-                "labor_cost":        labor_cost,
-                "head_count":        r[7],
-                "gross_profit":      gross_profit,
-                "gross_margin":      margin,
-            })
-
-        return jsonify({"success": True, "data": data})
+        entries = AnalyticsCacheDAO(db_path=str(current_app.config["DATABASE_PATH"])).count()
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "data": dict(_cache_stats.summary(), entries=entries, single_flight=_analytics_flights.stats()),
+    })
 
 
-@analytics_api_bp.route("/analytics/projects")
-def projects():
-    """项目维度收入分析"""
+@analytics_api_bp.route("/analytics/backend-check")
+def backend_check():
+    """
+    以默认参数在 sqlite 与 duckdb 两种后端上分别计算 dashboard 各区块，逐区块对比结果与耗时（不使用缓存）。
+    返回 data: {identical, sections: {区块名: {identical, sqlite_ms, duckdb_ms}}}
+    """
+    if not duckdb_available():
+        return jsonify({"success": False, "error": duckdb_unavailable_reason()}), 400
+    sections = {}
     try:
         conn = _get_conn()
-        cur = conn.cursor()
-
-        cur.execute(f"""
-            {_LATEST_PROJECTS},
-            {_LATEST_PAYMENT_ITEMS.replace('WITH ', '')}
-            SELECT
-                ip.id,
-                ip.name,
-                ip.status,
-                ip.project_manager,
-                COUNT(DISTINCT assoc.payment_item_id)                                    AS pi_count,
-                COALESCE(SUM(pi.amount), 0)                                              AS total_revenue,
-                COALESCE(SUM(CASE WHEN pi.status = '已付款' THEN pi.amount ELSE 0 END), 0) AS collected,
-                COALESCE(SUM(CASE WHEN pi.status = '待付款' THEN pi.amount ELSE 0 END), 0) AS pending
-            FROM latest_ip ip
-            LEFT JOIN internal_project_payment_activities assoc
-                   ON assoc.internal_project_id = ip.id
-            LEFT JOIN latest_pi pi ON pi.id = assoc.payment_item_id
-            GROUP BY ip.id
-            ORDER BY total_revenue DESC
-        """)
-        rows = cur.fetchall()
-        conn.close()
-
-        data = [
-            {
-                "project_id":         r[0],
-                "project_name":       r[1] or f"项目 {r[0]}",
-                "status":             r[2],
-                "project_manager":    r[3],
-                "payment_item_count": r[4],
-                "total_revenue":      round(r[5], 2),
-                "collected_revenue":  round(r[6], 2),
-                "pending_revenue":    round(r[7], 2),
-            }
-            for r in rows
-        ]
-
-        return jsonify({"success": True, "data": data})
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute("BEGIN")
+            sqlite_cur = conn.cursor()
+            with duckdb_cursor(current_app.config["DATABASE_PATH"]) as duck_cur:
+                for name, (section, _) in DASHBOARD_SECTIONS.items():
+                    results, timings = {}, {}
+                    for backend, cursor in (("sqlite", sqlite_cur), ("duckdb", duck_cur)):
+                        section_started = time.perf_counter()
+                        results[backend] = section(cursor, {})
+                        timings[f"{backend}_ms"] = round((time.perf_counter() - section_started) * 1000, 2)
+                    sections[name] = dict(timings, identical=results["sqlite"] == results["duckdb"])
+        finally:
+            conn.rollback()
+            conn.close()
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "data": {"identical": all(v["identical"] for v in sections.values()), "sections": sections},
+    })
@@ -0,0 +1,88 @@
+"""
+经营分析查询后端
+
+- sqlite（默认）：直接在 Twin 数据库上执行
+- duckdb（可选，需 pip install duckdb）：通过 DuckDB 的 sqlite 扩展以只读方式 ATTACH Twin 数据库，
+  分析 SQL 由 DuckDB 向量化执行；每个进程每个数据库一个 DuckDB 连接，请求使用其 cursor()
+
+sqlite 扩展须在部署时预装（联网：python -c "import duckdb; duckdb.sql('INSTALL sqlite')"；
+离线：pip install duckdb-extensions duckdb-extension-sqlite-scanner 后
+python -c "from duckdb_extensions import import_extension; import_extension('sqlite_scanner')"）。
+运行时只 LOAD、不下载；未安装 duckdb 或扩展时 duckdb_available() 为 False，调用方回退到 sqlite。
+
+DuckDB 经扩展直接读取数据库文件，看不到 SQLite 读事务的快照，因此其结果不写入分析缓存（见 analytics_api）。
+
+两种后端执行同一套分析 SQL（参数占位符均为 ?），是否结果一致可用 /api/analytics/backend-check 对比。
+"""
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+ANALYTICS_BACKENDS = ("sqlite", "duckdb")
+
+_duckdb_connections: Dict[str, Any] = {}
+_duckdb_lock = threading.Lock()
+
+# duckdb / sqlite 扩展的可用性（进程内只检测一次）：不可用的原因，可用时为 None
+_duckdb_unavailable_reason: Optional[str] = None
+_duckdb_checked = False
+
+
+def _new_duckdb_connection():
+    """新建加载了 sqlite 扩展的 DuckDB 连接（禁止自动下载扩展）；duckdb 或扩展缺失时抛 RuntimeError"""
+    try:
+        import duckdb
+    except ImportError as e:
+        raise RuntimeError("未安装 duckdb（pip install duckdb）") from e
+    conn = duckdb.connect(
+        database=":memory:",
+        config={"autoinstall_known_extensions": False, "autoload_known_extensions": False},
+    )
+    try:
+        conn.execute("LOAD sqlite")
+    except duckdb.Error as e:
+        conn.close()
+        raise RuntimeError(f"DuckDB sqlite 扩展未预装: {e}") from e
+    return conn
+
+
+def duckdb_unavailable_reason() -> Optional[str]:
+    """duckdb 后端不可用的原因（可用时为 None）"""
+    global _duckdb_checked, _duckdb_unavailable_reason
+    with _duckdb_lock:
+        if not _duckdb_checked:
+            try:
+                _new_duckdb_connection().close()
+            except RuntimeError as e:
+                _duckdb_unavailable_reason = str(e)
+            _duckdb_checked = True
+        return _duckdb_unavailable_reason
+
+
+def duckdb_available() -> bool:
+    """是否安装了 duckdb 且已预装 sqlite 扩展"""
+    return duckdb_unavailable_reason() is None
+
+
+def _duckdb_connection(db_path: str):
+    with _duckdb_lock:
+        conn = _duckdb_connections.get(db_path)
+        if conn is None:
+            conn = _new_duckdb_connection()
+            quoted = db_path.replace("'", "''")
+            conn.execute(f"ATTACH '{quoted}' AS twin (TYPE SQLITE, READ_ONLY)")
+            _duckdb_connections[db_path] = conn
+        return conn
+
+
+@contextmanager
+def duckdb_cursor(db_path: str) -> Iterator[Any]:
+    """DuckDB 游标（已 USE 附加的 Twin 数据库，表名与 SQLite 中一致）"""
+    cursor = _duckdb_connection(str(db_path)).cursor()
+    try:
+        cursor.execute("USE twin")
+        yield cursor
+    finally:
+        cursor.close()
@@ -10,7 +10,10 @@ from typing import Optional, Any
 
 from app.root_config import Config
 from app.services.twin_service import TwinService
+from app.services.facet_service import FacetService
 from app.services.payroll_service import PayrollService
+from app.services.payroll_run_service import PayrollRunService
+from app.services.payroll_simulation_service import PayrollSimulationService
 
 
 def standard_response(
@@ -37,8 +40,29 @@ def get_twin_service(db_path: Optional[str] = None) -> TwinService:
     return TwinService(db_path=db_path)
 
 
+def get_facet_service(db_path: Optional[str] = None) -> FacetService:
+    """获取 FacetService 实例"""
+    if db_path is None:
+        db_path = str(Config.DATABASE_PATH)
+    return FacetService(db_path=db_path)
+
+
 def get_payroll_service(db_path: Optional[str] = None) -> PayrollService:
     """获取 PayrollService 实例"""
     if db_path is None:
         db_path = str(Config.DATABASE_PATH)
     return PayrollService(db_path=db_path)
+
+
+def get_payroll_run_service(db_path: Optional[str] = None) -> PayrollRunService:
+    """获取 PayrollRunService 实例"""
+    if db_path is None:
+        db_path = str(Config.DATABASE_PATH)
+    return PayrollRunService(db_path=db_path)
+
+
+def get_payroll_simulation_service(db_path: Optional[str] = None) -> PayrollSimulationService:
+    """获取 PayrollSimulationService 实例"""
+    if db_path is None:
+        db_path = str(Config.DATABASE_PATH)
+    return PayrollSimulationService(db_path=db_path)
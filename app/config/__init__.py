@@ -3,7 +3,9 @@
 
 - YAML：税率表、岗位比例、员工折算、考核系数、社保公积金等
 - 加载器：payroll_config（含税率表 get_brackets / calculate_tax / get_brackets_for_display）
+- 配置快照：config_registry（按文件 mtime 自动重新加载）
 """
+from app.config.config_registry import get_config_snapshot, reload_config
 from app.config.payroll_config import (
     get_brackets,
     calculate_tax,
@@ -22,4 +24,6 @@ __all__ = [
     "get_employee_type_discount",
     "get_assessment_grade_coefficient",
     "get_social_security_config",
+    "get_config_snapshot",
+    "reload_config",
 ]
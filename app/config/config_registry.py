@@ -0,0 +1,329 @@
+"""
+配置注册表：工资相关 YAML 配置的内存快照
+
+- 所有配置解析一次后放入不可变快照 ConfigSnapshot，热路径查询只读字典 / 有序数组
+- 按生效日期选用的配置（社保公积金）预先排序并计算整数日期键，按期 bisect 查找
+- 模拟计算可用 config_overrides 在当前上下文叠加内存中的配置文档，不影响其他请求
+- 周期性检查文件 mtime（至多每 RELOAD_CHECK_INTERVAL 秒一次），变化则重新解析并整体替换快照，
+  无需重启各 gunicorn worker；重新解析失败（如编辑中的 YAML 格式错误）时保留旧快照
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+
+_CONFIG_DIR = Path(__file__).parent
+_log = logging.getLogger(__name__)
+
+# 配置文件路径（统一定义）
+_POSITION_SALARY_RATIO_PATH = _CONFIG_DIR / "position_salary_ratio.yaml"
+_EMPLOYEE_TYPE_DISCOUNT_PATH = _CONFIG_DIR / "employee_type_discount.yaml"
+_ASSESSMENT_GRADE_COEFFICIENT_PATH = _CONFIG_DIR / "assessment_grade_coefficient.yaml"
+_SOCIAL_SECURITY_CONFIG_PATH = _CONFIG_DIR / "social_security_config.yaml"
+_BRACKETS_PATH = _CONFIG_DIR / "income_tax_brackets.yaml"
+_METRICS_PATH = _CONFIG_DIR / "payroll_metrics.yaml"
+
+_WATCHED_PATHS = (
+    _POSITION_SALARY_RATIO_PATH,
+    _EMPLOYEE_TYPE_DISCOUNT_PATH,
+    _ASSESSMENT_GRADE_COEFFICIENT_PATH,
+    _SOCIAL_SECURITY_CONFIG_PATH,
+    _BRACKETS_PATH,
+    _METRICS_PATH,
+)
+
+# 两次 mtime 检查的最小间隔（秒）
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+def _load_yaml(path: Path, *, raise_on_error: bool = False) -> dict:
+    """加载 YAML 文件。默认失败时打日志并返回空 dict；raise_on_error=True 时抛出异常。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+            return data
+    except FileNotFoundError:
+        if raise_on_error:
+            _log.error("配置文件不存在: %s", path)
+            raise FileNotFoundError(f"配置文件不存在: {path}") from None
+        _log.warning("配置文件不存在: %s", path)
+        return {}
+    except yaml.YAMLError as e:
+        if raise_on_error:
+            _log.error("配置 YAML 解析失败 %s: %s", path, e)
+            raise ValueError(f"配置 YAML 格式错误: {e}") from e
+        _log.warning("配置 YAML 解析失败 %s: %s", path, e)
+        return {}
+
+
+def _date_key(raw: Any) -> int:
+    """'YYYY-MM-DD' -> YYYYMMDD 整数；缺失或无法解析视为最早（0）"""
+    if not raw:
+        return 0
+    s = str(raw)
+    try:
+        return int(s[:4]) * 10000 + int(s[5:7]) * 100 + int(s[8:10])
+    except (ValueError, IndexError):
+        _log.warning("无法解析的生效日期: %r", raw)
+        return 0
+
+
+def period_end_key(period: str) -> int:
+    """period 如 '2025-01' -> 周期末次日的整数键 20250201（无法解析时为 99991231）"""
+    try:
+        y, m = int(period[:4]), int(period[5:7])
+        if period[4] != "-" or not 1 <= m <= 12:
+            raise ValueError(period)
+    except (ValueError, IndexError, TypeError):
+        return 99991231
+    if m == 12:
+        return (y + 1) * 10000 + 101
+    return y * 10000 + (m + 1) * 100 + 1
+
+
+def _files_state() -> Tuple[Tuple[int, int], ...]:
+    state = []
+    for path in _WATCHED_PATHS:
+        try:
+            st = path.stat()
+            state.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            state.append((0, 0))
+    return tuple(state)
+
+
+class EffectiveDatedList:
+    """按生效日期排序的配置条目，bisect 取「生效日期 ≤ 键」的最新一条"""
+
+    def __init__(self, items: List[Dict[str, Any]], effective_field: str = "effective_date"):
+        # 相同生效日期时保留文件中靠前的一条（与原先 max() 的取舍一致）
+        by_key: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            by_key.setdefault(_date_key(item.get(effective_field)), item)
+        self.keys: List[int] = sorted(by_key)
+        self.items: List[Dict[str, Any]] = [by_key[k] for k in self.keys]
+
+    def at(self, key: int) -> Optional[Dict[str, Any]]:
+        index = bisect_right(self.keys, key) - 1
+        return self.items[index] if index >= 0 else None
+
+
+# 可被模拟覆盖的配置文档：文档名（文件名去扩展名） -> 路径
+OVERRIDABLE_DOCUMENTS = {
+    "position_salary_ratio": _POSITION_SALARY_RATIO_PATH,
+    "employee_type_discount": _EMPLOYEE_TYPE_DISCOUNT_PATH,
+    "assessment_grade_coefficient": _ASSESSMENT_GRADE_COEFFICIENT_PATH,
+    "social_security_config": _SOCIAL_SECURITY_CONFIG_PATH,
+    "income_tax_brackets": _BRACKETS_PATH,
+}
+
+
+def _load_documents(strict: bool) -> Tuple[Dict[str, dict], Optional[Exception]]:
+    """读取全部配置文档，返回 ({文档名: YAML 内容}, 税率表错误)"""
+    documents: Dict[str, dict] = {}
+    for name, path in OVERRIDABLE_DOCUMENTS.items():
+        if path is _BRACKETS_PATH:
+            continue
+        documents[name] = _load_yaml(path, raise_on_error=strict)
+    # 税率表缺失或无效时，计算个税需报错：记录异常，由 get_brackets 抛出
+    brackets_error: Optional[Exception] = None
+    try:
+        documents["income_tax_brackets"] = _load_yaml(_BRACKETS_PATH, raise_on_error=True)
+    except (FileNotFoundError, ValueError) as e:
+        if strict:
+            raise
+        documents["income_tax_brackets"] = {}
+        brackets_error = e
+    documents["payroll_metrics"] = _load_yaml(_METRICS_PATH, raise_on_error=strict)
+    return documents, brackets_error
+
+
+class ConfigSnapshot:
+    """一次完整解析的配置快照（构建后不再修改）"""
+
+    def __init__(
+        self,
+        documents: Dict[str, dict],
+        version: str,
+        files_state: Optional[Tuple[Tuple[int, int], ...]] = None,
+        brackets_error: Optional[Exception] = None,
+        overlay_digest: Optional[str] = None,
+    ):
+        self.documents = documents
+        self.version = version
+        self.files_state = files_state
+        # 非空表示这是叠加了内存覆盖的模拟快照（见 config_overrides）
+        self.overlay_digest = overlay_digest
+
+        self.position_salary_ratio_items: List[Dict[str, Any]] = documents["position_salary_ratio"].get("items", [])
+        self.position_ratio: Dict[str, Dict[str, float]] = {
+            item["position_category"]: {
+                "base_ratio": float(item.get("base_ratio", 0.7)),
+                "performance_ratio": float(item.get("performance_ratio", 0.3)),
+            }
+            for item in self.position_salary_ratio_items
+        }
+
+        self.employee_type_discount_items: List[Dict[str, Any]] = documents["employee_type_discount"].get("items", [])
+        self.employee_discount: Dict[str, float] = {
+            item["employee_type"]: float(item.get("discount_ratio", 1.0))
+            for item in self.employee_type_discount_items
+        }
+
+        self.assessment_grade_coefficient_items: List[Dict[str, Any]] = (
+            documents["assessment_grade_coefficient"].get("items", [])
+        )
+        self.grade_coefficient: Dict[str, float] = {
+            str(item["grade"]): float(item.get("coefficient", 1.0))
+            for item in self.assessment_grade_coefficient_items
+        }
+
+        self.social_security_items: List[Dict[str, Any]] = documents["social_security_config"].get("items", [])
+        self.social_security = EffectiveDatedList(self.social_security_items)
+        self._social_by_period: Dict[str, Optional[Dict[str, Any]]] = {}
+
+        self.brackets_raw: Optional[dict] = None
+        self.brackets: Optional[List[Tuple[float, float, float]]] = None
+        self.brackets_error = brackets_error
+        raw = documents["income_tax_brackets"]
+        if raw:
+            self.brackets_raw = raw
+            self.brackets = [
+                (
+                    float("inf") if row.get("income_upper") is None else float(row["income_upper"]),
+                    float(row.get("rate", 0)),
+                    float(row.get("quick_deduction", 0)),
+                )
+                for row in raw.get("brackets", [])
+            ]
+        elif self.brackets_error is None:
+            self.brackets_error = ValueError("税率表文件为空或无效")
+
+        self.metrics: Dict[str, Any] = documents["payroll_metrics"]
+
+    @classmethod
+    def load(cls, files_state: Tuple[Tuple[int, int], ...], strict: bool = False) -> "ConfigSnapshot":
+        """从配置文件构建快照；strict=True 时任一文件缺失或格式错误即抛出"""
+        documents, brackets_error = _load_documents(strict)
+        snapshot = cls(
+            documents,
+            version=hashlib.sha1(repr(files_state).encode("utf-8")).hexdigest()[:12],
+            files_state=files_state,
+            brackets_error=brackets_error,
+        )
+        if strict and snapshot.brackets is None:
+            raise snapshot.brackets_error
+        return snapshot
+
+    def with_overrides(self, overrides: Dict[str, dict]) -> "ConfigSnapshot":
+        """以内存中的配置文档覆盖本快照的同名文档，返回新的模拟快照（本快照不变）"""
+        unknown = sorted(set(overrides) - set(OVERRIDABLE_DOCUMENTS))
+        if unknown:
+            raise ValueError(f"不支持覆盖的配置: {', '.join(unknown)}")
+        for name, document in overrides.items():
+            if not isinstance(document, dict):
+                raise ValueError(f"配置 {name} 须为与 YAML 文件同结构的对象")
+        documents = dict(self.documents)
+        documents.update(overrides)
+        digest = hashlib.sha1(
+            json.dumps(overrides, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()[:12]
+        try:
+            return ConfigSnapshot(
+                documents,
+                version=f"{self.version}+{digest}",
+                files_state=self.files_state,
+                brackets_error=None if "income_tax_brackets" in overrides else self.brackets_error,
+                overlay_digest=digest,
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"配置覆盖内容无效: {e}") from e
+
+    def social_security_config(self, period: str) -> Optional[Dict[str, Any]]:
+        """发放周期适用的社保公积金配置（按期缓存 bisect 结果）"""
+        try:
+            return self._social_by_period[period]
+        except KeyError:
+            config = self.social_security.at(period_end_key(period))
+            self._social_by_period[period] = config
+            return config
+
+
+class ConfigRegistry:
+    """持有当前配置快照；文件变化时原子替换"""
+
+    def __init__(self, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> ConfigSnapshot:
+        current = self._snapshot
+        now = time.monotonic()
+        if current is not None and now < self._next_check:
+            return current
+        with self._lock:
+            current = self._snapshot
+            if current is not None and now < self._next_check:
+                return current
+            files_state = _files_state()
+            if current is None:
+                current = self._snapshot = ConfigSnapshot.load(files_state)
+            elif files_state != current.files_state:
+                try:
+                    current = self._snapshot = ConfigSnapshot.load(files_state, strict=True)
+                    _log.info("工资配置已重新加载（version=%s）", current.version)
+                except (FileNotFoundError, ValueError, KeyError, TypeError) as e:
+                    _log.warning("工资配置重新加载失败，继续使用旧配置: %s", e)
+            self._next_check = now + self.check_interval
+            return current
+
+    def reload(self) -> ConfigSnapshot:
+        """强制下一次访问重新检查文件"""
+        with self._lock:
+            self._next_check = 0.0
+        return self.snapshot()
+
+
+_registry = ConfigRegistry()
+
+# 当前上下文的模拟快照（config_overrides 内生效，不影响其他线程 / 请求）
+_overlay_snapshot: ContextVar[Optional[ConfigSnapshot]] = ContextVar("_overlay_snapshot", default=None)
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """当前配置快照（同一次计算中应复用同一个快照对象）；处于 config_overrides 中时返回模拟快照"""
+    overlay = _overlay_snapshot.get()
+    if overlay is not None:
+        return overlay
+    return _registry.snapshot()
+
+
+@contextmanager
+def config_overrides(overrides: Optional[Dict[str, dict]]) -> Iterator[ConfigSnapshot]:
+    """
+    在当前上下文内以内存配置文档覆盖注册表（如 {"income_tax_brackets": {"brackets": [...]}}），
+    用于模拟计算；不写文件，退出即恢复。overrides 为空时等同当前配置。
+    """
+    base = get_config_snapshot()
+    snapshot = base.with_overrides(overrides) if overrides else base
+    token = _overlay_snapshot.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _overlay_snapshot.reset(token)
+
+
+def reload_config() -> ConfigSnapshot:
+    return _registry.reload()
@@ -0,0 +1,143 @@
+"""
+Analytics Cache DAO - 经营分析结果缓存（analytics_cache 表）
+
+缓存键为「日期 + 接口 + 规范化参数」，每行记录计算时的 Twin 变更令牌（见 twins/change_dao.py）；
+读取时令牌与当前一致才算命中。缓存存于数据库中，多个 gunicorn worker 共享。
+分析结果依赖当天日期（逾期、近 N 个月），缓存键含日期，写入时顺带清除往日的行。
+
+analytics_cache_fill 为「正在填充」租约：某缓存键未命中时，只有取得租约的 worker 计算，
+其他 worker 轮询等待缓存写入（跨进程合并同一时刻的相同请求）；租约过期视为持有者已崩溃。
+"""
+from __future__ import annotations
+
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from app.daos.base_dao import BaseDAO
+
+ANALYTICS_CACHE_TABLE = "analytics_cache"
+ANALYTICS_CACHE_FILL_TABLE = "analytics_cache_fill"
+
+# 填充租约时长（秒）：超过即允许其他 worker 接手计算
+FILL_LEASE_SECONDS = 30
+# 等待其他 worker 填充时的轮询间隔（秒）
+FILL_POLL_INTERVAL = 0.05
+
+
+def create_analytics_cache_table(cursor) -> None:
+    """创建 analytics_cache 表（供 init_db 使用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ANALYTICS_CACHE_TABLE} (
+            cache_key TEXT PRIMARY KEY,
+            day TEXT NOT NULL,
+            token TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ANALYTICS_CACHE_FILL_TABLE} (
+            cache_key TEXT PRIMARY KEY,
+            token TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            expires_at TEXT NOT NULL
+        )
+    """)
+
+
+def get_cached_payload(cursor, cache_key: str, token: str) -> Optional[str]:
+    """在调用方的读事务内查找缓存；令牌不一致（数据已变）视为未命中"""
+    cursor.execute(
+        f"SELECT payload FROM {ANALYTICS_CACHE_TABLE} WHERE cache_key = ? AND token = ?",
+        (cache_key, token),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class AnalyticsCacheDAO(BaseDAO):
+    """经营分析结果缓存 DAO"""
+
+    def put(self, cache_key: str, token: str, payload: str) -> None:
+        """写入（覆盖）缓存，并清除往日的缓存行"""
+        today = date.today().isoformat()
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                INSERT INTO {ANALYTICS_CACHE_TABLE} (cache_key, day, token, payload, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    day = excluded.day,
+                    token = excluded.token,
+                    payload = excluded.payload,
+                    created_at = excluded.created_at
+                """,
+                (cache_key, today, token, payload, datetime.now().isoformat()),
+            )
+            cursor.execute(f"DELETE FROM {ANALYTICS_CACHE_TABLE} WHERE day != ?", (today,))
+            conn.commit()
+
+    def acquire_fill(self, cache_key: str, token: str, owner: str) -> bool:
+        """尝试取得某缓存键的填充租约（无人持有或已过期时成功）"""
+        now = datetime.now()
+        expires_at = (now + timedelta(seconds=FILL_LEASE_SECONDS)).isoformat()
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                INSERT INTO {ANALYTICS_CACHE_FILL_TABLE} (cache_key, token, owner, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    token = excluded.token,
+                    owner = excluded.owner,
+                    expires_at = excluded.expires_at
+                WHERE expires_at < ? OR token != excluded.token
+                """,
+                (cache_key, token, owner, expires_at, now.isoformat()),
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def release_fill(self, cache_key: str, owner: str) -> None:
+        with self.get_connection(write=True) as conn:
+            conn.execute(
+                f"DELETE FROM {ANALYTICS_CACHE_FILL_TABLE} WHERE cache_key = ? AND owner = ?",
+                (cache_key, owner),
+            )
+            conn.commit()
+
+    def wait_for_fill(self, cache_key: str, token: str) -> Optional[str]:
+        """
+        等待其他 worker 填充缓存：缓存出现即返回；租约被释放 / 过期 / 换了令牌仍无缓存时返回 None
+        （由调用方自行计算）
+        """
+        deadline = time.monotonic() + FILL_LEASE_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(FILL_POLL_INTERVAL)
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                payload = get_cached_payload(cursor, cache_key, token)
+                if payload is not None:
+                    return payload
+                cursor.execute(
+                    f"SELECT 1 FROM {ANALYTICS_CACHE_FILL_TABLE} WHERE cache_key = ? AND token = ? AND expires_at >= ?",
+                    (cache_key, token, datetime.now().isoformat()),
+                )
+                if cursor.fetchone() is None:
+                    return None
+        return None
+
+    def count(self) -> int:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {ANALYTICS_CACHE_TABLE}")
+            return cursor.fetchone()[0]
+
+    def clear(self) -> int:
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {ANALYTICS_CACHE_TABLE}")
+            conn.commit()
+            return cursor.rowcount
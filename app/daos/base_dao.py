@@ -3,15 +3,79 @@ Base DAO - 基础 DAO 类
 """
 from __future__ import annotations
 
+import hashlib
 import sqlite3
+from contextvars import ContextVar
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, Tuple
 from contextlib import contextmanager
 
+from app.profiling import current_profile
 from app.schema.loader import SchemaLoader
 from app.schema.models import TwinSchema
 
 
+# 当前上下文固定使用的只读快照连接：(db_path, conn, 快照标记)，见 read_snapshot
+_pinned_snapshot: ContextVar[Optional[Tuple[str, sqlite3.Connection, str]]] = ContextVar(
+    "_pinned_snapshot", default=None
+)
+
+# 快照连接上当前安装的查询计数回调所属的剖析：(conn, profile)，见 get_connection。
+# 嵌套的 get_connection 退出时恢复外层的回调，而不是清除
+_snapshot_trace: ContextVar[Optional[Tuple[sqlite3.Connection, Any]]] = ContextVar(
+    "_snapshot_trace", default=None
+)
+
+
+def _snapshot_marker(conn: sqlite3.Connection) -> str:
+    """
+    快照标记：开始时间 + 各状态表最大行 id 的摘要。
+    同一快照内读到的数据完全相同；两次运行标记中的摘要相同即表示读到的是同一数据库状态。
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_history' ESCAPE '\\' ORDER BY name"
+    )
+    tables = [row[0] for row in cursor.fetchall()]
+    parts = []
+    for table in tables:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        parts.append(f"{table}:{cursor.fetchone()[0]}")
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12]
+    return f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')}#{digest}"
+
+
+@contextmanager
+def read_snapshot(db_path: Any) -> Iterator[str]:
+    """
+    在专用连接上开启一个只读事务（WAL 模式下即一致性快照），并在当前上下文内固定：
+    期间所有 DAO 的读操作都复用该连接、看到同一数据库状态，且不再逐次建立连接。
+    写操作（get_connection(write=True)）仍使用独立连接，快照内不可见。
+    yield 快照标记；嵌套调用复用外层快照。
+    """
+    db_path = str(db_path)
+    pinned = _pinned_snapshot.get()
+    if pinned is not None and pinned[0] == db_path:
+        yield pinned[2]
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute("BEGIN")
+        marker = _snapshot_marker(conn)  # 首次读取即确定快照
+        token = _pinned_snapshot.set((db_path, conn, marker))
+        try:
+            yield marker
+        finally:
+            _pinned_snapshot.reset(token)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
 class BaseDAO:
     """基础 DAO 类"""
     
@@ -30,9 +94,12 @@ class BaseDAO:
         self._twin_schemas: Dict[str, TwinSchema] = {}
     
     @contextmanager
-    def get_connection(self):
+    def get_connection(self, write: bool = False):
         """
         获取数据库连接的上下文管理器
+
+        处于 read_snapshot 中时，读操作复用快照连接（不关闭）；write=True 总是使用独立的新连接。
+        处于 profiling() 中时，连接上执行的每条 SQL 计入当前剖析的查询数。
         
         使用示例:
             with self.get_connection() as conn:
@@ -40,8 +107,28 @@ class BaseDAO:
                 cursor.execute(...)
                 conn.commit()
         """
+        profile = current_profile()
+        if not write:
+            pinned = _pinned_snapshot.get()
+            if pinned is not None and pinned[0] == str(self.db_path):
+                conn = pinned[1]
+                outer = _snapshot_trace.get()
+                outer_profile = outer[1] if outer is not None and outer[0] is conn else None
+                if profile is None or profile is outer_profile:
+                    yield conn
+                    return
+                conn.set_trace_callback(profile.record_query)
+                token = _snapshot_trace.set((conn, profile))
+                try:
+                    yield conn
+                finally:
+                    _snapshot_trace.reset(token)
+                    conn.set_trace_callback(outer_profile.record_query if outer_profile is not None else None)
+                return
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
+        if profile is not None:
+            conn.set_trace_callback(profile.record_query)
         try:
             yield conn
         finally:
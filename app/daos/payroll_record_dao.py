@@ -0,0 +1,113 @@
+"""
+Payroll Record DAO - 已生成工资单列表（只读）
+
+一条 SQL 联接 person_company_payroll 注册表、该期状态行（time_key = period）与人员最新姓名，
+支持按金额列排序与分页；同一语句以窗口函数返回总条数与全部结果的金额合计。
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.daos.base_dao import BaseDAO
+
+# 可排序 / 合计的金额列（工资单 data 中的字段）
+PAYROLL_AMOUNT_COLUMNS = [
+    "base_amount",
+    "social_deduction_total",
+    "tax_monthly",
+    "total_amount",
+]
+
+# 非金额排序列 -> SQL 表达式
+_SORT_EXPRESSIONS = {
+    "id": "a.id",
+    "person_id": "a.person_id",
+    "person_name": "person_name",
+}
+
+
+def _amount_expr(column: str) -> str:
+    return f"CAST(COALESCE(json_extract(h.data, '$.{column}'), 0) AS REAL)"
+
+
+class PayrollRecordDAO(BaseDAO):
+    """工资单列表 DAO（person_company_payroll 的只读联接查询）"""
+
+    def list_records(
+        self,
+        period: str,
+        company_id: int,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], int, Dict[str, float]]:
+        """
+        指定期数、公司的工资单，返回 (rows, 总条数, 全部结果的金额合计)。
+
+        rows 与 PayrollService.list_payroll_records 原有结构一致：
+        id / person_id / company_id / salary_period / 工资单 data 各字段 / person_name。
+        sort_by 取 PAYROLL_AMOUNT_COLUMNS 或 id / person_id / person_name，默认按 id。
+        """
+        if sort_by in PAYROLL_AMOUNT_COLUMNS:
+            order_expr = _amount_expr(sort_by)
+        elif sort_by in _SORT_EXPRESSIONS or sort_by is None:
+            order_expr = _SORT_EXPRESSIONS[sort_by or "id"]
+        else:
+            raise ValueError(f"不支持的排序列: {sort_by}")
+        direction = "DESC" if descending else "ASC"
+
+        payroll = self._get_twin_schema("person_company_payroll")
+        person = self._get_twin_schema("person")
+        totals_select = ",\n                ".join(
+            f"SUM({_amount_expr(column)}) OVER () AS _sum_{column}" for column in PAYROLL_AMOUNT_COLUMNS
+        )
+        sql = f"""
+            SELECT
+                a.id, a.person_id, a.company_id, h.data,
+                (
+                    SELECT json_extract(p.data, '$.name') FROM {person.state_table} p
+                    WHERE p.twin_id = a.person_id
+                    ORDER BY p.version DESC
+                    LIMIT 1
+                ) AS person_name,
+                COUNT(*) OVER () AS _total,
+                {totals_select}
+            FROM {payroll.table} a
+            JOIN {payroll.state_table} h ON h.twin_id = a.id AND h.time_key = ?
+            WHERE a.company_id = ? AND a.person_id IS NOT NULL
+            ORDER BY {order_expr} {direction}, a.id {direction}
+        """
+        params: List[Any] = [period, int(company_id)]
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([int(limit), int(offset)])
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        if rows:
+            total = rows[0]["_total"]
+            totals = {column: round(rows[0][f"_sum_{column}"] or 0, 2) for column in PAYROLL_AMOUNT_COLUMNS}
+        elif offset:
+            # 超出末页时仍需返回总数与合计
+            _, total, totals = self.list_records(period, company_id, limit=1, offset=0)
+        else:
+            total, totals = 0, {column: 0.0 for column in PAYROLL_AMOUNT_COLUMNS}
+
+        records: List[Dict[str, Any]] = []
+        for row in rows:
+            data = json.loads(row["data"]) if row["data"] else {}
+            pid = row["person_id"]
+            records.append({
+                "id": row["id"],
+                "person_id": pid,
+                "company_id": row["company_id"],
+                "salary_period": period,
+                **{k: v for k, v in data.items() if k != "salary_period"},
+                "person_name": row["person_name"] or f"人员{pid}",
+            })
+        return records, total, totals
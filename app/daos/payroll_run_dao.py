@@ -0,0 +1,276 @@
+"""
+Payroll Run DAO - 工资单生成任务（payroll_run 表）
+
+payroll_run 不是 Twin，而是后台任务的运行记录：
+保存生成范围、待处理目标列表、进度检查点（done）与错误，
+供后台 worker 认领执行，并在进程崩溃后从检查点继续。
+"""
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.daos.base_dao import BaseDAO
+
+PAYROLL_RUN_TABLE = "payroll_run"
+# 开启剖析的任务：行存在即表示开启，profile 为累计的剖析结果（JSON，执行后写入）
+PAYROLL_RUN_PROFILE_TABLE = "payroll_run_profile"
+
+# 任务状态
+RUN_PENDING = "pending"
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+
+
+def create_payroll_run_table(cursor) -> None:
+    """创建 payroll_run 表（供 init_db 与 DAO 共用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PAYROLL_RUN_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            company_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            person_id INTEGER,
+            department TEXT,
+            targets TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            generated INTEGER NOT NULL DEFAULT 0,
+            errors TEXT NOT NULL DEFAULT '[]',
+            worker TEXT,
+            heartbeat_at TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{PAYROLL_RUN_TABLE}_status
+        ON {PAYROLL_RUN_TABLE}(status, heartbeat_at)
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PAYROLL_RUN_PROFILE_TABLE} (
+            run_id INTEGER PRIMARY KEY,
+            profile TEXT,
+            updated_at TEXT
+        )
+    """)
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def _fmt(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class PayrollRunDAO(BaseDAO):
+    """工资单生成任务 DAO"""
+
+    def _row_to_run(self, row, include_targets: bool = False) -> Dict[str, Any]:
+        run = dict(row)
+        run["errors"] = json.loads(run.get("errors") or "[]")
+        targets = json.loads(run.pop("targets") or "[]")
+        if include_targets:
+            run["targets"] = [tuple(t) for t in targets]
+        return run
+
+    def create_run(
+        self,
+        scope: str,
+        company_id: int,
+        period: str,
+        targets: List[Tuple[int, int]],
+        person_id: Optional[int] = None,
+        department: Optional[str] = None,
+        profile: bool = False,
+    ) -> int:
+        """新建待执行任务，返回 run_id；profile=True 时执行过程记录剖析结果"""
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                INSERT INTO {PAYROLL_RUN_TABLE}
+                    (status, scope, company_id, period, person_id, department, targets, total, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    RUN_PENDING, scope, int(company_id), period, person_id, department,
+                    json.dumps([list(t) for t in targets]), len(targets), _fmt(_now()),
+                ),
+            )
+            run_id = cursor.lastrowid
+            if profile:
+                cursor.execute(
+                    f"INSERT INTO {PAYROLL_RUN_PROFILE_TABLE} (run_id, profile, updated_at) VALUES (?, NULL, ?)",
+                    (run_id, _fmt(_now())),
+                )
+            conn.commit()
+            return run_id
+
+    def get_run(self, run_id: int, include_targets: bool = False) -> Optional[Dict[str, Any]]:
+        """获取任务（默认不返回 targets 列表）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM {PAYROLL_RUN_TABLE} WHERE id = ?", (run_id,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return self._row_to_run(row, include_targets=include_targets)
+
+    def list_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近的任务列表（按 id 倒序）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM {PAYROLL_RUN_TABLE} ORDER BY id DESC LIMIT ?",
+                (int(limit),),
+            )
+            rows = cursor.fetchall()
+        return [self._row_to_run(row) for row in rows]
+
+    def claim_next_run(self, worker: str, stale_seconds: int) -> Optional[Dict[str, Any]]:
+        """
+        认领一个待执行任务：pending，或心跳超时的 running（worker 崩溃后续跑）。
+        使用 BEGIN IMMEDIATE 保证多个进程不会认领同一任务。
+        """
+        now = _now()
+        stale_before = _fmt(now - timedelta(seconds=stale_seconds))
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                f"""
+                SELECT id FROM {PAYROLL_RUN_TABLE}
+                WHERE status = ? OR (status = ? AND heartbeat_at < ?)
+                ORDER BY id
+                LIMIT 1
+                """,
+                (RUN_PENDING, RUN_RUNNING, stale_before),
+            )
+            row = cursor.fetchone()
+            if not row:
+                conn.rollback()
+                return None
+            cursor.execute(
+                f"""
+                UPDATE {PAYROLL_RUN_TABLE}
+                SET status = ?, worker = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?)
+                WHERE id = ?
+                """,
+                (RUN_RUNNING, worker, _fmt(now), _fmt(now), row["id"]),
+            )
+            conn.commit()
+        return self.get_run(row["id"], include_targets=True)
+
+    def heartbeat(self, run_id: int, worker: str) -> bool:
+        """刷新心跳；任务已不属于该 worker（超时被重新认领或已结束）时返回 False"""
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE {PAYROLL_RUN_TABLE} SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (_fmt(_now()), run_id, worker, RUN_RUNNING),
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def record_progress(
+        self,
+        run_id: int,
+        worker: str,
+        done: int,
+        generated: int,
+        error: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        提交检查点：已处理到第 done 个目标；同时刷新心跳。
+        任务已不属于该 worker（超时被重新认领或已结束）时不写入，返回 False
+        """
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            if error:
+                cursor.execute(
+                    f"""
+                    UPDATE {PAYROLL_RUN_TABLE}
+                    SET done = ?, generated = ?, heartbeat_at = ?,
+                        errors = json_insert(errors, '$[#]', json(?))
+                    WHERE id = ? AND worker = ? AND status = ?
+                    """,
+                    (
+                        done, generated, _fmt(_now()), json.dumps(error, ensure_ascii=False),
+                        run_id, worker, RUN_RUNNING,
+                    ),
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    UPDATE {PAYROLL_RUN_TABLE}
+                    SET done = ?, generated = ?, heartbeat_at = ?
+                    WHERE id = ? AND worker = ? AND status = ?
+                    """,
+                    (done, generated, _fmt(_now()), run_id, worker, RUN_RUNNING),
+                )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def finish_run(
+        self,
+        run_id: int,
+        worker: str,
+        status: str,
+        error: Optional[str] = None,
+        profile: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        结束任务（completed / failed），profile 不为 None 时在同一事务内保存剖析结果（覆盖）。
+        任务已不属于该 worker 时不写入，返回 False
+        """
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            if error:
+                cursor.execute(
+                    f"""
+                    UPDATE {PAYROLL_RUN_TABLE}
+                    SET status = ?, finished_at = ?, heartbeat_at = ?,
+                        errors = json_insert(errors, '$[#]', json(?))
+                    WHERE id = ? AND worker = ? AND status = ?
+                    """,
+                    (
+                        status, _fmt(_now()), _fmt(_now()), json.dumps({"reason": error}, ensure_ascii=False),
+                        run_id, worker, RUN_RUNNING,
+                    ),
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    UPDATE {PAYROLL_RUN_TABLE}
+                    SET status = ?, finished_at = ?, heartbeat_at = ?
+                    WHERE id = ? AND worker = ? AND status = ?
+                    """,
+                    (status, _fmt(_now()), _fmt(_now()), run_id, worker, RUN_RUNNING),
+                )
+            owned = cursor.rowcount > 0
+            if owned and profile is not None:
+                cursor.execute(
+                    f"UPDATE {PAYROLL_RUN_PROFILE_TABLE} SET profile = ?, updated_at = ? WHERE run_id = ?",
+                    (json.dumps(profile, ensure_ascii=False), _fmt(_now()), run_id),
+                )
+            conn.commit()
+            return owned
+
+    def get_profile(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """任务的剖析结果：未开启剖析返回 None，已开启但尚未执行返回 {}"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT profile FROM {PAYROLL_RUN_PROFILE_TABLE} WHERE run_id = ?",
+                (run_id,),
+            )
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return json.loads(row["profile"]) if row["profile"] else {}
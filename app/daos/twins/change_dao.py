@@ -0,0 +1,45 @@
+"""
+Twin Change DAO - 按 Twin 类型的变更计数（twin_change 表）
+
+每次追加状态、删除 Twin、创建 Activity 时，在同一事务内把该 Twin 类型的计数加一。
+读方在自己的只读事务中读取相关类型的计数作为变更令牌：令牌不变即这些 Twin 的数据未变，
+可直接复用以该令牌缓存的结果（见 analytics_cache_dao）；跨进程可见，不依赖连接级的 PRAGMA data_version。
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+TWIN_CHANGE_TABLE = "twin_change"
+
+
+def create_twin_change_table(cursor) -> None:
+    """创建 twin_change 表（供 init_db 使用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TWIN_CHANGE_TABLE} (
+            twin_name TEXT PRIMARY KEY,
+            counter INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def bump_twin_change(cursor, twin_name: str) -> None:
+    """在调用方事务内把某 Twin 类型的变更计数加一"""
+    cursor.execute(
+        f"""
+        INSERT INTO {TWIN_CHANGE_TABLE} (twin_name, counter) VALUES (?, 1)
+        ON CONFLICT (twin_name) DO UPDATE SET counter = counter + 1
+        """,
+        (twin_name,),
+    )
+
+
+def twin_change_token(cursor, twin_names: Iterable[str]) -> str:
+    """若干 Twin 类型的变更令牌（"名称:计数|..."，未写入过的类型计为 0）"""
+    names = sorted(set(twin_names))
+    placeholders = ", ".join("?" for _ in names)
+    cursor.execute(
+        f"SELECT twin_name, counter FROM {TWIN_CHANGE_TABLE} WHERE twin_name IN ({placeholders})",
+        names,
+    )
+    counters = {row[0]: row[1] for row in cursor.fetchall()}
+    return "|".join(f"{name}:{counters.get(name, 0)}" for name in names)
@@ -0,0 +1,173 @@
+"""
+Twin Facet DAO - 枚举字段分面计数（twin_facet 表）
+
+对每个 Twin 类型的枚举字段（schema 中 type: enum 且声明了 options），按最新状态统计每个取值的 Twin 数：
+
+- versioned：每个 Twin 取最新版本
+- time_series：每个 Twin 取最大 time_key 的状态
+
+计数在追加状态 / 删除 Twin 的同一事务内增量维护（写入前减去受影响 Twin 的旧取值、写入后加上新取值），
+有状态的 Twin 总数记在同表的保留行（field / value 为空串）中，列表页的分面无需扫描状态表与 json_extract。带过滤条件的分面交集由 app/services/facet_service.py 的内存位图计算。
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.daos.base_dao import BaseDAO, read_snapshot
+from app.daos.twins.change_dao import twin_change_token
+from app.schema.models import TwinSchema
+
+TWIN_FACET_TABLE = "twin_facet"
+
+# 有状态的 Twin 总数所在的保留行 (field, value)；枚举字段名不会为空串
+_TOTAL_KEY = ("", "")
+
+
+def create_twin_facet_table(cursor) -> None:
+    """创建 twin_facet 表（供 init_db 使用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TWIN_FACET_TABLE} (
+            twin_name TEXT NOT NULL,
+            field TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (twin_name, field, value)
+        )
+    """)
+
+
+def enum_fields(schema: TwinSchema) -> List[str]:
+    """schema 中声明了 options 的枚举字段（按声明顺序）"""
+    return [
+        name for name, field_def in (schema.fields or {}).items()
+        if field_def.type == "enum" and field_def.options
+    ]
+
+
+def latest_enum_values(
+    cursor, schema: TwinSchema, fields: List[str], twin_ids: Optional[List[int]] = None
+) -> List[tuple]:
+    """
+    若干 Twin（None 表示全部）最新状态中的枚举字段取值：[(twin_id, 取值...), ...]，按 twin_id 排序。
+    """
+    order_column = "version" if schema.mode == "versioned" else "time_key"
+    id_filter, params = "", []
+    if twin_ids is not None:
+        id_filter = f"WHERE twin_id IN ({', '.join('?' for _ in twin_ids)})"
+        params = list(twin_ids)
+    columns = ["s.twin_id"] + [f"json_extract(s.data, '$.{field}')" for field in fields]
+    cursor.execute(
+        f"""
+        SELECT {', '.join(columns)} FROM {schema.state_table} s
+        JOIN (
+            SELECT twin_id, MAX({order_column}) AS latest FROM {schema.state_table}
+            {id_filter}
+            GROUP BY twin_id
+        ) m ON m.twin_id = s.twin_id AND m.latest = s.{order_column}
+        ORDER BY s.twin_id
+        """,
+        params,
+    )
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def _apply_counts(cursor, schema: TwinSchema, fields: List[str], rows: List[tuple], sign: int) -> None:
+    """把若干 Twin 的取值以 ±1 计入 twin_facet，Twin 总数同样增减（计数归零的行删除；空值不计）"""
+    deltas: Dict[Tuple[str, str], int] = {_TOTAL_KEY: sign * len(rows)}
+    for row in rows:
+        for field, value in zip(fields, row[1:]):
+            if value is not None and value != "":
+                key = (field, str(value))
+                deltas[key] = deltas.get(key, 0) + sign
+    for (field, value), delta in deltas.items():
+        if not delta:
+            continue
+        cursor.execute(
+            f"""
+            INSERT INTO {TWIN_FACET_TABLE} (twin_name, field, value, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (twin_name, field, value) DO UPDATE SET count = count + excluded.count
+            """,
+            (schema.name, field, value, delta),
+        )
+    cursor.execute(f"DELETE FROM {TWIN_FACET_TABLE} WHERE twin_name = ? AND count <= 0", (schema.name,))
+
+
+@contextmanager
+def maintain_twin_facets(cursor, schema: TwinSchema, twin_ids: List[int]) -> Iterator[None]:
+    """包裹一次 Twin 写入（在同一事务内）：写入前减去受影响 Twin 的旧取值，写入后加上新取值"""
+    fields = enum_fields(schema)
+    if not fields or not twin_ids:
+        yield
+        return
+    _apply_counts(cursor, schema, fields, latest_enum_values(cursor, schema, fields, twin_ids), -1)
+    yield
+    _apply_counts(cursor, schema, fields, latest_enum_values(cursor, schema, fields, twin_ids), 1)
+
+
+class TwinFacetDAO(BaseDAO):
+    """枚举字段分面计数 DAO"""
+
+    def is_empty(self, twin_name: str) -> bool:
+        """尚无 Twin 总数行（未回填，或该类型还没有状态）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT 1 FROM {TWIN_FACET_TABLE} WHERE twin_name = ? AND field = ? AND value = ?",
+                (twin_name, *_TOTAL_KEY),
+            )
+            return cursor.fetchone() is None
+
+    def rebuild(self, twin_name: str) -> int:
+        """全量重算某 Twin 类型的分面计数（既有数据回填），返回计入的 Twin 数"""
+        schema = self._get_twin_schema(twin_name)
+        fields = enum_fields(schema)
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {TWIN_FACET_TABLE} WHERE twin_name = ?", (twin_name,))
+            rows = latest_enum_values(cursor, schema, fields) if fields else []
+            _apply_counts(cursor, schema, fields, rows, 1)
+            conn.commit()
+        return len(rows)
+
+    def get_counts(self, twin_name: str) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """某 Twin 类型有状态的 Twin 数与各枚举字段的取值计数 (总数, {字段: {取值: Twin 数}})，一次读取计数表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT field, value, count FROM {TWIN_FACET_TABLE} WHERE twin_name = ?",
+                (twin_name,),
+            )
+            rows = cursor.fetchall()
+        total = 0
+        counts: Dict[str, Dict[str, int]] = {}
+        for field, value, count in rows:
+            if (field, value) == _TOTAL_KEY:
+                total = count
+            else:
+                counts.setdefault(field, {})[value] = count
+        return total, counts
+
+    def get_change_token(self, twin_name: str) -> str:
+        """某 Twin 类型的变更令牌（见 change_dao）"""
+        with self.get_connection() as conn:
+            return twin_change_token(conn.cursor(), [twin_name])
+
+    def load_latest_values(self, twin_name: str) -> Tuple[str, List[str], List[tuple]]:
+        """
+        在一次只读事务内取变更令牌与全部 Twin 的最新取值，供内存位图构建：
+        (令牌, 列名 [枚举字段..., 注册表外键...], [(twin_id, 枚举取值..., 外键...), ...])
+        """
+        schema = self._get_twin_schema(twin_name)
+        fields = enum_fields(schema)
+        related_keys = [rel.key for rel in schema.related_entities or []] if schema.type == "activity" else []
+        with read_snapshot(self.db_path), self.get_connection() as conn:
+            cursor = conn.cursor()
+            token = twin_change_token(cursor, [twin_name])
+            rows = latest_enum_values(cursor, schema, fields)
+            registry = {}
+            if related_keys:
+                cursor.execute(f"SELECT id, {', '.join(related_keys)} FROM {schema.table}")
+                registry = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        empty = (None,) * len(related_keys)
+        return token, fields + related_keys, [row + registry.get(row[0], empty) for row in rows]
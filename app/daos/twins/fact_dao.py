@@ -0,0 +1,160 @@
+"""
+Twin Fact DAO - 分析事实表（fact_*）
+
+对 schema 中声明了 fact_table 的 Twin，把最新状态展开为定型列（REAL / INTEGER / TEXT）：
+
+- versioned：每个 Twin 一行（主键 twin_id），取最新版本
+- time_series：每个 (twin_id, time_key) 一行
+- Activity 的注册表外键（如 person_id、payment_item_id）自动作为 INTEGER 列
+
+事实行由 TwinStateDAO 在追加状态的同一事务内刷新、由 TwinDAO 删除 Twin 时一并删除，
+经营分析直接查询事实表，无需逐行 MAX(version) 相关子查询与 json_extract。
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from app.daos.base_dao import BaseDAO
+from app.schema.models import TwinSchema
+
+# 事实列允许的类型
+FACT_COLUMN_TYPES = ("REAL", "INTEGER", "TEXT")
+
+
+def _fact_columns(schema: TwinSchema) -> Dict[str, str]:
+    """事实表的数据列 {列名: 类型}：注册表外键在前，其后为 fact_table.columns 声明的 data 字段"""
+    columns: Dict[str, str] = {}
+    if schema.type == "activity":
+        for rel in schema.related_entities or []:
+            columns[rel.key] = "INTEGER"
+    for field, col_type in (schema.fact_table.get("columns") or {}).items():
+        col_type = str(col_type).upper()
+        if col_type not in FACT_COLUMN_TYPES:
+            raise ValueError(f"{schema.name}.fact_table 列 {field} 类型不支持: {col_type}")
+        columns.setdefault(field, col_type)
+    return columns
+
+
+def _registry_keys(schema: TwinSchema) -> List[str]:
+    return [rel.key for rel in schema.related_entities or []] if schema.type == "activity" else []
+
+
+def _select_expr(schema: TwinSchema, field: str, col_type: str) -> str:
+    if field in _registry_keys(schema):
+        return f"a.{field}"
+    extract = f"json_extract(s.data, '$.{field}')"
+    if col_type == "TEXT":
+        return extract
+    return f"CAST({extract} AS {col_type})"
+
+
+def create_twin_fact_table(cursor, schema: TwinSchema) -> bool:
+    """
+    创建某 Twin 的事实表（schema 未声明 fact_table 时不做任何事）。
+    表已存在而 schema 新增了列时补列，返回 True（调用方需全量回填）。
+    """
+    if not schema.fact_table:
+        return False
+    name = schema.fact_table["name"]
+    columns = _fact_columns(schema)
+    key_columns = ["twin_id INTEGER NOT NULL"]
+    primary_key = "twin_id"
+    if schema.mode == "time_series":
+        key_columns.append("time_key TEXT NOT NULL")
+        primary_key = "twin_id, time_key"
+    column_defs = key_columns + [f"{col} {col_type}" for col, col_type in columns.items()]
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            {', '.join(column_defs)},
+            PRIMARY KEY ({primary_key})
+        )
+    """)
+    cursor.execute(f"PRAGMA table_info({name})")
+    existing = {row[1] for row in cursor.fetchall()}
+    added = [col for col in columns if col not in existing]
+    for col in added:
+        cursor.execute(f"ALTER TABLE {name} ADD COLUMN {col} {columns[col]}")
+    for index_columns in schema.fact_table.get("indexes") or []:
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{name}_{'_'.join(index_columns)}
+            ON {name}({', '.join(index_columns)})
+        """)
+    return bool(added)
+
+
+def refresh_twin_fact(cursor, schema: TwinSchema, twin_id: int, time_key: Optional[str] = None) -> None:
+    """
+    在调用方事务内刷新单个 Twin 的事实行（schema 未声明 fact_table 时不做任何事）。
+    versioned 取最新版本；time_series 刷新 time_key 对应的一行（time_key 为空时刷新该 Twin 全部期数）。
+    """
+    if not schema.fact_table:
+        return
+    name = schema.fact_table["name"]
+    columns = _fact_columns(schema)
+    insert_columns = ["twin_id"] + (["time_key"] if schema.mode == "time_series" else []) + list(columns)
+    select_exprs = ["s.twin_id"] + (["s.time_key"] if schema.mode == "time_series" else []) + [
+        _select_expr(schema, field, col_type) for field, col_type in columns.items()
+    ]
+    join = f"JOIN {schema.table} a ON a.id = s.twin_id" if _registry_keys(schema) else ""
+
+    if schema.mode == "time_series":
+        conditions, params = ["s.twin_id = ?"], [twin_id]
+        delete_sql = f"DELETE FROM {name} WHERE twin_id = ?"
+        if time_key is not None:
+            conditions.append("s.time_key = ?")
+            params.append(time_key)
+            delete_sql += " AND time_key = ?"
+        cursor.execute(delete_sql, params)
+        cursor.execute(
+            f"""
+            INSERT INTO {name} ({', '.join(insert_columns)})
+            SELECT {', '.join(select_exprs)} FROM {schema.state_table} s {join}
+            WHERE {' AND '.join(conditions)}
+            """,
+            params,
+        )
+        return
+
+    cursor.execute(f"DELETE FROM {name} WHERE twin_id = ?", (twin_id,))
+    cursor.execute(
+        f"""
+        INSERT INTO {name} ({', '.join(insert_columns)})
+        SELECT {', '.join(select_exprs)} FROM {schema.state_table} s {join}
+        WHERE s.twin_id = ?
+        ORDER BY s.version DESC
+        LIMIT 1
+        """,
+        (twin_id,),
+    )
+
+
+def delete_twin_fact(cursor, schema: TwinSchema, twin_id: int) -> None:
+    """在调用方事务内删除 Twin 的事实行"""
+    if schema.fact_table:
+        cursor.execute(f"DELETE FROM {schema.fact_table['name']} WHERE twin_id = ?", (twin_id,))
+
+
+class TwinFactDAO(BaseDAO):
+    """事实表 DAO（维护用；查询由各分析模块直接写 SQL）"""
+
+    def is_empty(self, twin_name: str) -> bool:
+        schema = self._get_twin_schema(twin_name)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT 1 FROM {schema.fact_table['name']} LIMIT 1")
+            return cursor.fetchone() is None
+
+    def rebuild(self, twin_name: str) -> int:
+        """全量重建某 Twin 的事实表（用于既有数据回填），返回处理的 Twin 数"""
+        schema = self._get_twin_schema(twin_name)
+        if not schema.fact_table:
+            return 0
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT DISTINCT twin_id FROM {schema.state_table}")
+            twin_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"DELETE FROM {schema.fact_table['name']}")
+            for twin_id in twin_ids:
+                refresh_twin_fact(cursor, schema, twin_id)
+            conn.commit()
+        return len(twin_ids)
@@ -0,0 +1,293 @@
+"""
+Twin Interval DAO - 生效区间索引（twin_interval 表）
+
+对 schema 中声明了 interval_index 的 versioned Twin（如雇佣信息），
+将版本历史展开为「字段在 [valid_from, valid_to) 内取值为 value」的区间行：
+
+- valid_from：该版本的生效日期（effective_field 经 normalize_effective_date 归一为 YYYY-MM-DD，缺失视为最早 ''）
+- valid_to：按 (生效日期, 状态行 id) 排序后下一版本的生效日期，最后一版为 NULL；
+  同一生效日期的多个版本中，较早写入者得到空区间 [d, d)，即被后写入者覆盖
+
+区间行由 TwinStateDAO 在追加状态的同一事务内增量维护（append_twin_interval）：新版本只截断其前一版本的区间、
+接上后一版本的生效日期，代价与历史长度无关；rebuild_twin_intervals / TwinIntervalDAO.rebuild 按版本历史全量重建（回填）。
+每个版本都保留区间行（包括被覆盖的空区间），以便按版本遍历（如统计入职/离职）。
+"""
+from __future__ import annotations
+
+import json
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.daos.base_dao import BaseDAO
+from app.schema.models import TwinSchema
+
+TWIN_INTERVAL_TABLE = "twin_interval"
+
+
+def create_twin_interval_table(cursor) -> None:
+    """创建 twin_interval 表（供 init_db 使用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TWIN_INTERVAL_TABLE} (
+            twin_name TEXT NOT NULL,
+            twin_id INTEGER NOT NULL,
+            state_id INTEGER NOT NULL,
+            field TEXT NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT,
+            value TEXT
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{TWIN_INTERVAL_TABLE}_lookup
+        ON {TWIN_INTERVAL_TABLE}(twin_name, twin_id, field, valid_from)
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{TWIN_INTERVAL_TABLE}_field
+        ON {TWIN_INTERVAL_TABLE}(twin_name, field, valid_from)
+    """)
+
+
+def normalize_effective_date(raw: Any) -> str:
+    """
+    生效日期归一为 YYYY-MM-DD：接受未补零的写法（2024-1-5）与带时间的值（取日期部分）；
+    缺失或无法解析时为 ''（排在所有日期之前）。SQLite 的 date() 对未补零的日期返回 NULL，故在 Python 中归一。
+    """
+    if not raw:
+        return ""
+    if hasattr(raw, "year"):
+        return f"{raw.year:04d}-{raw.month:02d}-{raw.day:02d}"
+    text = str(raw).strip().split("T", 1)[0].split(" ", 1)[0]
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return ""
+
+
+def effective_date_sql(field: str, alias: str = "") -> str:
+    """
+    生效日期的 SQL 表达式，与 schema effective_index 建立的表达式索引相同（查询须逐字使用才能走索引）。
+    未补零或无法解析的日期为 NULL，由调用方经 normalize_effective_date 兜底。
+    """
+    prefix = f"{alias}." if alias else ""
+    return f"date(json_extract({prefix}data, '$.{field}'))"
+
+
+def _interval_records(
+    schema: TwinSchema, twin_id: int, state_id: int, valid_from: str, valid_to: Optional[str], raw: Optional[str]
+) -> List[tuple]:
+    data = json.loads(raw) if raw else {}
+    return [
+        (schema.name, twin_id, state_id, field, valid_from, valid_to, json.dumps(data.get(field), ensure_ascii=False))
+        for field in schema.interval_index.get("fields") or []
+    ]
+
+
+def _insert_interval_records(cursor, records: List[tuple]) -> None:
+    if records:
+        cursor.executemany(
+            f"""
+            INSERT INTO {TWIN_INTERVAL_TABLE}
+                (twin_name, twin_id, state_id, field, valid_from, valid_to, value)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            records,
+        )
+
+
+def append_twin_interval(cursor, schema: TwinSchema, twin_id: int, state_id: int) -> None:
+    """
+    在调用方事务内为刚追加的状态行（state_id 为该 Twin 最大的状态行 id）插入区间行：
+    按 (生效日期, 状态行 id) 排在它之前的最近一个版本的区间截断到新版本的生效日期，
+    新版本的 valid_to 接管该版本原来的 valid_to（没有前一版本时取其后最早的生效日期）。
+    通常即关闭当前开放区间；补录较早生效日期的版本时只改动相邻的一个版本。
+    """
+    index = schema.interval_index
+    fields = (index or {}).get("fields") or []
+    if not fields:
+        return
+    cursor.execute(
+        f"SELECT json_extract(data, ?), data FROM {schema.state_table} WHERE id = ?",
+        (f"$.{index['effective_field']}", state_id),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return
+    valid_from, raw = normalize_effective_date(row[0]), row[1]
+
+    # 前一版本：生效日期 ≤ 新版本的各版本中 (valid_from, state_id) 最大者（区间行按字段重复，取一个字段即可）
+    cursor.execute(
+        f"""
+        SELECT state_id, valid_to FROM {TWIN_INTERVAL_TABLE}
+        WHERE twin_name = ? AND twin_id = ? AND field = ? AND valid_from <= ? AND state_id <> ?
+        ORDER BY valid_from DESC, state_id DESC
+        LIMIT 1
+        """,
+        (schema.name, twin_id, fields[0], valid_from, state_id),
+    )
+    previous = cursor.fetchone()
+    if previous is not None:
+        valid_to = previous[1]
+        cursor.execute(
+            f"UPDATE {TWIN_INTERVAL_TABLE} SET valid_to = ? WHERE twin_name = ? AND twin_id = ? AND state_id = ?",
+            (valid_from, schema.name, twin_id, previous[0]),
+        )
+    else:
+        cursor.execute(
+            f"""
+            SELECT MIN(valid_from) FROM {TWIN_INTERVAL_TABLE}
+            WHERE twin_name = ? AND twin_id = ? AND state_id <> ?
+            """,
+            (schema.name, twin_id, state_id),
+        )
+        valid_to = cursor.fetchone()[0]
+    cursor.execute(
+        f"DELETE FROM {TWIN_INTERVAL_TABLE} WHERE twin_name = ? AND twin_id = ? AND state_id = ?",
+        (schema.name, twin_id, state_id),
+    )
+    _insert_interval_records(cursor, _interval_records(schema, twin_id, state_id, valid_from, valid_to, raw))
+
+
+def rebuild_twin_intervals(cursor, schema: TwinSchema, twin_id: int) -> None:
+    """在调用方事务内按版本历史全量重建单个 Twin 的区间行（schema 未声明 interval_index 时不做任何事）"""
+    index = schema.interval_index
+    if not index:
+        return
+    effective_field = index["effective_field"]
+
+    cursor.execute(
+        f"DELETE FROM {TWIN_INTERVAL_TABLE} WHERE twin_name = ? AND twin_id = ?",
+        (schema.name, twin_id),
+    )
+    cursor.execute(
+        f"SELECT id, json_extract(data, ?), data FROM {schema.state_table} WHERE twin_id = ?",
+        (f"$.{effective_field}", twin_id),
+    )
+    rows = sorted(
+        ((row[0], normalize_effective_date(row[1]), row[2]) for row in cursor.fetchall()),
+        key=lambda row: (row[1], row[0]),
+    )
+
+    records = []
+    for i, row in enumerate(rows):
+        valid_to = rows[i + 1][1] if i + 1 < len(rows) else None
+        records.extend(_interval_records(schema, twin_id, row[0], row[1], valid_to, row[2]))
+    _insert_interval_records(cursor, records)
+
+
+class IntervalTimeline:
+    """
+    内存中的有序生效区间：entries 按 (valid_from, state_id) 升序，
+    at(date) 以 bisect 在 O(log n) 内取生效日期 ≤ date 的最新版本。
+    可合并多个 Twin（如同一人员在同一公司的多条聘用记录）。
+    """
+
+    def __init__(self, entries: List[Tuple[str, int, Dict[str, Any]]]):
+        self.entries = sorted(entries, key=lambda e: (e[0], e[1]))
+        self._keys = [e[0] for e in self.entries]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def at(self, as_of_date: Any) -> Optional[Dict[str, Any]]:
+        """as_of_date 时生效的版本字段值 {field: value}，无则 None"""
+        as_of = as_of_date.isoformat() if hasattr(as_of_date, "isoformat") else str(as_of_date)[:10]
+        index = bisect_right(self._keys, as_of) - 1
+        if index < 0:
+            return None
+        return self.entries[index][2]
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """按生效顺序返回所有版本（含被覆盖的版本），每项附带 valid_from"""
+        return [dict(values, valid_from=valid_from) for valid_from, _, values in self.entries]
+
+
+class TwinIntervalDAO(BaseDAO):
+    """生效区间索引 DAO"""
+
+    def is_indexed(self, twin_name: str, field: Optional[str] = None, effective_field: Optional[str] = None) -> bool:
+        """Twin（及字段 / 生效日期字段）是否由区间索引覆盖"""
+        schema = self._get_twin_schema(twin_name)
+        index = schema.interval_index
+        if not index:
+            return False
+        if effective_field is not None and index.get("effective_field") != effective_field:
+            return False
+        return field is None or field in (index.get("fields") or [])
+
+    def load_timeline(
+        self,
+        twin_name: str,
+        twin_id: Optional[int] = None,
+        related_filters: Optional[Dict[str, Any]] = None,
+    ) -> IntervalTimeline:
+        """按 twin_id 或注册表外键加载区间行，组装为 IntervalTimeline（一次查询）"""
+        schema = self._get_twin_schema(twin_name)
+        conditions = ["i.twin_name = ?"]
+        params: List[Any] = [twin_name]
+        if twin_id is not None:
+            conditions.append("i.twin_id = ?")
+            params.append(twin_id)
+        if related_filters:
+            reg_conditions = []
+            for key, value in related_filters.items():
+                reg_conditions.append(f"{key} = ?")
+                params.append(value)
+            conditions.append(
+                f"i.twin_id IN (SELECT id FROM {schema.table} WHERE {' AND '.join(reg_conditions)})"
+            )
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT state_id, valid_from, field, value FROM {TWIN_INTERVAL_TABLE} i
+                WHERE {' AND '.join(conditions)}
+                """,
+                params,
+            )
+            rows = cursor.fetchall()
+
+        by_state: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        for row in rows:
+            valid_from, values = by_state.setdefault(row["state_id"], (row["valid_from"], {}))
+            values[row["field"]] = json.loads(row["value"]) if row["value"] is not None else None
+        return IntervalTimeline(
+            [(valid_from, state_id, values) for state_id, (valid_from, values) in by_state.items()]
+        )
+
+    def query_as_of(
+        self,
+        twin_name: str,
+        field: str,
+        as_of_date: Any,
+    ) -> List[Tuple[int, Any]]:
+        """所有 Twin 在 as_of_date 时某字段的生效值 [(twin_id, value), ...]（区间条件，走索引）"""
+        as_of = as_of_date.isoformat() if hasattr(as_of_date, "isoformat") else str(as_of_date)[:10]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT twin_id, value FROM {TWIN_INTERVAL_TABLE}
+                WHERE twin_name = ? AND field = ? AND valid_from <= ?
+                  AND (valid_to IS NULL OR valid_to > ?)
+                ORDER BY twin_id
+                """,
+                (twin_name, field, as_of, as_of),
+            )
+            rows = cursor.fetchall()
+        return [(row["twin_id"], json.loads(row["value"]) if row["value"] is not None else None) for row in rows]
+
+    def rebuild(self, twin_name: str) -> int:
+        """全量重建某 Twin 的区间索引（用于既有数据回填），返回处理的 Twin 数"""
+        schema = self._get_twin_schema(twin_name)
+        if not schema.interval_index:
+            return 0
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT DISTINCT twin_id FROM {schema.state_table}")
+            twin_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"DELETE FROM {TWIN_INTERVAL_TABLE} WHERE twin_name = ?", (twin_name,))
+            for twin_id in twin_ids:
+                rebuild_twin_intervals(cursor, schema, twin_id)
+            conn.commit()
+        return len(twin_ids)
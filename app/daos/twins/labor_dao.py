@@ -0,0 +1,241 @@
+"""
+Labor Allocation DAO - 项目人力成本按月分摊（fact_labor_allocation）
+
+把每条人员-款项参与（person_payment_participation，取事实表中的 start_date / end_date）按自然月拆分，
+每月一行，按当月参与天数 / 当月天数分摊该人员当月的人力成本：
+
+- 当月已有工资单（person_company_payroll，薪资期数 = 该月）：取应发金额 base_amount 之和（source = payroll）
+- 否则取参与首日生效的聘用薪资（生效区间索引，年薪 / 日薪折算为月薪；离职、停薪留职不计）之和（source = salary）
+- 两者皆无时成本为 0（source = none）
+
+分摊行在参与、聘用、工资单变化的同一事务内增量重算（maintain_labor_allocation）：
+工资单只影响其薪资期数所在月份，追加时只重算这些月份的分摊行。项目收益分析直接按款项汇总 cost。
+"""
+from __future__ import annotations
+
+import calendar
+import json
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.daos.base_dao import BaseDAO
+from app.daos.twins.interval_dao import TWIN_INTERVAL_TABLE
+
+LABOR_ALLOCATION_TABLE = "fact_labor_allocation"
+
+# 影响分摊的 Twin
+_LABOR_SOURCES = ("person_payment_participation", "person_company_employment", "person_company_payroll")
+
+# 聘用 / 工资单的注册表（取人员外键）
+_PERSON_REGISTRIES = {
+    "person_company_employment": "person_company_employment_activities",
+    "person_company_payroll": "person_company_payroll_activities",
+}
+
+# 与 payroll_engine.MONTHLY_WORK_DAYS 一致（日薪折算月薪）
+_MONTHLY_WORK_DAYS = 21.75
+
+# 不计薪的聘用状态
+_UNPAID_CHANGE_TYPES = ("离职", "停薪留职")
+
+
+def create_labor_allocation_table(cursor) -> None:
+    """创建 fact_labor_allocation 表（供 init_db 使用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LABOR_ALLOCATION_TABLE} (
+            participation_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            person_id INTEGER NOT NULL,
+            payment_item_id INTEGER NOT NULL,
+            days INTEGER NOT NULL,
+            month_days INTEGER NOT NULL,
+            monthly_cost REAL NOT NULL,
+            cost REAL NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (participation_id, month)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{LABOR_ALLOCATION_TABLE}_payment_item
+        ON {LABOR_ALLOCATION_TABLE}(payment_item_id, month)
+    """)
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def _month_segments(start: date, end: date) -> Iterator[Tuple[str, date, int, int]]:
+    """[start, end] 按自然月拆分：(YYYY-MM, 段首日, 段内天数, 当月天数)"""
+    current = start
+    while current <= end:
+        month_days = calendar.monthrange(current.year, current.month)[1]
+        month_end = date(current.year, current.month, month_days)
+        segment_end = min(end, month_end)
+        yield current.strftime("%Y-%m"), current, (segment_end - current).days + 1, month_days
+        current = month_end + timedelta(days=1)
+
+
+def _salary_to_monthly(salary, salary_type) -> float:
+    salary = float(salary or 0)
+    if salary_type == "年薪":
+        return round(salary / 12.0, 2)
+    if salary_type == "日薪":
+        return round(salary * _MONTHLY_WORK_DAYS, 2)
+    return salary
+
+
+def _monthly_cost(cursor, person_id: int, month: str, as_of: date) -> Tuple[float, str]:
+    """某人某月的人力成本与来源：优先当月工资单，其次 as_of 当日生效的聘用薪资"""
+    cursor.execute(
+        """
+        SELECT COUNT(*), SUM(CAST(json_extract(h.data, '$.base_amount') AS REAL))
+        FROM person_company_payroll_history h
+        JOIN person_company_payroll_activities a ON a.id = h.twin_id
+        WHERE a.person_id = ? AND h.time_key = ?
+        """,
+        (person_id, month),
+    )
+    count, total = cursor.fetchone()
+    if count:
+        return round(total or 0, 2), "payroll"
+
+    day = as_of.isoformat()
+    cursor.execute(
+        f"""
+        SELECT i.twin_id, i.field, i.value FROM {TWIN_INTERVAL_TABLE} i
+        JOIN person_company_employment_activities e ON e.id = i.twin_id
+        WHERE i.twin_name = 'person_company_employment' AND e.person_id = ?
+          AND i.field IN ('salary', 'salary_type', 'change_type')
+          AND i.valid_from <= ? AND (i.valid_to IS NULL OR i.valid_to > ?)
+        """,
+        (person_id, day, day),
+    )
+    employments = {}
+    for twin_id, field, value in cursor.fetchall():
+        employments.setdefault(twin_id, {})[field] = json.loads(value) if value is not None else None
+    if not employments:
+        return 0.0, "none"
+    monthly = sum(
+        _salary_to_monthly(values.get("salary"), values.get("salary_type"))
+        for values in employments.values()
+        if values.get("change_type") not in _UNPAID_CHANGE_TYPES
+    )
+    return round(monthly, 2), "salary"
+
+
+def refresh_labor_allocation(
+    cursor, participation_ids: Iterable[int], months: Optional[Iterable[str]] = None
+) -> None:
+    """
+    在调用方事务内重算若干参与的按月分摊行（参与已删除或日期无效时只删除）。
+    months 给出时只重算这些月份（YYYY-MM）的分摊行，其余月份保持不变。
+    """
+    ids = sorted(set(participation_ids))
+    if not ids:
+        return
+    placeholders = ", ".join("?" for _ in ids)
+    month_filter: Optional[Set[str]] = None
+    if months is None:
+        cursor.execute(f"DELETE FROM {LABOR_ALLOCATION_TABLE} WHERE participation_id IN ({placeholders})", ids)
+    else:
+        month_filter = set(months)
+        if not month_filter:
+            return
+        cursor.execute(
+            f"""
+            DELETE FROM {LABOR_ALLOCATION_TABLE}
+            WHERE participation_id IN ({placeholders}) AND month IN ({', '.join('?' for _ in month_filter)})
+            """,
+            ids + sorted(month_filter),
+        )
+    cursor.execute(
+        f"""
+        SELECT twin_id, person_id, payment_item_id, start_date, end_date
+        FROM fact_payment_participation WHERE twin_id IN ({placeholders})
+        """,
+        ids,
+    )
+    rows = []
+    for participation_id, person_id, payment_item_id, start_raw, end_raw in cursor.fetchall():
+        start, end = _parse_date(start_raw), _parse_date(end_raw)
+        if person_id is None or payment_item_id is None or start is None or end is None or end < start:
+            continue
+        for month, segment_start, days, month_days in _month_segments(start, end):
+            if month_filter is not None and month not in month_filter:
+                continue
+            monthly, source = _monthly_cost(cursor, person_id, month, segment_start)
+            rows.append((
+                participation_id, month, person_id, payment_item_id, days, month_days,
+                monthly, round(monthly * days / month_days, 2), source,
+            ))
+    cursor.executemany(
+        f"""
+        INSERT INTO {LABOR_ALLOCATION_TABLE}
+            (participation_id, month, person_id, payment_item_id, days, month_days, monthly_cost, cost, source)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+def _affected_participations(cursor, twin_name: str, twin_ids: List[int]) -> Set[int]:
+    """某 Twin 变化会影响的参与 id（聘用 / 工资单按注册表中的人员关联到其全部参与）"""
+    if not twin_ids:
+        return set()
+    if twin_name == "person_payment_participation":
+        return set(twin_ids)
+    placeholders = ", ".join("?" for _ in twin_ids)
+    cursor.execute(
+        f"""
+        SELECT p.twin_id FROM fact_payment_participation p
+        WHERE p.person_id IN (SELECT person_id FROM {_PERSON_REGISTRIES[twin_name]} WHERE id IN ({placeholders}))
+        """,
+        twin_ids,
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+@contextmanager
+def maintain_labor_allocation(
+    cursor, twin_name: str, twin_ids: List[int], time_keys: Optional[Iterable[str]] = None
+) -> Iterator[None]:
+    """
+    包裹一次 Twin 写入（在同一事务内）：写入后重算受影响参与的分摊行。
+    受影响范围在写入前后各取一次（删除聘用 / 工资单后注册表中已查不到人员）。
+    time_keys：追加工资单时写入的薪资期数，只重算这些月份（None 表示全部月份，如删除工资单 Twin）。
+    """
+    if twin_name not in _LABOR_SOURCES:
+        yield
+        return
+    months = set(time_keys) if twin_name == "person_company_payroll" and time_keys is not None else None
+    participations = _affected_participations(cursor, twin_name, twin_ids)
+    yield
+    refresh_labor_allocation(
+        cursor, participations | _affected_participations(cursor, twin_name, twin_ids), months=months
+    )
+
+
+class LaborAllocationDAO(BaseDAO):
+    """项目人力成本分摊 DAO（维护用；查询由分析模块直接写 SQL）"""
+
+    def is_empty(self) -> bool:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT 1 FROM {LABOR_ALLOCATION_TABLE} LIMIT 1")
+            return cursor.fetchone() is None
+
+    def rebuild(self) -> int:
+        """全量重算全部参与的分摊行（既有数据回填），返回分摊行数"""
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {LABOR_ALLOCATION_TABLE}")
+            cursor.execute("SELECT twin_id FROM fact_payment_participation")
+            refresh_labor_allocation(cursor, [row[0] for row in cursor.fetchall()])
+            conn.commit()
+            cursor.execute(f"SELECT COUNT(*) FROM {LABOR_ALLOCATION_TABLE}")
+            return cursor.fetchone()[0]
@@ -0,0 +1,147 @@
+"""
+Receivable Rollup DAO - 应收款项月度汇总（rollup_receivable）
+
+按 (日期口径, 月份, 状态, 客户公司, 内部项目) 预聚合款项金额与条数：
+
+- basis = 'planned'：按 planned_payment_date 所在月；'actual'：按 actual_payment_date 所在月
+- client_company 取款项所属合同的客户公司，无合同 / 无客户为 ''
+- internal_project_id 取款项关联的内部项目，未关联为 0；关联多个项目时每个项目一行，
+  金额按关联数均分（不带项目过滤的合计仍等于款项金额），item_count 在每个项目中各计 1
+
+汇总行在款项、合同、项目-款项关联变化的同一事务内增量维护（maintain_receivable_rollup）：
+变化前先减去受影响款项的贡献，变化后再按新的事实行加回，条数归零的行删除。
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Set
+
+from app.daos.base_dao import BaseDAO
+
+RECEIVABLE_ROLLUP_TABLE = "rollup_receivable"
+
+# 影响汇总的 Twin
+_ROLLUP_SOURCES = ("payment_item", "client_contract", "internal_project_payment")
+
+# 单个款项对汇总的贡献：每个有日期的口径一行
+_ITEM_CELLS = """
+    SELECT cell.basis, cell.month, COALESCE(pi.status, '') AS status,
+           COALESCE(cc.client_company, '') AS client_company,
+           COALESCE(ipa.internal_project_id, 0) AS internal_project_id,
+           COALESCE(pi.amount, 0) * 1.0 / MAX(1, (
+               SELECT COUNT(*) FROM internal_project_payment_activities n
+               WHERE n.payment_item_id = pi.twin_id
+           )) AS amount
+    FROM fact_payment_item pi
+    JOIN (
+        SELECT twin_id, 'planned' AS basis, substr(planned_payment_date, 1, 7) AS month
+        FROM fact_payment_item WHERE planned_payment_date IS NOT NULL
+        UNION ALL
+        SELECT twin_id, 'actual' AS basis, substr(actual_payment_date, 1, 7) AS month
+        FROM fact_payment_item WHERE actual_payment_date IS NOT NULL
+    ) cell ON cell.twin_id = pi.twin_id
+    LEFT JOIN fact_client_contract cc ON cc.twin_id = pi.client_contract_id
+    LEFT JOIN internal_project_payment_activities ipa ON ipa.payment_item_id = pi.twin_id
+"""
+
+
+def create_receivable_rollup_table(cursor) -> None:
+    """创建 rollup_receivable 表（供 init_db 使用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RECEIVABLE_ROLLUP_TABLE} (
+            basis TEXT NOT NULL,
+            month TEXT NOT NULL,
+            status TEXT NOT NULL,
+            client_company TEXT NOT NULL,
+            internal_project_id INTEGER NOT NULL,
+            amount REAL NOT NULL DEFAULT 0,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (basis, month, status, client_company, internal_project_id)
+        )
+    """)
+
+
+def _apply_items(cursor, item_ids: Iterable[int], sign: int) -> None:
+    """把款项的当前贡献以 sign（+1 / -1）计入汇总"""
+    ids = sorted(set(item_ids))
+    if not ids:
+        return
+    placeholders = ", ".join("?" for _ in ids)
+    cursor.execute(
+        f"""
+        INSERT INTO {RECEIVABLE_ROLLUP_TABLE}
+            (basis, month, status, client_company, internal_project_id, amount, item_count)
+        SELECT basis, month, status, client_company, internal_project_id, ? * SUM(amount), ? * COUNT(*)
+        FROM ({_ITEM_CELLS} WHERE pi.twin_id IN ({placeholders}))
+        GROUP BY basis, month, status, client_company, internal_project_id
+        ON CONFLICT (basis, month, status, client_company, internal_project_id) DO UPDATE SET
+            amount = amount + excluded.amount,
+            item_count = item_count + excluded.item_count
+        """,
+        [sign, sign] + ids,
+    )
+    if sign < 0:
+        cursor.execute(f"DELETE FROM {RECEIVABLE_ROLLUP_TABLE} WHERE item_count <= 0")
+
+
+def _affected_items(cursor, twin_name: str, twin_ids: List[int]) -> Set[int]:
+    """某 Twin 变化会影响的款项 id"""
+    if not twin_ids:
+        return set()
+    placeholders = ", ".join("?" for _ in twin_ids)
+    if twin_name == "payment_item":
+        return set(twin_ids)
+    if twin_name == "client_contract":
+        cursor.execute(
+            f"SELECT twin_id FROM fact_payment_item WHERE client_contract_id IN ({placeholders})",
+            twin_ids,
+        )
+    else:  # internal_project_payment
+        cursor.execute(
+            f"SELECT payment_item_id FROM internal_project_payment_activities WHERE id IN ({placeholders})",
+            twin_ids,
+        )
+    return {row[0] for row in cursor.fetchall() if row[0] is not None}
+
+
+@contextmanager
+def maintain_receivable_rollup(cursor, twin_name: str, twin_ids: List[int]) -> Iterator[None]:
+    """
+    包裹一次 Twin 写入（在同一事务内）：写入前减去受影响款项的旧贡献，写入后加回新贡献。
+    与汇总无关的 Twin 不做任何事。
+    """
+    if twin_name not in _ROLLUP_SOURCES:
+        yield
+        return
+    items = _affected_items(cursor, twin_name, twin_ids)
+    _apply_items(cursor, items, -1)
+    yield
+    _apply_items(cursor, items | _affected_items(cursor, twin_name, twin_ids), +1)
+
+
+class ReceivableRollupDAO(BaseDAO):
+    """应收款项月度汇总 DAO"""
+
+    def is_empty(self) -> bool:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT 1 FROM {RECEIVABLE_ROLLUP_TABLE} LIMIT 1")
+            return cursor.fetchone() is None
+
+    def rebuild(self) -> int:
+        """由事实表全量重建汇总（既有数据回填），返回汇总行数"""
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {RECEIVABLE_ROLLUP_TABLE}")
+            cursor.execute(
+                f"""
+                INSERT INTO {RECEIVABLE_ROLLUP_TABLE}
+                    (basis, month, status, client_company, internal_project_id, amount, item_count)
+                SELECT basis, month, status, client_company, internal_project_id, SUM(amount), COUNT(*)
+                FROM ({_ITEM_CELLS})
+                GROUP BY basis, month, status, client_company, internal_project_id
+                """
+            )
+            conn.commit()
+            cursor.execute(f"SELECT COUNT(*) FROM {RECEIVABLE_ROLLUP_TABLE}")
+            return cursor.fetchone()[0]
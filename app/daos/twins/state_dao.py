@@ -4,16 +4,38 @@ Twin State DAO - 管理 Twin 的状态流
 from __future__ import annotations
 
 import sqlite3
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
 from app.daos.base_dao import BaseDAO
+from app.daos.twins.change_dao import bump_twin_change
+from app.daos.twins.facet_dao import maintain_twin_facets
+from app.daos.twins.fact_dao import refresh_twin_fact
+from app.daos.twins.interval_dao import append_twin_interval, effective_date_sql, normalize_effective_date
+from app.daos.twins.labor_dao import maintain_labor_allocation
+from app.daos.twins.rollup_dao import maintain_receivable_rollup
 from app.models.twins import TwinState, TwinType
 from app.models.twins.state import StateStreamMode
 from app.schema.loader import SchemaLoader
 from app.schema.models import TwinSchema, FieldDefinition
 
 
+# 状态写入监听：fn(db_path, twin_name, twin_ids)，在写入事务提交后于本进程内同步调用（用于失效内存缓存）
+_append_listeners: List[Callable[[str, str, List[int]], None]] = []
+
+
+def add_append_listener(listener: Callable[[str, str, List[int]], None]) -> None:
+    """注册状态写入监听（重复注册同一函数只保留一次）"""
+    if listener not in _append_listeners:
+        _append_listeners.append(listener)
+
+
+def notify_state_changed(db_path: Any, twin_name: str, twin_ids: List[int]) -> None:
+    """通知监听方：这些 Twin 的状态已变化（追加、覆盖或删除）"""
+    for listener in _append_listeners:
+        listener(str(db_path), twin_name, list(twin_ids))
+
+
 class TwinStateDAO(BaseDAO):
     """Twin 状态流 DAO"""
 
@@ -38,7 +60,7 @@ class TwinStateDAO(BaseDAO):
     def _get_next_version(self, twin_name: str, twin_id: int) -> int:
         """获取下一个版本号（版本化状态流）"""
         schema = self._get_twin_schema(twin_name)
-        with self.get_connection() as conn:
+        with self.get_connection(write=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 f"SELECT COALESCE(MAX(version), 0) FROM {schema.state_table} WHERE twin_id = ?",
@@ -81,16 +103,25 @@ class TwinStateDAO(BaseDAO):
             )
             record = state.to_record()
             
-            with self.get_connection() as conn:
+            with self.get_connection(write=True) as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    f"""
-                    INSERT INTO {schema.state_table} (twin_id, version, ts, data)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (record["twin_id"], record["version"], record["ts"], record["data"])
-                )
+                with (
+                    maintain_receivable_rollup(cursor, twin_name, [twin_id]),
+                    maintain_labor_allocation(cursor, twin_name, [twin_id]),
+                    maintain_twin_facets(cursor, schema, [twin_id]),
+                ):
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {schema.state_table} (twin_id, version, ts, data)
+                        VALUES (?, ?, ?, ?)
+                        """,
+                        (record["twin_id"], record["version"], record["ts"], record["data"])
+                    )
+                    append_twin_interval(cursor, schema, twin_id, cursor.lastrowid)
+                    refresh_twin_fact(cursor, schema, twin_id)
+                bump_twin_change(cursor, twin_name)
                 conn.commit()
+            notify_state_changed(self.db_path, twin_name, [twin_id])
             return version
         
         else:  # time_series
@@ -109,23 +140,217 @@ class TwinStateDAO(BaseDAO):
             )
             record = state.to_record()
             
-            with self.get_connection() as conn:
+            with self.get_connection(write=True) as conn:
                 cursor = conn.cursor()
                 # time_series：同一 (twin_id, time_key) 只保留一条，先删后插实现覆盖更新（不依赖表 UNIQUE 约束，兼容已有库）
-                cursor.execute(
-                    f"DELETE FROM {schema.state_table} WHERE twin_id = ? AND time_key = ?",
-                    (record["twin_id"], record["time_key"]),
-                )
+                with (
+                    maintain_receivable_rollup(cursor, twin_name, [twin_id]),
+                    maintain_labor_allocation(cursor, twin_name, [twin_id], time_keys=[time_key]),
+                    maintain_twin_facets(cursor, schema, [twin_id]),
+                ):
+                    cursor.execute(
+                        f"DELETE FROM {schema.state_table} WHERE twin_id = ? AND time_key = ?",
+                        (record["twin_id"], record["time_key"]),
+                    )
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {schema.state_table} (twin_id, time_key, ts, data)
+                        VALUES (?, ?, ?, ?)
+                        """,
+                        (record["twin_id"], record["time_key"], record["ts"], record["data"]),
+                    )
+                    refresh_twin_fact(cursor, schema, twin_id, time_key)
+                bump_twin_change(cursor, twin_name)
+                conn.commit()
+            notify_state_changed(self.db_path, twin_name, [twin_id])
+            return 0  # 时间序列模式不返回版本号
+
+    def append_many(
+        self,
+        twin_name: str,
+        items: List[tuple[int, Dict[str, Any], Optional[str]]],
+        ts: Optional[str | datetime] = None
+    ) -> int:
+        """
+        在同一事务内批量追加状态记录，返回写入条数。
+
+        Args:
+            twin_name: Twin 名称
+            items: [(twin_id, data, time_key), ...]；versioned 模式 time_key 传 None。
+                   activity Twin 的 twin_id 也可传关联实体 id 字典（如 {"person_id": 1, "company_id": 2}），
+                   在同一事务内查找或创建对应的注册表行，写入失败时不会留下只有注册表行的 Twin
+            ts: 统一时间戳（默认当前时间）
+        """
+        if not items:
+            return 0
+        schema = self._get_twin_schema(twin_name)
+        ts_str = self._normalize_ts(ts)
+        twin_type = TwinType.ENTITY if schema.type == "entity" else TwinType.ACTIVITY
+
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            items = self._resolve_activity_ids(cursor, schema, items)
+            twin_ids = sorted({item[0] for item in items})
+            with (
+                maintain_receivable_rollup(cursor, twin_name, twin_ids),
+                maintain_labor_allocation(
+                    cursor, twin_name, twin_ids,
+                    time_keys=None if schema.mode == StateStreamMode.VERSIONED else [item[2] for item in items],
+                ),
+                maintain_twin_facets(cursor, schema, twin_ids),
+            ):
+                if schema.mode == StateStreamMode.VERSIONED:
+                    next_versions: Dict[int, int] = {}
+                    for twin_id, data, _ in items:
+                        if twin_id not in next_versions:
+                            cursor.execute(
+                                f"SELECT COALESCE(MAX(version), 0) FROM {schema.state_table} WHERE twin_id = ?",
+                                (twin_id,)
+                            )
+                            next_versions[twin_id] = (cursor.fetchone()[0] or 0) + 1
+                        record = TwinState(
+                            twin_id=twin_id,
+                            twin_type=twin_type,
+                            twin_name=twin_name,
+                            version=next_versions[twin_id],
+                            ts=ts_str,
+                            data=data,
+                        ).to_record()
+                        cursor.execute(
+                            f"""
+                            INSERT INTO {schema.state_table} (twin_id, version, ts, data)
+                            VALUES (?, ?, ?, ?)
+                            """,
+                            (record["twin_id"], record["version"], record["ts"], record["data"])
+                        )
+                        append_twin_interval(cursor, schema, twin_id, cursor.lastrowid)
+                        next_versions[twin_id] += 1
+                    for twin_id in next_versions:
+                        refresh_twin_fact(cursor, schema, twin_id)
+                else:  # time_series
+                    for twin_id, data, time_key in items:
+                        if not time_key:
+                            raise ValueError(f"time_key is required for time_series mode")
+                        record = TwinState(
+                            twin_id=twin_id,
+                            twin_type=twin_type,
+                            twin_name=twin_name,
+                            time_key=time_key,
+                            ts=ts_str,
+                            data=data,
+                        ).to_record()
+                        cursor.execute(
+                            f"DELETE FROM {schema.state_table} WHERE twin_id = ? AND time_key = ?",
+                            (record["twin_id"], record["time_key"]),
+                        )
+                        cursor.execute(
+                            f"""
+                            INSERT INTO {schema.state_table} (twin_id, time_key, ts, data)
+                            VALUES (?, ?, ?, ?)
+                            """,
+                            (record["twin_id"], record["time_key"], record["ts"], record["data"]),
+                        )
+                        refresh_twin_fact(cursor, schema, twin_id, time_key)
+            bump_twin_change(cursor, twin_name)
+            conn.commit()
+        notify_state_changed(self.db_path, twin_name, twin_ids)
+        return len(items)
+
+    def set_time_series_field(
+        self, twin_name: str, twin_id: int, field: str, values: Dict[str, Any]
+    ) -> int:
+        """原地改写时间序列 Twin 若干期状态的一个簿记字段（{time_key: 值}），见 set_time_series_fields"""
+        return self.set_time_series_fields(
+            twin_name, twin_id, {time_key: {field: value} for time_key, value in values.items()}
+        )
+
+    def set_time_series_fields(
+        self, twin_name: str, twin_id: int, values: Dict[str, Dict[str, Any]]
+    ) -> int:
+        """
+        原地改写时间序列 Twin 若干期状态 data 中的簿记字段（{time_key: {字段: 值}}），返回改写条数。
+
+        不新增状态行、不改变状态行 id（变更标记），也不触发汇总 / 分面维护，
+        只用于簿记字段（如工资单的 input_fingerprint、ytd_total_* 累计字段）。
+        改写的字段在事实表中有对应列时，同一事务内刷新这些期的事实行并推进变更令牌；
+        提交后通知写入监听（丢弃进程内缓存的计算结果）。
+        """
+        schema = self._get_twin_schema(twin_name)
+        if schema.mode != StateStreamMode.TIME_SERIES or not values:
+            return 0
+        fact_columns = set((schema.fact_table or {}).get("columns") or {})
+        with self.get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            updated = 0
+            fact_changed = False
+            for time_key, fields in values.items():
+                if not fields:
+                    continue
+                params: List[Any] = []
+                for field, value in fields.items():
+                    params.extend((f"$.{field}", value))
                 cursor.execute(
                     f"""
-                    INSERT INTO {schema.state_table} (twin_id, time_key, ts, data)
-                    VALUES (?, ?, ?, ?)
+                    UPDATE {schema.state_table} SET data = json_set(data, {', '.join('?, ?' for _ in fields)})
+                    WHERE twin_id = ? AND time_key = ?
                     """,
-                    (record["twin_id"], record["time_key"], record["ts"], record["data"]),
+                    params + [twin_id, time_key],
                 )
-                conn.commit()
-            return 0  # 时间序列模式不返回版本号
-    
+                if cursor.rowcount and fact_columns.intersection(fields):
+                    refresh_twin_fact(cursor, schema, twin_id, time_key)
+                    fact_changed = True
+                updated += cursor.rowcount
+            if fact_changed:
+                bump_twin_change(cursor, twin_name)
+            conn.commit()
+        if updated:
+            notify_state_changed(self.db_path, twin_name, [twin_id])
+        return updated
+
+    def _resolve_activity_ids(
+        self, cursor, schema: TwinSchema, items: List[tuple]
+    ) -> List[tuple[int, Dict[str, Any], Optional[str]]]:
+        """把 items 中以关联实体 id 字典给出的 twin_id 换成注册表 id（不存在则在当前事务内创建）"""
+        resolved: Dict[tuple, int] = {}
+        result = []
+        for twin_id, data, time_key in items:
+            if isinstance(twin_id, dict):
+                if schema.type != "activity" or not schema.related_entities:
+                    raise ValueError(f"{schema.name} is not an activity twin")
+                keys = [rel.key for rel in schema.related_entities]
+                values = tuple(twin_id.get(key) for key in keys)
+                if values not in resolved:
+                    resolved[values] = self._get_or_create_activity_id(cursor, schema, keys, values)
+                twin_id = resolved[values]
+            result.append((twin_id, data, time_key))
+        return result
+
+    def _get_or_create_activity_id(self, cursor, schema: TwinSchema, keys: List[str], values: tuple) -> int:
+        """在给定游标（写事务）内按关联实体查找 activity 注册表行，不存在时校验关联实体后创建"""
+        conditions = " AND ".join(f"{key} IS ?" for key in keys)
+        cursor.execute(f"SELECT id FROM {schema.table} WHERE {conditions} ORDER BY id LIMIT 1", values)
+        row = cursor.fetchone()
+        if row is not None:
+            return int(row[0])
+        for rel_entity, value in zip(schema.related_entities, values):
+            if value is None:
+                if rel_entity.required:
+                    raise ValueError(f"Missing required entity: {rel_entity.key}")
+                continue
+            entity_schema = self._get_twin_schema(rel_entity.entity)
+            cursor.execute(f"SELECT 1 FROM {entity_schema.table} WHERE id = ?", (value,))
+            if cursor.fetchone() is None:
+                raise ValueError(f"Referenced {rel_entity.entity} not found: {rel_entity.key}={value}")
+        # 项目-款项关联的注册表行影响应收汇总中该款项的项目归属（同 TwinDAO.create_activity_twin）
+        related = dict(zip(keys, values))
+        rollup_ids = [related["payment_item_id"]] if schema.name == "internal_project_payment" else []
+        with maintain_receivable_rollup(cursor, "payment_item", rollup_ids):
+            cursor.execute(
+                f"INSERT INTO {schema.table} ({', '.join(keys)}) VALUES ({', '.join('?' for _ in keys)})",
+                values,
+            )
+            return int(cursor.lastrowid)
+
     def get_latest(self, twin_name: str, twin_id: int) -> Optional[TwinState]:
         """获取最新状态"""
         schema = self._get_twin_schema(twin_name)
@@ -183,7 +408,308 @@ class TwinStateDAO(BaseDAO):
             return None
         twin_type = TwinType.ENTITY if schema.type == "entity" else TwinType.ACTIVITY
         return TwinState.from_row(dict(row), twin_name, twin_type)
-    
+
+    def get_previous_state_by_time_key(
+        self,
+        twin_name: str,
+        twin_id: int,
+        before_time_key: str,
+        since_time_key: Optional[str] = None,
+    ) -> Optional[TwinState]:
+        """
+        时间序列 Twin 中 time_key < before_time_key 的最近一条状态
+        （可选下界 since_time_key，含），走 (twin_id, time_key) 索引。
+        """
+        schema = self._get_twin_schema(twin_name)
+        if schema.mode != StateStreamMode.TIME_SERIES:
+            return None
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT * FROM {schema.state_table}
+                WHERE twin_id = ? AND time_key < ? AND time_key >= ?
+                ORDER BY time_key DESC
+                LIMIT 1
+                """,
+                (twin_id, before_time_key, since_time_key or ""),
+            )
+            row = cursor.fetchone()
+        if not row:
+            return None
+        twin_type = TwinType.ENTITY if schema.type == "entity" else TwinType.ACTIVITY
+        return TwinState.from_row(dict(row), twin_name, twin_type)
+
+    def get_state_markers(
+        self,
+        twin_name: str,
+        related_filters: Dict[str, Any],
+        time_keys: Optional[List[str]] = None,
+        before_time_key: Optional[str] = None,
+        since_time_key: Optional[str] = None,
+    ) -> List[tuple]:
+        """
+        按注册表外键过滤 Activity Twin，返回其状态的「变更标记」（状态行 id，自增、每次写入都会变化），
+        用于廉价判断输入是否变化，无需读取 data。只列出有（匹配的）状态的 Twin：
+        注册表行可能在写入事务内才创建，没有状态的注册表行不应改变标记。
+
+        - versioned：[(twin_id, 最新状态行 id), ...]
+        - time_series：[(twin_id, time_key, 状态行 id), ...]，
+          按 time_keys 精确匹配，或按 [since_time_key, before_time_key) 区间
+        """
+        schema = self._get_twin_schema(twin_name)
+        conditions = []
+        params: List[Any] = []
+        for key, value in related_filters.items():
+            conditions.append(f"a.{key} = ?")
+            params.append(value)
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if schema.mode == StateStreamMode.VERSIONED:
+                cursor.execute(
+                    f"""
+                    SELECT a.id, MAX(s.id) FROM {schema.table} a
+                    JOIN {schema.state_table} s ON s.twin_id = a.id
+                    {where_clause}
+                    GROUP BY a.id
+                    ORDER BY a.id
+                    """,
+                    params,
+                )
+            else:  # time_series
+                join_conditions = ["s.twin_id = a.id"]
+                join_params: List[Any] = []
+                if time_keys is not None:
+                    join_conditions.append(f"s.time_key IN ({','.join(['?'] * len(time_keys))})")
+                    join_params.extend(time_keys)
+                if since_time_key is not None:
+                    join_conditions.append("s.time_key >= ?")
+                    join_params.append(since_time_key)
+                if before_time_key is not None:
+                    join_conditions.append("s.time_key < ?")
+                    join_params.append(before_time_key)
+                cursor.execute(
+                    f"""
+                    SELECT a.id, s.time_key, s.id FROM {schema.table} a
+                    JOIN {schema.state_table} s ON {' AND '.join(join_conditions)}
+                    {where_clause}
+                    ORDER BY a.id, s.time_key
+                    """,
+                    join_params + params,
+                )
+            rows = cursor.fetchall()
+        return [tuple(row) for row in rows]
+
+    def get_as_of(
+        self,
+        twin_name: str,
+        effective_field: Optional[str],
+        as_of_date: Any,
+        twin_id: Optional[int] = None,
+        related_filters: Optional[Dict[str, Any]] = None,
+        latest_only: bool = False,
+    ) -> Optional[TwinState]:
+        """
+        生效日期查询：取 effective_field ≤ as_of_date 的最新一条状态。
+
+        - 按 twin_id，或按注册表外键 related_filters（如 person_id / company_id）限定 Twin，
+          匹配的全部 Twin 一并参与比较（如同一人员在同一公司的多条聘用记录）
+        - latest_only=False：在所有版本中查找（如雇佣信息调薪记录），缺失生效日期的版本视为最早
+        - latest_only=True：只看每个 Twin 的最新状态（如每次考核为独立 activity），缺失生效日期的跳过
+        - 生效日期相同时取版本较新的一条；effective_field 为空时直接取最新状态
+
+        由一条 ORDER BY 生效日期 DESC, 版本 DESC LIMIT 1 的查询选出（schema 声明了 effective_index 时
+        由表达式索引覆盖，不解析各版本的 data）；SQLite date() 解析不了的生效日期（缺失，或 2024-1-5
+        这类未补零的写法）另行取出，经 normalize_effective_date 归一后参与比较。
+        """
+        schema = self._get_twin_schema(twin_name)
+        if effective_field and effective_field not in (schema.fields or {}):
+            raise ValueError(f"Unknown field {effective_field} for twin: {twin_name}")
+        as_of = normalize_effective_date(as_of_date) or str(as_of_date)[:10]
+        order_col = "version" if schema.mode == StateStreamMode.VERSIONED else "time_key"
+
+        def _twin_scope(column: str) -> Tuple[List[str], List[Any]]:
+            conditions: List[str] = []
+            params: List[Any] = []
+            if twin_id is not None:
+                conditions.append(f"{column} = ?")
+                params.append(twin_id)
+            if related_filters:
+                reg_conditions = []
+                for key, value in related_filters.items():
+                    reg_conditions.append(f"{key} = ?")
+                    params.append(value)
+                conditions.append(
+                    f"{column} IN (SELECT id FROM {schema.table} WHERE {' AND '.join(reg_conditions)})"
+                )
+            return conditions, params
+
+        conditions, params = _twin_scope("s.twin_id")
+        source = f"{schema.state_table} s"
+        if latest_only:
+            # 各 Twin 的最新状态（分组取最大版本，再按版本索引回表）
+            latest_conditions, latest_params = _twin_scope("twin_id")
+            latest_where = "WHERE " + " AND ".join(latest_conditions) if latest_conditions else ""
+            source += f"""
+                JOIN (
+                    SELECT twin_id, MAX({order_col}) AS latest FROM {schema.state_table}
+                    {latest_where}
+                    GROUP BY twin_id
+                ) m ON m.twin_id = s.twin_id AND m.latest = s.{order_col}"""
+            params = latest_params + params
+
+        def _where(extra: Optional[str] = None) -> str:
+            clauses = conditions + ([extra] if extra else [])
+            return "WHERE " + " AND ".join(clauses) if clauses else ""
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if not effective_field:
+                cursor.execute(
+                    f"SELECT s.id FROM {source} {_where()} ORDER BY s.{order_col} DESC, s.id DESC LIMIT 1",
+                    params,
+                )
+                row = cursor.fetchone()
+                best_id = row[0] if row else None
+            else:
+                eff = effective_date_sql(effective_field, "s")
+                cursor.execute(
+                    f"""
+                    SELECT {eff}, s.{order_col}, s.id FROM {source}
+                    {_where(f"{eff} <= ?")}
+                    ORDER BY {eff} DESC, s.{order_col} DESC, s.id DESC
+                    LIMIT 1
+                    """,
+                    params + [as_of],
+                )
+                row = cursor.fetchone()
+                best = tuple(row) if row else None
+                cursor.execute(
+                    f"""
+                    SELECT json_extract(s.data, '$.{effective_field}'), s.{order_col}, s.id FROM {source}
+                    {_where(f"{eff} IS NULL")}
+                    """,
+                    params,
+                )
+                for raw_eff, order_value, state_id in cursor.fetchall():
+                    normalized = normalize_effective_date(raw_eff)
+                    if normalized > as_of or (latest_only and not normalized):
+                        continue
+                    if best is None or (normalized, order_value, state_id) > best:
+                        best = (normalized, order_value, state_id)
+                best_id = best[2] if best else None
+            if best_id is None:
+                return None
+            cursor.execute(f"SELECT * FROM {schema.state_table} WHERE id = ?", (best_id,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        twin_type = TwinType.ENTITY if schema.type == "entity" else TwinType.ACTIVITY
+        return TwinState.from_row(dict(row), twin_name, twin_type)
+
+    def list_states_in_range(
+        self,
+        twin_name: str,
+        twin_id: int,
+        start_time_key: str,
+        end_time_key: str,
+    ) -> List[TwinState]:
+        """时间序列 Twin 在 [start_time_key, end_time_key] 区间内的状态，按 time_key 升序"""
+        schema = self._get_twin_schema(twin_name)
+        if schema.mode != StateStreamMode.TIME_SERIES:
+            return []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT * FROM {schema.state_table}
+                WHERE twin_id = ? AND time_key BETWEEN ? AND ?
+                ORDER BY time_key ASC
+                """,
+                (twin_id, start_time_key, end_time_key),
+            )
+            rows = cursor.fetchall()
+        twin_type = TwinType.ENTITY if schema.type == "entity" else TwinType.ACTIVITY
+        return [TwinState.from_row(dict(row), twin_name, twin_type) for row in rows]
+
+    def scan_time_range(
+        self,
+        twin_name: str,
+        start_time_key: str,
+        end_time_key: str,
+        fields: List[str],
+        related_filters: Optional[Dict[str, Any]] = None,
+    ) -> List[tuple]:
+        """
+        时间序列 Twin 在 [start_time_key, end_time_key] 区间内全部 Twin 的状态（一次 time_key 区间扫描），
+        只取出指定的 data 字段：[(twin_id, time_key, 注册表外键..., 字段值...), ...]，按 twin_id、time_key 排序。
+
+        related_filters 按注册表外键过滤；注册表没有 company_id 而有 person_id 时（如个税专项附加扣除），
+        company_id 过滤为「在该公司有聘用记录的人员」。
+        """
+        schema = self._get_twin_schema(twin_name)
+        if schema.mode != StateStreamMode.TIME_SERIES:
+            raise ValueError(f"{twin_name} is not a time_series twin")
+        unknown = [f for f in fields if not schema.fields or f not in schema.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields for {twin_name}: {', '.join(unknown)}")
+        related_keys = [rel.key for rel in schema.related_entities or []] if schema.type == "activity" else []
+
+        conditions = ["s.time_key BETWEEN ? AND ?"]
+        params: List[Any] = [start_time_key, end_time_key]
+        for key, value in (related_filters or {}).items():
+            if key in related_keys:
+                conditions.append(f"a.{key} = ?")
+            elif key == "company_id" and "person_id" in related_keys:
+                conditions.append(
+                    "a.person_id IN (SELECT person_id FROM person_company_employment_activities WHERE company_id = ?)"
+                )
+            else:
+                raise ValueError(f"{twin_name} cannot be filtered by {key}")
+            params.append(value)
+
+        select_fields = ["s.twin_id", "s.time_key"] + [f"a.{key}" for key in related_keys]
+        select_fields += [f"json_extract(s.data, '$.{field}')" for field in fields]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT {', '.join(select_fields)}
+                FROM {schema.state_table} s
+                JOIN {schema.table} a ON a.id = s.twin_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY s.twin_id, s.time_key
+                """,
+                params,
+            )
+            rows = cursor.fetchall()
+        return [tuple(row) for row in rows]
+
+    def get_latest_field_values(self, twin_name: str, twin_ids: List[int], field: str) -> Dict[int, Any]:
+        """批量取若干 Twin 最新状态中某个字段的值 {twin_id: 值}（versioned 取最大版本，time_series 取最大 time_key）"""
+        schema = self._get_twin_schema(twin_name)
+        if not twin_ids:
+            return {}
+        order_column = "version" if schema.mode == StateStreamMode.VERSIONED else "time_key"
+        placeholders = ",".join(["?" for _ in twin_ids])
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT s.twin_id, json_extract(s.data, ?) FROM {schema.state_table} s
+                JOIN (
+                    SELECT twin_id, MAX({order_column}) AS latest FROM {schema.state_table}
+                    WHERE twin_id IN ({placeholders})
+                    GROUP BY twin_id
+                ) m ON m.twin_id = s.twin_id AND m.latest = s.{order_column}
+                """,
+                [f"$.{field}"] + list(twin_ids),
+            )
+            rows = cursor.fetchall()
+        return {row[0]: row[1] for row in rows}
+
     def list_states(
         self,
         twin_name: str,
@@ -8,6 +8,13 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 from app.daos.base_dao import BaseDAO
+from app.daos.twins.change_dao import bump_twin_change
+from app.daos.twins.facet_dao import maintain_twin_facets
+from app.daos.twins.fact_dao import delete_twin_fact
+from app.daos.twins.interval_dao import TWIN_INTERVAL_TABLE
+from app.daos.twins.labor_dao import maintain_labor_allocation
+from app.daos.twins.rollup_dao import maintain_receivable_rollup
+from app.daos.twins.state_dao import notify_state_changed
 from app.models.twins import Twin, EntityTwin, ActivityTwin, TwinType
 from app.schema.loader import SchemaLoader
 from app.schema.models import TwinSchema
@@ -24,7 +31,7 @@ class TwinDAO(BaseDAO):
         if schema.type != "entity":
             raise ValueError(f"Expected entity twin, got {schema.type}")
         
-        with self.get_connection() as conn:
+        with self.get_connection(write=True) as conn:
             cursor = conn.cursor()
             cursor.execute(f"INSERT INTO {schema.table} DEFAULT VALUES")
             conn.commit()
@@ -56,7 +63,7 @@ class TwinDAO(BaseDAO):
         placeholders = ", ".join(["?" for _ in columns])
         values = [related_entity_ids[rel.key] for rel in schema.related_entities]
 
-        with self.get_connection() as conn:
+        with self.get_connection(write=True) as conn:
             cursor = conn.cursor()
             # 在同一连接内验证关联实体实际存在
             for rel_entity in schema.related_entities:
@@ -71,12 +78,16 @@ class TwinDAO(BaseDAO):
                         raise ValueError(
                             f"Referenced {rel_entity.entity} not found: {key}={related_entity_ids[key]}"
                         )
-            cursor.execute(
-                f"INSERT INTO {schema.table} ({', '.join(columns)}) VALUES ({placeholders})",
-                values
-            )
+            # 项目-款项关联只有注册表行，创建即影响应收汇总中该款项的项目归属
+            rollup_ids = [related_entity_ids["payment_item_id"]] if twin_name == "internal_project_payment" else []
+            with maintain_receivable_rollup(cursor, "payment_item", rollup_ids):
+                cursor.execute(
+                    f"INSERT INTO {schema.table} ({', '.join(columns)}) VALUES ({placeholders})",
+                    values
+                )
+                twin_id = cursor.lastrowid
+            bump_twin_change(cursor, twin_name)
             conn.commit()
-            twin_id = cursor.lastrowid
         return twin_id
     
     def get_twin(self, twin_name: str, twin_id: int) -> Optional[Twin]:
@@ -123,14 +134,28 @@ class TwinDAO(BaseDAO):
     def delete_twin(self, twin_name: str, twin_id: int) -> bool:
         """删除 Twin 及其所有历史状态，返回是否删除成功"""
         schema = self._get_twin_schema(twin_name)
-        with self.get_connection() as conn:
+        with self.get_connection(write=True) as conn:
             cursor = conn.cursor()
-            # 先删除历史状态
-            cursor.execute(f"DELETE FROM {schema.state_table} WHERE twin_id = ?", (twin_id,))
-            # 再删除主记录
-            cursor.execute(f"DELETE FROM {schema.table} WHERE id = ?", (twin_id,))
+            with (
+                maintain_receivable_rollup(cursor, twin_name, [twin_id]),
+                maintain_labor_allocation(cursor, twin_name, [twin_id]),
+                maintain_twin_facets(cursor, schema, [twin_id]),
+            ):
+                # 先删除历史状态
+                cursor.execute(f"DELETE FROM {schema.state_table} WHERE twin_id = ?", (twin_id,))
+                if schema.interval_index:
+                    cursor.execute(
+                        f"DELETE FROM {TWIN_INTERVAL_TABLE} WHERE twin_name = ? AND twin_id = ?",
+                        (twin_name, twin_id),
+                    )
+                delete_twin_fact(cursor, schema, twin_id)
+                # 再删除主记录
+                cursor.execute(f"DELETE FROM {schema.table} WHERE id = ?", (twin_id,))
+                deleted = cursor.rowcount > 0
+            bump_twin_change(cursor, twin_name)
             conn.commit()
-            return cursor.rowcount > 0
+        notify_state_changed(self.db_path, twin_name, [twin_id])
+        return deleted
 
     def twin_exists(self, twin_name: str, twin_id: int) -> bool:
         """检查 Twin 是否存在"""
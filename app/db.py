@@ -10,6 +10,19 @@ from contextlib import contextmanager
 
 from app.schema.loader import SchemaLoader
 from app.schema.models import TwinSchema
+from app.daos.analytics_cache_dao import create_analytics_cache_table
+from app.daos.payroll_run_dao import create_payroll_run_table
+from app.daos.twins.change_dao import create_twin_change_table
+from app.daos.twins.facet_dao import TwinFacetDAO, create_twin_facet_table, enum_fields
+from app.daos.twins.fact_dao import TwinFactDAO, create_twin_fact_table
+from app.daos.twins.labor_dao import LaborAllocationDAO, create_labor_allocation_table
+from app.daos.twins.rollup_dao import ReceivableRollupDAO, create_receivable_rollup_table
+from app.daos.twins.interval_dao import (
+    TWIN_INTERVAL_TABLE,
+    TwinIntervalDAO,
+    create_twin_interval_table,
+    effective_date_sql,
+)
 
 
 class DatabaseInitializer:
@@ -126,13 +139,107 @@ class DatabaseInitializer:
                     CREATE INDEX IF NOT EXISTS idx_{schema.state_table}_time_key
                     ON {schema.state_table}(twin_id, time_key)
                 """)
+                # 按期间跨 Twin 的区间扫描（透视查询 time_key BETWEEN）
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_{schema.state_table}_time_range
+                    ON {schema.state_table}(time_key, twin_id)
+                """)
+
+            # 生效日期表达式索引：get_as_of 按 (生效日期, 版本) 倒序取单条，无需解析各版本的 data
+            if schema.effective_index:
+                order_column = "version" if schema.mode == "versioned" else "time_key"
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_{schema.state_table}_effective
+                    ON {schema.state_table}(twin_id, {effective_date_sql(schema.effective_index)}, {order_column})
+                """)
             
             conn.commit()
     
+    def _create_support_tables(self):
+        """创建非 Twin 的辅助表（如工资单生成任务 payroll_run）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            create_payroll_run_table(cursor)
+            create_twin_interval_table(cursor)
+            create_twin_change_table(cursor)
+            create_analytics_cache_table(cursor)
+            create_twin_facet_table(cursor)
+            conn.commit()
+
+    def _backfill_interval_index(self, all_twins):
+        """为声明了 interval_index、但区间表中尚无记录的 Twin 回填区间索引（既有数据库升级）"""
+        for twin_name, twin_def in all_twins.items():
+            schema = TwinSchema.from_dict(twin_name, twin_def)
+            if not schema.interval_index:
+                continue
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT 1 FROM {TWIN_INTERVAL_TABLE} WHERE twin_name = ? LIMIT 1", (twin_name,)
+                )
+                if cursor.fetchone():
+                    continue
+            count = TwinIntervalDAO(db_path=self.db_path).rebuild(twin_name)
+            if count:
+                print(f"  回填区间索引: {twin_name}（{count} 条）")
+    
+    def _backfill_facet_counts(self, all_twins):
+        """为有枚举字段、但分面计数表中尚无记录的 Twin 回填计数（既有数据库升级）"""
+        facet_dao = TwinFacetDAO(db_path=self.db_path)
+        for twin_name, twin_def in all_twins.items():
+            schema = TwinSchema.from_dict(twin_name, twin_def)
+            if not enum_fields(schema) or not facet_dao.is_empty(twin_name):
+                continue
+            count = facet_dao.rebuild(twin_name)
+            if count:
+                print(f"  回填分面计数: {twin_name}（{count} 个）")
+
+    def _create_fact_tables(self, all_twins):
+        """为声明了 fact_table 的 Twin 创建事实表；事实表为空或新增了列而已有状态时全量回填（既有数据库升级）"""
+        for twin_name, twin_def in all_twins.items():
+            schema = TwinSchema.from_dict(twin_name, twin_def)
+            if not schema.fact_table:
+                continue
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                columns_added = create_twin_fact_table(cursor, schema)
+                conn.commit()
+                cursor.execute(f"SELECT 1 FROM {schema.state_table} LIMIT 1")
+                has_states = cursor.fetchone() is not None
+            fact_dao = TwinFactDAO(db_path=self.db_path)
+            if has_states and (columns_added or fact_dao.is_empty(twin_name)):
+                count = fact_dao.rebuild(twin_name)
+                print(f"  回填事实表: {schema.fact_table['name']}（{count} 条）")
+
+    def _create_rollup_tables(self):
+        """创建应收款项月度汇总表与项目人力成本分摊表；为空而已有源数据时由事实表回填（既有数据库升级）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            create_receivable_rollup_table(cursor)
+            create_labor_allocation_table(cursor)
+            conn.commit()
+            cursor.execute("SELECT 1 FROM fact_payment_item LIMIT 1")
+            has_items = cursor.fetchone() is not None
+            cursor.execute("SELECT 1 FROM fact_payment_participation LIMIT 1")
+            has_participations = cursor.fetchone() is not None
+        rollup_dao = ReceivableRollupDAO(db_path=self.db_path)
+        if has_items and rollup_dao.is_empty():
+            count = rollup_dao.rebuild()
+            print(f"  回填应收汇总: {count} 行")
+        labor_dao = LaborAllocationDAO(db_path=self.db_path)
+        if has_participations and labor_dao.is_empty():
+            count = labor_dao.rebuild()
+            print(f"  回填人力成本分摊: {count} 行")
+
     def init_database(self):
         """初始化数据库"""
         print(f"初始化数据库: {self.db_path}")
         
+        # WAL：读事务（如工资单生成的一致性快照）与写入互不阻塞
+        if self.db_path != ":memory:":
+            with self.get_connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+        
         all_twins = self.schema_loader.get_all_twins()
         
         # 先创建所有 Entity Twin 表
@@ -155,6 +262,13 @@ class DatabaseInitializer:
                 print(f"  创建状态表: {schema.state_table}")
                 self._create_state_table(schema)
         
+        print("创建辅助表...")
+        self._create_support_tables()
+        self._backfill_interval_index(all_twins)
+        self._create_fact_tables(all_twins)
+        self._create_rollup_tables()
+        self._backfill_facet_counts(all_twins)
+        
         print("数据库初始化完成！")
 
 
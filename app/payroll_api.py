@@ -5,10 +5,26 @@ from __future__ import annotations
 
 from flask import Blueprint, request
 
-from app.api_utils import standard_response, get_payroll_service
+from app.profiling import profiling
+from app.singleflight import SingleFlight
+from app.services.payroll_service import DEFAULT_RECORDS_PAGE_SIZE
+from app.api_utils import (
+    standard_response,
+    get_payroll_service,
+    get_payroll_run_service,
+    get_payroll_simulation_service,
+)
 
 payroll_api_bp = Blueprint("payroll_api", __name__)
 
+# 工资单列表的请求合并（进程内）
+_records_flights = SingleFlight()
+
+
+def _profile_requested(payload: dict) -> bool:
+    """是否要求附带剖析结果：?profile=1 或 Body 中 "profile": true"""
+    return request.args.get("profile") in ("1", "true") or bool(payload.get("profile"))
+
 
 # ==================== 工资计算步骤（基于 config JSON） ====================
 
@@ -41,6 +57,7 @@ def payroll_calculation_steps_preview():
     按当前周期、人员、公司预览完整工资计算步骤结果（应发+社保公积金+个税；上月带入暂为 0）。
     完全基于 config JSON，由 PayrollService.evaluate_calculation_steps 计算。公式仅来自 config。
     Body: { "person_id": 1, "company_id": 2, "period": "2024-01" }
+    ?profile=1 时附带按指标的耗时 / 查询数 / 缓存命中（profile）。
     """
     try:
         payload = request.get_json() or {}
@@ -51,9 +68,57 @@ def payroll_calculation_steps_preview():
             return standard_response(False, error="person_id, company_id, period 为必填", status_code=400)
 
         service = get_payroll_service()
-        result = service.evaluate_calculation_steps(
-            int(person_id), int(company_id), str(period)
-        )
+        with profiling(_profile_requested(payload)) as profile:
+            result = service.evaluate_calculation_steps(
+                int(person_id), int(company_id), str(period)
+            )
+        if profile is not None:
+            result["profile"] = profile.summary()
+        return standard_response(True, result)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/calculation-steps/preview-batch", methods=["POST"])
+def payroll_calculation_steps_preview_batch():
+    """
+    按范围批量预览工资计算结果（不写库），返回人员 × 指标矩阵。
+    Body: { "period": "2025-01", "company_id": 1, "scope": "person"|"department"|"company", "person_id"?: 1,
+            "department"?: "研发部", "metrics"?: ["employment_salary", ...], "explain_person_id"?: 1 }
+    公式说明按配置版本缓存，仅对 explain_person_id 指定的那一行返回完整步骤（explanation）。
+    ?profile=1 时附带按指标的耗时 / 查询数 / 缓存命中（profile）。
+    """
+    try:
+        payload = request.get_json() or {}
+        period = payload.get("period")
+        company_id = payload.get("company_id")
+        scope = payload.get("scope", "company")
+        person_id = payload.get("person_id")
+        department = payload.get("department") or None
+        metric_keys = payload.get("metrics") or None
+        explain_person_id = payload.get("explain_person_id")
+        if not period or not company_id:
+            return standard_response(False, error="period, company_id 为必填", status_code=400)
+        if scope == "person" and not person_id:
+            return standard_response(False, error="scope=person 时 person_id 为必填", status_code=400)
+        if scope == "department" and not department:
+            return standard_response(False, error="scope=department 时 department 为必填", status_code=400)
+        if metric_keys is not None and not isinstance(metric_keys, list):
+            return standard_response(False, error="metrics 须为指标 key 列表", status_code=400)
+
+        service = get_payroll_service()
+        with profiling(_profile_requested(payload)) as profile:
+            result = service.preview_payroll_matrix(
+                scope=scope,
+                company_id=int(company_id),
+                period=str(period),
+                person_id=int(person_id) if person_id else None,
+                department=department,
+                metric_keys=metric_keys,
+                explain_person_id=int(explain_person_id) if explain_person_id else None,
+            )
+        if profile is not None:
+            result["profile"] = profile.summary()
         return standard_response(True, result)
     except Exception as e:
         return standard_response(False, error=str(e), status_code=500)
@@ -65,7 +130,9 @@ def payroll_calculation_steps_preview():
 def payroll_records():
     """
     列出指定周期、公司下已创建的工资单。
-    Query: period, company_id
+    Query: period, company_id；分页可选：page, page_size, sort_by（金额列 / id / person_id / person_name）, order（asc|desc）
+    不带 page / page_size 时返回全部工资单列表；带分页参数时返回
+    { items, total, page, page_size, page_totals, totals }。
     """
     try:
         period = request.args.get("period")
@@ -73,8 +140,31 @@ def payroll_records():
         if not period or not company_id:
             return standard_response(False, error="period, company_id 为必填", status_code=400)
         service = get_payroll_service()
-        records = service.list_payroll_records(period=str(period), company_id=int(company_id))
-        return standard_response(True, records)
+        page = request.args.get("page", type=int)
+        page_size = request.args.get("page_size", type=int)
+        sort_by = request.args.get("sort_by") or None
+        descending = (request.args.get("order") or "asc").lower() == "desc"
+        paged = not (page is None and page_size is None and sort_by is None)
+
+        def _list():
+            if not paged:
+                return service.list_payroll_records(period=str(period), company_id=int(company_id))
+            return service.list_payroll_records_page(
+                period=str(period),
+                company_id=int(company_id),
+                page=page or 1,
+                page_size=page_size or DEFAULT_RECORDS_PAGE_SIZE,
+                sort_by=sort_by,
+                descending=descending,
+            )
+
+        # 月末大量用户同时打开同一期工资单列表：相同参数的在途请求只查询一次
+        flight_key = (str(service.db_path), "records", tuple(sorted(request.args.items(multi=True))))
+        try:
+            result, _ = _records_flights.do(flight_key, _list)
+        except ValueError as e:
+            return standard_response(False, error=str(e), status_code=400)
+        return standard_response(True, result)
     except Exception as e:
         return standard_response(False, error=str(e), status_code=500)
 
@@ -133,7 +223,14 @@ def payroll_generate_preview():
 def payroll_generate():
     """
     按范围生成工资单并写入 person_company_payroll Twin。
-    Body: { "period": "2025-01", "company_id": 1, "scope": "person"|"department"|"company", "person_id"?: 1, "department"?: "研发部" }
+    Body: { "period": "2025-01", "company_id": 1, "scope": "person"|"department"|"company", "person_id"?: 1, "department"?: "研发部",
+            "parallel"?: false, "workers"?: 4, "chunk_size"?: 20, "async"?: false, "cascade"?: false,
+            "incremental"?: false, "profile"?: false }
+    parallel=true 时多进程分片计算、单事务批量写入，返回中附带各分片耗时。
+    incremental=true 时跳过输入指纹未变化的已有工资单，返回 recomputed / skipped 计数。
+    cascade=true 时同时级联重算本个税年度内其后已存在的工资单（不能与 incremental 同时使用）。
+    async=true 时不在请求内计算，而是创建 payroll_run 任务交后台执行，返回 202 与任务信息。
+    profile=true（或 ?profile=1）时同步生成的返回附带剖析结果，异步任务则可经 /payroll/runs/<id>/profile 查看。
     """
     try:
         payload = request.get_json() or {}
@@ -142,20 +239,228 @@ def payroll_generate():
         scope = payload.get("scope", "person")
         person_id = payload.get("person_id")
         department = payload.get("department")
+        workers = payload.get("workers")
+        chunk_size = payload.get("chunk_size")
         if not period or not company_id:
             return standard_response(False, error="period, company_id 为必填", status_code=400)
         if scope == "person" and not person_id:
             return standard_response(False, error="scope=person 时 person_id 为必填", status_code=400)
         if scope == "department" and not department:
             return standard_response(False, error="scope=department 时 department 为必填", status_code=400)
+        if payload.get("cascade") and payload.get("incremental"):
+            return standard_response(False, error="cascade 与 incremental 不能同时使用", status_code=400)
+        if payload.get("async"):
+            run = get_payroll_run_service().create_run(
+                scope=scope,
+                company_id=int(company_id),
+                period=str(period),
+                person_id=int(person_id) if person_id is not None else None,
+                department=department,
+                profile=_profile_requested(payload),
+            )
+            return standard_response(True, run, status_code=202)
         service = get_payroll_service()
-        result = service.generate_payroll(
+        with profiling(_profile_requested(payload)) as profile:
+            result = service.generate_payroll(
+                scope=scope,
+                company_id=int(company_id),
+                period=str(period),
+                person_id=int(person_id) if person_id is not None else None,
+                department=department,
+                parallel=bool(payload.get("parallel", False)),
+                workers=int(workers) if workers is not None else None,
+                chunk_size=int(chunk_size) if chunk_size is not None else None,
+                cascade=bool(payload.get("cascade", False)),
+                incremental=bool(payload.get("incremental", False)),
+            )
+        if profile is not None:
+            result["profile"] = profile.summary()
+        return standard_response(True, result)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/generate-range", methods=["POST"])
+def payroll_generate_range():
+    """
+    一次计算某人多个连续期数的工资单（如全年），各期在内存中逐月传递累计个税等上期数据。
+    Body: { "person_id": 1, "company_id": 2, "from_period": "2024-12", "to_period": "2025-11", "persist"?: false }
+    persist=true 时全部工资单在一个事务内写入，否则只返回计算结果。
+    """
+    try:
+        payload = request.get_json() or {}
+        person_id = payload.get("person_id")
+        company_id = payload.get("company_id")
+        from_period = payload.get("from_period")
+        to_period = payload.get("to_period")
+        if not all([person_id, company_id, from_period, to_period]):
+            return standard_response(
+                False, error="person_id, company_id, from_period, to_period 为必填", status_code=400
+            )
+        try:
+            result = get_payroll_service().compute_payroll_range(
+                int(person_id), int(company_id), str(from_period), str(to_period),
+                persist=bool(payload.get("persist", False)),
+            )
+        except ValueError as e:
+            return standard_response(False, error=str(e), status_code=400)
+        return standard_response(True, result)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/simulate", methods=["POST"])
+def payroll_simulate():
+    """
+    配置变更模拟（不写库）：以内存中的配置文档覆盖现行 YAML，汇总全员工资的变化。
+    Body: { "overrides": { "income_tax_brackets"?: {...}, "social_security_config"?: {...},
+                           "position_salary_ratio"?: {...}, "employee_type_discount"?: {...},
+                           "assessment_grade_coefficient"?: {...} },
+            "from_period": "2025-01", "to_period"?: "2025-12", "company_id"?: 1, "department"?: "研发部",
+            "metrics"?: ["tax_monthly", ...], "parallel"?: false, "workers"?: 4, "chunk_size"?: 50 }
+    覆盖对象与对应 YAML 文件结构相同；不传 company_id 时模拟全部公司。
+    返回 totals / by_period / by_company / by_department 的 baseline、scenario、delta。
+    """
+    try:
+        payload = request.get_json() or {}
+        overrides = payload.get("overrides") or {}
+        from_period = payload.get("from_period") or payload.get("period")
+        company_id = payload.get("company_id")
+        workers = payload.get("workers")
+        chunk_size = payload.get("chunk_size")
+        if not from_period:
+            return standard_response(False, error="from_period 为必填", status_code=400)
+        if not isinstance(overrides, dict):
+            return standard_response(False, error="overrides 须为对象", status_code=400)
+        try:
+            result = get_payroll_simulation_service().simulate(
+                overrides,
+                from_period=str(from_period),
+                to_period=str(payload["to_period"]) if payload.get("to_period") else None,
+                company_id=int(company_id) if company_id is not None else None,
+                department=payload.get("department"),
+                metric_keys=payload.get("metrics"),
+                parallel=bool(payload.get("parallel", False)),
+                workers=int(workers) if workers is not None else None,
+                chunk_size=int(chunk_size) if chunk_size is not None else None,
+            )
+        except ValueError as e:
+            return standard_response(False, error=str(e), status_code=400)
+        return standard_response(True, result)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/cascade", methods=["POST"])
+def payroll_cascade():
+    """
+    级联重算：重算指定期数的工资单，并依次重算同一个税年度内其后已存在的工资单。
+    Body: { "person_id": 1, "company_id": 2, "period": "2025-03" }
+    """
+    try:
+        payload = request.get_json() or {}
+        person_id = payload.get("person_id")
+        company_id = payload.get("company_id")
+        period = payload.get("period")
+        if not all([person_id, company_id, period]):
+            return standard_response(False, error="person_id, company_id, period 为必填", status_code=400)
+        result = get_payroll_service().cascade_recompute(int(person_id), int(company_id), str(period))
+        return standard_response(True, result)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/ytd-accumulators/rebuild", methods=["POST"])
+def payroll_rebuild_ytd_accumulators():
+    """
+    按个税年度重建工资单上的当年累计字段（修改历史工资单后使用）。
+    Body: { "company_id": 1, "year": 2025, "person_id"?: 1 }
+    """
+    try:
+        payload = request.get_json() or {}
+        company_id = payload.get("company_id")
+        year = payload.get("year")
+        person_id = payload.get("person_id")
+        if not company_id or not year:
+            return standard_response(False, error="company_id, year 为必填", status_code=400)
+        result = get_payroll_service().rebuild_ytd_accumulators(
+            company_id=int(company_id),
+            year=int(year),
+            person_id=int(person_id) if person_id is not None else None,
+        )
+        return standard_response(True, result)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+# ==================== 异步工资单生成任务（payroll_run） ====================
+
+@payroll_api_bp.route("/payroll/runs", methods=["POST"])
+def payroll_run_create():
+    """
+    创建工资单生成任务，由后台 worker 执行。
+    Body: { "period": "2025-01", "company_id": 1, "scope": "person"|"department"|"company", "person_id"?: 1, "department"?: "研发部",
+            "profile"?: false }
+    profile=true 时任务执行期间记录剖析结果，经 /payroll/runs/<id>/profile 查看。
+    """
+    try:
+        payload = request.get_json() or {}
+        period = payload.get("period")
+        company_id = payload.get("company_id")
+        scope = payload.get("scope", "company")
+        person_id = payload.get("person_id")
+        department = payload.get("department")
+        if not period or not company_id:
+            return standard_response(False, error="period, company_id 为必填", status_code=400)
+        if scope == "person" and not person_id:
+            return standard_response(False, error="scope=person 时 person_id 为必填", status_code=400)
+        if scope == "department" and not department:
+            return standard_response(False, error="scope=department 时 department 为必填", status_code=400)
+        run = get_payroll_run_service().create_run(
             scope=scope,
             company_id=int(company_id),
             period=str(period),
             person_id=int(person_id) if person_id is not None else None,
             department=department,
+            profile=_profile_requested(payload),
         )
-        return standard_response(True, result)
+        return standard_response(True, run, status_code=202)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/runs", methods=["GET"])
+def payroll_run_list():
+    """最近的工资单生成任务。Query: limit（默认 20）"""
+    try:
+        limit = request.args.get("limit", 20, type=int)
+        return standard_response(True, get_payroll_run_service().list_runs(limit=limit))
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/runs/<int:run_id>", methods=["GET"])
+def payroll_run_detail(run_id):
+    """任务进度：status、done/total、generated、errors"""
+    try:
+        run = get_payroll_run_service().get_run(run_id)
+        if run is None:
+            return standard_response(False, error="任务不存在", status_code=404)
+        return standard_response(True, run)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@payroll_api_bp.route("/payroll/runs/<int:run_id>/profile", methods=["GET"])
+def payroll_run_profile(run_id):
+    """任务剖析结果：按指标 / temporal_type 汇总的耗时、查询数、缓存命中（需创建任务时 profile=true）"""
+    try:
+        service = get_payroll_run_service()
+        if service.get_run(run_id) is None:
+            return standard_response(False, error="任务不存在", status_code=404)
+        profile = service.get_run_profile(run_id)
+        if profile is None:
+            return standard_response(False, error="该任务未开启剖析", status_code=404)
+        return standard_response(True, profile)
     except Exception as e:
         return standard_response(False, error=str(e), status_code=500)
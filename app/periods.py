@@ -0,0 +1,58 @@
+"""
+月份 / 薪资期数（YYYY-MM）的换算，供工资引擎、经营分析与透视查询共用
+"""
+from __future__ import annotations
+
+from typing import List
+
+
+def parse_month(value: str) -> int:
+    """YYYY-MM -> 月序号（year * 12 + month - 1），格式不对抛 ValueError"""
+    if not isinstance(value, str) or len(value) != 7 or value[4] != "-":
+        raise ValueError(f"月份格式应为 YYYY-MM: {value}")
+    year, month = int(value[:4]), int(value[5:7])
+    if not 1 <= month <= 12:
+        raise ValueError(f"月份格式应为 YYYY-MM: {value}")
+    return year * 12 + month - 1
+
+
+def prev_period(period: str) -> str:
+    """YYYY-MM 的上一期（格式不对返回 ''）"""
+    try:
+        y, m = map(int, period.split("-"))
+        m -= 1
+        if m < 1:
+            m, y = 12, y - 1
+        return f"{y:04d}-{m:02d}"
+    except (ValueError, AttributeError):
+        return ""
+
+
+def next_period(period: str) -> str:
+    """YYYY-MM 的下一期（格式不对原样返回）"""
+    try:
+        y, m = map(int, period.split("-"))
+        m += 1
+        if m > 12:
+            m, y = 1, y + 1
+        return f"{y:04d}-{m:02d}"
+    except (ValueError, AttributeError, TypeError):
+        return period
+
+
+def period_range(start: str, end: str) -> List[str]:
+    """[start, end] 区间内所有 YYYY-MM（含首尾；格式不对或 start 晚于 end 时为空）"""
+    try:
+        y1, m1 = map(int, start.split("-"))
+        y2, m2 = map(int, end.split("-"))
+    except (ValueError, AttributeError, TypeError):
+        return []
+    if (y1, m1) > (y2, m2):
+        return []
+    out, y, m = [], y1, m1
+    while (y, m) <= (y2, m2):
+        out.append(f"{y:04d}-{m:02d}")
+        m += 1
+        if m > 12:
+            m, y = 1, y + 1
+    return out
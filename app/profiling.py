@@ -0,0 +1,133 @@
+"""
+工资计算剖析（opt-in）
+
+在 profiling() 上下文内，PayrollEngine 按指标记录耗时、数据库查询数与缓存命中，
+并按 temporal_type 汇总；未开启时各埋点只做一次 ContextVar 读取。
+
+- 查询数：BaseDAO.get_connection 为连接挂上 sqlite3 trace callback，每条执行的 SQL 计一次
+- 缓存命中：计算结果缓存、生效区间 / 预加载输入等内存复用各计一次
+- 指标之外的开销（输入指纹等）记入 stages
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+
+class PayrollProfile:
+    """一次剖析的累计数据（一个请求或一个工资单任务）"""
+
+    def __init__(self):
+        self.queries = 0
+        self.cache_hits = 0
+        self.computes = 0
+        self.compute_cache_hits = 0
+        self.wall_ms = 0.0
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._started = time.perf_counter()
+
+    def record_query(self, _sql: str = "") -> None:
+        """sqlite3 trace callback"""
+        self.queries += 1
+
+    def cache_hit(self) -> None:
+        self.cache_hits += 1
+
+    @contextmanager
+    def measure(self, key: str, temporal_type: Optional[str] = None) -> Iterator[None]:
+        """统计一段执行的耗时 / 查询数 / 缓存命中；temporal_type 非空时记为指标，否则记为 stage"""
+        started = time.perf_counter()
+        queries, hits = self.queries, self.cache_hits
+        try:
+            yield
+        finally:
+            bucket = self.metrics if temporal_type is not None else self.stages
+            entry = bucket.get(key)
+            if entry is None:
+                entry = bucket[key] = {"calls": 0, "wall_ms": 0.0, "queries": 0, "cache_hits": 0}
+                if temporal_type is not None:
+                    entry["temporal_type"] = temporal_type
+            entry["calls"] += 1
+            entry["wall_ms"] += (time.perf_counter() - started) * 1000
+            entry["queries"] += self.queries - queries
+            entry["cache_hits"] += self.cache_hits - hits
+
+    def merge(self, summary: Optional[Dict[str, Any]], add_wall_time: bool = True) -> None:
+        """
+        并入另一次剖析的 summary()：任务续跑前的部分（总耗时累加），
+        或并行的工作进程分片（add_wall_time=False，总耗时仍以当前进程为准）
+        """
+        if not summary:
+            return
+        self.queries += summary.get("queries", 0)
+        self.cache_hits += summary.get("cache_hits", 0)
+        self.computes += summary.get("computes", 0)
+        self.compute_cache_hits += summary.get("compute_cache_hits", 0)
+        if add_wall_time:
+            self.wall_ms += summary.get("wall_ms", 0.0)
+        for bucket, entries in ((self.metrics, summary.get("by_metric", {})), (self.stages, summary.get("stages", {}))):
+            for key, other in entries.items():
+                entry = bucket.setdefault(key, {"calls": 0, "wall_ms": 0.0, "queries": 0, "cache_hits": 0})
+                if "temporal_type" in other:
+                    entry["temporal_type"] = other["temporal_type"]
+                for field in ("calls", "wall_ms", "queries", "cache_hits"):
+                    entry[field] += other.get(field, 0)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        {
+          wall_ms, queries, cache_hits, computes, compute_cache_hits,
+          by_metric: {key: {temporal_type, calls, wall_ms, queries, cache_hits}}（按耗时降序）,
+          by_temporal_type: {temporal_type: {metrics, calls, wall_ms, queries, cache_hits}},
+          stages: {name: {calls, wall_ms, queries, cache_hits}}
+        }
+        """
+        by_type: Dict[str, Dict[str, Any]] = {}
+        for entry in self.metrics.values():
+            agg = by_type.setdefault(
+                entry.get("temporal_type") or "formula",
+                {"metrics": 0, "calls": 0, "wall_ms": 0.0, "queries": 0, "cache_hits": 0},
+            )
+            agg["metrics"] += 1
+            for field in ("calls", "wall_ms", "queries", "cache_hits"):
+                agg[field] += entry[field]
+
+        def _rounded(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+            ordered = sorted(entries.items(), key=lambda item: item[1]["wall_ms"], reverse=True)
+            return {key: dict(entry, wall_ms=round(entry["wall_ms"], 3)) for key, entry in ordered}
+
+        return {
+            "wall_ms": round(self.wall_ms + (time.perf_counter() - self._started) * 1000, 1),
+            "queries": self.queries,
+            "cache_hits": self.cache_hits,
+            "computes": self.computes,
+            "compute_cache_hits": self.compute_cache_hits,
+            "by_metric": _rounded(self.metrics),
+            "by_temporal_type": _rounded(by_type),
+            "stages": _rounded(self.stages),
+        }
+
+
+_active_profile: ContextVar[Optional[PayrollProfile]] = ContextVar("_active_profile", default=None)
+
+
+def current_profile() -> Optional[PayrollProfile]:
+    """当前上下文中开启的剖析（未开启为 None）"""
+    return _active_profile.get()
+
+
+@contextmanager
+def profiling(enabled: bool = True) -> Iterator[Optional[PayrollProfile]]:
+    """开启剖析；enabled=False 时不做任何事并产出 None（便于调用方按参数开关）"""
+    if not enabled:
+        yield None
+        return
+    profile = PayrollProfile()
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
@@ -62,6 +62,9 @@ class TwinSchema:
     unique_key: Optional[List[str]] = None
     fields: Optional[Dict[str, FieldDefinition]] = None
     related_entities: Optional[List[RelatedEntity]] = None
+    interval_index: Optional[Dict[str, Any]] = None  # 生效区间索引：{effective_field, fields}
+    effective_index: Optional[str] = None  # 生效日期表达式索引的日期字段（TwinStateDAO.get_as_of）
+    fact_table: Optional[Dict[str, Any]] = None  # 分析事实表：{name, columns: {字段: 类型}, indexes}
     
     @classmethod
     def from_dict(cls, name: str, twin_def: Dict[str, Any]) -> "TwinSchema":
@@ -96,4 +99,7 @@ class TwinSchema:
             unique_key=twin_def.get("unique_key"),
             fields=fields,
             related_entities=related_entities,
+            interval_index=twin_def.get("interval_index"),
+            effective_index=twin_def.get("effective_index"),
+            fact_table=twin_def.get("fact_table"),
         )
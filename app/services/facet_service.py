@@ -0,0 +1,170 @@
+"""
+Facet Service - 列表页的枚举字段分面
+
+- 不带过滤：直接读取 twin_facet 中随写入增量维护的计数（见 app/daos/twins/facet_dao.py）
+- 带过滤：用进程内的取值位图求交集。每个 Twin 类型一份位图集合：{字段: {取值: int 位图}}，
+  第 twin_id 位为 1 表示该 Twin 最新状态取该值；注册表外键（如 company_id）也建位图，仅用于过滤。
+  计数 = (取值位图 & 其他字段过滤条件的交集) 中 1 的个数，无需重新扫描状态 JSON。
+
+位图按 Twin 类型的变更令牌（twin_change）校验：本进程写入时由写入监听立即丢弃，
+其他 worker 写入后令牌变化，下次使用时重建。
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.daos.twins.facet_dao import TwinFacetDAO, enum_fields
+from app.daos.twins.state_dao import add_append_listener
+from app.schema.loader import SchemaLoader
+from app.schema.models import TwinSchema
+
+
+def _popcount(bits: int) -> int:
+    """位图中 1 的个数（int.bit_count 需要 Python 3.10）"""
+    return bin(bits).count("1")
+
+
+class _FacetBitsets:
+    """某 Twin 类型的取值位图"""
+
+    def __init__(self, token: str, columns: List[str], rows: List[tuple]):
+        self.token = token
+        self.universe = 0
+        self.bits: Dict[str, Dict[str, int]] = {column: {} for column in columns}
+        for row in rows:
+            bit = 1 << row[0]
+            self.universe |= bit
+            for column, value in zip(columns, row[1:]):
+                if value is None or value == "":
+                    continue
+                values = self.bits[column]
+                key = str(value)
+                values[key] = values.get(key, 0) | bit
+
+
+class FacetBitsetCache:
+    """进程内位图缓存：(db_path, twin_name) -> _FacetBitsets"""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], _FacetBitsets] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, dao: TwinFacetDAO, twin_name: str) -> _FacetBitsets:
+        key = (str(dao.db_path), twin_name)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry.token == dao.get_change_token(twin_name):
+            return entry
+        entry = _FacetBitsets(*dao.load_latest_values(twin_name))
+        with self._lock:
+            self._entries[key] = entry
+            self.builds += 1
+        return entry
+
+    def invalidate(self, db_path: str, twin_name: str, twin_ids: List[int]) -> None:
+        with self._lock:
+            self._entries.pop((db_path, twin_name), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_bitset_cache = FacetBitsetCache()
+add_append_listener(_bitset_cache.invalidate)
+
+
+def get_facet_bitset_cache() -> FacetBitsetCache:
+    return _bitset_cache
+
+
+class FacetService:
+    """枚举字段分面服务"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.facet_dao = TwinFacetDAO(db_path=db_path)
+        self.schema_loader = SchemaLoader()
+
+    def get_facets(self, twin_name: str, filters: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        某 Twin 类型（按最新状态）各枚举字段每个取值的 Twin 数
+
+        Args:
+            twin_name: Twin 名称
+            filters: 过滤条件 {枚举字段或注册表外键: 取值}，取值可用逗号分隔表示「任一」；
+                     某字段的计数不受该字段自身的过滤条件约束（便于切换选项）
+
+        Returns:
+            {"total": 满足全部过滤条件的 Twin 数,
+             "facets": {字段: {"label": 标签, "counts": {取值: Twin 数}}}}（options 中的取值全部列出、含 0，另列出其他已有取值）
+        """
+        twin_def = self.schema_loader.get_twin_schema(twin_name)
+        if not twin_def:
+            raise ValueError(f"Twin schema not found: {twin_name}")
+        schema = TwinSchema.from_dict(twin_name, twin_def)
+        fields = enum_fields(schema)
+        if not fields:
+            raise ValueError(f"{twin_name} has no enum fields")
+        filters = {key: value for key, value in (filters or {}).items() if value}
+
+        if not filters:
+            total, counts = self.facet_dao.get_counts(twin_name)
+        else:
+            total, counts = self._filtered_counts(schema, fields, filters)
+
+        return {
+            "twin_name": twin_name,
+            "total": total,
+            "filters": filters,
+            "facets": {
+                field: {
+                    "label": schema.fields[field].label,
+                    "counts": self._ordered_counts(schema.fields[field].options, counts.get(field, {})),
+                }
+                for field in fields
+            },
+        }
+
+    def _filtered_counts(
+        self, schema: TwinSchema, fields: List[str], filters: Dict[str, str]
+    ) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        bitsets = _bitset_cache.get(self.facet_dao, schema.name)
+        unknown = [key for key in filters if key not in bitsets.bits]
+        if unknown:
+            raise ValueError(
+                f"Facet filters only support enum fields and registry keys of {schema.name}: {', '.join(unknown)}"
+            )
+
+        # 每个过滤字段的匹配位图（逗号分隔的多个取值取并集）
+        masks: Dict[str, int] = {}
+        for key, value in filters.items():
+            mask = 0
+            for option in (v.strip() for v in str(value).split(",")):
+                mask |= bitsets.bits[key].get(option, 0)
+            masks[key] = mask
+
+        def _intersect(exclude: Optional[str] = None) -> int:
+            result = bitsets.universe
+            for key, mask in masks.items():
+                if key != exclude:
+                    result &= mask
+            return result
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for field in fields:
+            scope = _intersect(exclude=field)
+            counts[field] = {
+                value: _popcount(bits & scope)
+                for value, bits in bitsets.bits[field].items()
+            }
+        return _popcount(_intersect()), counts
+
+    @staticmethod
+    def _ordered_counts(options: List[str], counts: Dict[str, int]) -> Dict[str, int]:
+        ordered = {str(option): counts.get(str(option), 0) for option in options}
+        for value, count in counts.items():
+            if value not in ordered and count:
+                ordered[value] = count
+        return ordered
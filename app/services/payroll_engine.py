@@ -7,12 +7,21 @@ PayrollEngine - 基于指标注册表（payroll_metrics.yaml）的工资计算
 from __future__ import annotations
 
 import calendar
-from datetime import date, datetime, timedelta
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
-import yaml
-
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config.config_registry import get_config_snapshot
+from app.daos.base_dao import read_snapshot
+from app.daos.twins.interval_dao import IntervalTimeline, TwinIntervalDAO
+from app.daos.twins.state_dao import add_append_listener
+from app.periods import next_period, period_range, prev_period
+from app.profiling import current_profile
 from app.services.twin_service import TwinService
 
 # 月计薪天数（考勤扣减公式用）
@@ -21,49 +30,132 @@ MONTHLY_WORK_DAYS = 21.75
 # 在岗月数参考日（扣减个税期数当月的该日）
 PAYROLL_REFERENCE_DAY = 26
 
-_METRICS_PATH = Path(__file__).resolve().parent.parent / "config" / "payroll_metrics.yaml"
+_CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
 
+# 输入指纹格式版本：取数逻辑变化时递增，使旧指纹全部失效
+FINGERPRINT_VERSION = 2
 
-# ── 期数工具函数 ──────────────────────────────────────────────────────────────
+# cross_period resolver 依赖的 Twin（用于输入指纹）
+_CROSS_PERIOD_TWINS = {
+    "months_employed_in_year": "person_company_employment",
+}
 
-def _parse_date(raw: Any) -> Optional[date]:
-    if not raw:
-        return None
-    try:
-        if hasattr(raw, "year"):
-            return raw
-        return datetime.strptime(str(raw)[:10], "%Y-%m-%d").date()
-    except (ValueError, TypeError):
-        return None
+# 配置文件哈希缓存：{path: ((mtime_ns, size), sha1)}
+_config_hash_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
 
 
-def _prev_period(period: str) -> str:
-    """YYYY-MM 的上一期"""
-    try:
-        y, m = map(int, period.split("-"))
-        m -= 1
-        if m < 1:
-            m, y = 12, y - 1
-        return f"{y:04d}-{m:02d}"
-    except (ValueError, AttributeError):
-        return ""
+def _config_fingerprint() -> str:
+    """
+    配置目录下所有 YAML 的内容哈希（按 mtime/size 缓存，文件未变时不重读）；
+    处于模拟覆盖（config_overrides）中时附加覆盖摘要，模拟结果不与正式结果共用缓存。
+    """
+    parts = []
+    for path in sorted(_CONFIG_DIR.glob("*.yaml")):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _config_hash_cache.get(str(path))
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, hashlib.sha1(path.read_bytes()).hexdigest())
+            _config_hash_cache[str(path)] = cached
+        parts.append(f"{path.name}:{cached[1]}")
+    overlay_digest = get_config_snapshot().overlay_digest
+    if overlay_digest:
+        parts.append(f"overrides:{overlay_digest}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
 
 
-def _next_period(period: str) -> str:
-    """YYYY-MM 的下一期"""
-    try:
-        y, m = map(int, period.split("-"))
-        m += 1
-        if m > 12:
-            m, y = 1, y + 1
-        return f"{y:04d}-{m:02d}"
-    except (ValueError, AttributeError, TypeError):
-        return period
+# ── 计算结果缓存 ──────────────────────────────────────────────────────────────
+
+# 进程内缓存的 compute() 结果条数上限
+COMPUTE_CACHE_SIZE = 2048
+
+
+class ComputeResultCache:
+    """
+    compute() 结果的有界 LRU 缓存。
+
+    key = (db_path, person_id, company_id, salary_period, 输入指纹)：指纹涵盖所有来源 Twin 的状态标记
+    与配置哈希，输入变化后旧条目自然不再命中；另按 (db_path, twin_name, twin_id) 建立反向索引，
+    本进程内写入相关 Twin 时立即剔除其条目，避免过期结果占用容量。
+    """
+
+    def __init__(self, maxsize: int = COMPUTE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, Tuple[Dict[str, float], frozenset]]" = OrderedDict()
+        self._by_twin: Dict[tuple, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Dict[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key: tuple, resolved: Dict[str, float], deps: frozenset) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (dict(resolved), deps)
+            for dep in deps:
+                self._by_twin.setdefault(dep, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, db_path: str, twin_name: str, twin_ids: List[int]) -> None:
+        with self._lock:
+            for twin_id in twin_ids:
+                for key in list(self._by_twin.get((db_path, twin_name, int(twin_id)), ())):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_twin.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for dep in entry[1]:
+            keys = self._by_twin.get(dep)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_twin[dep]
+
+
+_compute_cache = ComputeResultCache()
+add_append_listener(_compute_cache.invalidate)
+
+
+def get_compute_cache() -> ComputeResultCache:
+    return _compute_cache
+
+
+# ── 期数工具函数 ──────────────────────────────────────────────────────────────
+
+def _count_cache_hit() -> None:
+    """剖析开启时记一次内存复用命中"""
+    profile = current_profile()
+    if profile is not None:
+        profile.cache_hit()
 
 
 def _deduction_tax_period(salary_period: str) -> str:
     """薪资期数 → 扣减个税期数（下一自然月）"""
-    return _next_period(salary_period)
+    return next_period(salary_period)
 
 
 def _period_end_date(period: str) -> Optional[date]:
@@ -76,26 +168,51 @@ def _period_end_date(period: str) -> Optional[date]:
         return None
 
 
-def _period_range(start: str, end: str) -> List[str]:
-    """[start, end] 区间内所有 YYYY-MM（含首尾）"""
+def _tax_year_of(deduction_tax_period: str) -> Optional[int]:
+    """扣减个税期数所属年度 = 参考日（当月 PAYROLL_REFERENCE_DAY 日）所在年"""
     try:
-        y1, m1 = map(int, start.split("-"))
-        y2, m2 = map(int, end.split("-"))
-    except (ValueError, AttributeError, TypeError):
-        return []
-    if (y1, m1) > (y2, m2):
-        return []
-    out, y, m = [], y1, m1
-    while (y, m) <= (y2, m2):
-        out.append(f"{y:04d}-{m:02d}")
-        m += 1
-        if m > 12:
-            m, y = 1, y + 1
-    return out
+        dt_y, dt_m = map(int, deduction_tax_period.split("-"))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    last_day = calendar.monthrange(dt_y, dt_m)[1]
+    return date(dt_y, dt_m, min(PAYROLL_REFERENCE_DAY, last_day)).year
+
+
+def _tax_year_salary_periods(year: int) -> Tuple[str, str]:
+    """某个个税年度对应的薪资期数区间（工资单存储键）：上年 12 月 ～ 当年 11 月"""
+    return f"{year - 1:04d}-12", f"{year:04d}-11"
+
+
+def ytd_accumulator_key(from_metric: str) -> str:
+    """工资单上 from_metric 的当年累计（含本期）字段名"""
+    return f"ytd_total_{from_metric}"
 
 
 # ── 引擎 ──────────────────────────────────────────────────────────────────────
 
+class _RangeInputs:
+    """
+    compute_range 期间一名人员的预加载输入，跨月复用：
+    生效区间、时序记录（整段区间一次读取）、as-of 查询结果与版本 Twin 的变更标记。
+    """
+
+    def __init__(self, person_id: int, company_id: int, first_period: str, last_period: str):
+        self.person_id = person_id
+        self.company_id = company_id
+        # 时序记录需覆盖薪资期与扣减个税期两种口径
+        self.first_period = first_period
+        self.last_period = next_period(last_period)
+        self.timelines: Dict[Tuple[str, int, int], IntervalTimeline] = {}
+        self.period_records: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.as_of: Dict[tuple, Any] = {}
+        self.markers: Dict[tuple, List[tuple]] = {}
+
+    def covers(self, person_id: int, company_id: int, period: Optional[str] = None) -> bool:
+        if (person_id, company_id) != (self.person_id, self.company_id):
+            return False
+        return period is None or self.first_period <= period <= self.last_period
+
+
 class PayrollEngine:
     """
     基于指标注册表的工资计算引擎。
@@ -108,15 +225,17 @@ class PayrollEngine:
     def __init__(self, db_path: Optional[str] = None):
         self.twin_service = TwinService(db_path=db_path)
         self.state_dao = self.twin_service.state_dao
-        self._metrics_cache: Optional[Dict[str, Any]] = None
+        self.interval_dao = TwinIntervalDAO(db_path=self.state_dao.db_path)
+        # 单次 compute 内复用的生效区间（compute 结束即丢弃，避免跨次计算读到过期数据）
+        self._timeline_memo: Optional[Dict[Tuple[str, int, int], IntervalTimeline]] = None
+        # compute_range 期间的预加载输入（见 _RangeInputs）
+        self._range_inputs: Optional[_RangeInputs] = None
 
     # ── 配置加载 ──────────────────────────────────────────────────────────────
 
     def load_metrics(self) -> Dict[str, Any]:
-        if self._metrics_cache is None:
-            with open(_METRICS_PATH, "r", encoding="utf-8") as f:
-                self._metrics_cache = yaml.safe_load(f) or {}
-        return self._metrics_cache
+        """指标注册表（来自配置快照，payroll_metrics.yaml 修改后自动重新加载）"""
+        return get_config_snapshot().metrics
 
     # ── 拓扑排序 ──────────────────────────────────────────────────────────────
 
@@ -202,71 +321,51 @@ class PayrollEngine:
     def _resolve_constant(self, source: Dict[str, Any]) -> float:
         return float(source.get("value", 0))
 
-    def _resolve_point_in_time_version_history(
+    def _timeline(self, twin_name: str, person_id: int, company_id: int) -> IntervalTimeline:
+        """(person, company) 在某 Twin 上的生效区间，compute 期间按 key 复用"""
+        key = (twin_name, person_id, company_id)
+        if self._timeline_memo is not None and key in self._timeline_memo:
+            _count_cache_hit()
+            return self._timeline_memo[key]
+        filters = self._build_twin_filters(twin_name, person_id, company_id)
+        timeline = self.interval_dao.load_timeline(twin_name, related_filters=filters)
+        if self._timeline_memo is not None:
+            self._timeline_memo[key] = timeline
+        return timeline
+
+    def _resolve_point_in_time_interval(
         self,
         source: Dict[str, Any],
         period: str,
         person_id: int,
         company_id: int,
     ) -> float:
-        """
-        版本历史模式：单个 activity 有多个版本（如雇佣信息调薪记录）。
-        取所有版本中 effective_field ≤ period 月末 的最新一条。
-        """
-        twin_name = source["twin"]
-        field = source["field"]
-        effective_field = source.get("effective_field")
-        transform = source.get("transform")
+        """由生效区间索引回答：bisect 取 period 月末时生效的版本"""
         default = float(source.get("default", 0))
-
         period_end = _period_end_date(period)
         if period_end is None:
             return default
 
-        filters = self._build_twin_filters(twin_name, person_id, company_id)
-        twins = self.twin_service.list_twins(twin_name, filters=filters)
-        if not twins:
-            return default
-
-        detail = self.twin_service.get_twin(twin_name, int(twins[0]["id"]))
-        if not detail:
+        best_state = self._timeline(source["twin"], person_id, company_id).at(period_end)
+        if best_state is None:
             return default
-
-        current = detail.get("current") or {}
-        history = detail.get("history") or []
-        all_states = [current] + [h.get("data") or {} for h in history]
-
-        valid: List[Tuple[Dict[str, Any], date]] = []
-        for state in all_states:
-            eff = _parse_date(state.get(effective_field)) if effective_field else date.min
-            if eff is None:
-                eff = date.min
-            if eff <= period_end:
-                valid.append((state, eff))
-
-        if not valid:
-            return default
-
-        best_state = max(valid, key=lambda x: x[1])[0]
-        raw_value = best_state.get(field)
+        raw_value = best_state.get(source["field"])
         if raw_value is None:
             return default
+        transform = source.get("transform")
         return self._apply_transform(transform, raw_value, best_state) if transform else float(raw_value or default)
 
-    def _resolve_point_in_time_activity_scan(
+    def _resolve_point_in_time_as_of(
         self,
         source: Dict[str, Any],
         period: str,
         person_id: int,
         company_id: int,
+        latest_only: bool,
     ) -> float:
-        """
-        活动扫描模式：多个 activity 各自代表一次事件（如每次考核为独立 activity）。
-        取所有 activity 最新状态中 effective_field ≤ period 月末 的最新一条。
-        """
+        """取 effective_field ≤ period 月末 的最新一条状态（TwinStateDAO.get_as_of 单条查询）"""
         twin_name = source["twin"]
         field = source["field"]
-        effective_field = source.get("effective_field")
         transform = source.get("transform")
         default = float(source.get("default", 0))
 
@@ -275,22 +374,25 @@ class PayrollEngine:
             return default
 
         filters = self._build_twin_filters(twin_name, person_id, company_id)
-        twins = self.twin_service.list_twins(twin_name, filters=filters)
-        if not twins:
-            return default
-
-        valid: List[Tuple[Dict[str, Any], date]] = []
-        for t in twins:
-            eff = _parse_date(t.get(effective_field)) if effective_field else date.min
-            if eff is None:
-                continue
-            if eff <= period_end:
-                valid.append((t, eff))
-
-        if not valid:
+        range_inputs = self._range_inputs
+        memo_key = (twin_name, source.get("effective_field"), period_end, latest_only)
+        if range_inputs is not None and range_inputs.covers(person_id, company_id) and memo_key in range_inputs.as_of:
+            _count_cache_hit()
+            state = range_inputs.as_of[memo_key]
+        else:
+            state = self.state_dao.get_as_of(
+                twin_name,
+                source.get("effective_field"),
+                period_end,
+                related_filters=filters,
+                latest_only=latest_only,
+            )
+            if range_inputs is not None and range_inputs.covers(person_id, company_id):
+                range_inputs.as_of[memo_key] = state
+        if state is None:
             return default
 
-        best_state = max(valid, key=lambda x: x[1])[0]
+        best_state = state.data or {}
         raw_value = best_state.get(field)
         if raw_value is None:
             return default
@@ -303,10 +405,23 @@ class PayrollEngine:
         person_id: int,
         company_id: int,
     ) -> float:
+        """
+        - version_history：单个 activity 有多个版本（如雇佣信息调薪记录），在所有版本中查找
+        - activity_scan：多个 activity 各自代表一次事件（如每次考核为独立 activity），
+          只看各 activity 的最新状态，缺失生效日期的跳过
+
+        两种模式都在 (person, company) 匹配的全部 activity 中取 period 月末生效的一条：
+        同一人员在同一公司有多条聘用记录（如离职后再入职）时，按生效日期合并为一条时间线，
+        而不是只看列表中的第一条（其顺序取决于各记录的版本数，并不确定）。
+        """
         scan_mode = source.get("scan_mode", "version_history")
-        if scan_mode == "activity_scan":
-            return self._resolve_point_in_time_activity_scan(source, period, person_id, company_id)
-        return self._resolve_point_in_time_version_history(source, period, person_id, company_id)
+        if scan_mode == "version_history" and self.interval_dao.is_indexed(
+            source["twin"], source["field"], source.get("effective_field")
+        ):
+            return self._resolve_point_in_time_interval(source, period, person_id, company_id)
+        return self._resolve_point_in_time_as_of(
+            source, period, person_id, company_id, latest_only=(scan_mode == "activity_scan")
+        )
 
     def _resolve_period_record(
         self,
@@ -320,6 +435,13 @@ class PayrollEngine:
         field = source["field"]
         default = float(source.get("default", 0))
 
+        range_inputs = self._range_inputs
+        if range_inputs is not None and range_inputs.covers(person_id, company_id, period):
+            data = self._range_period_records(twin_name).get(period)
+            if not data:
+                return default
+            return float(data.get(field, default) or default)
+
         filters = self._build_twin_filters(twin_name, person_id, company_id)
         twins = self.twin_service.list_twins(twin_name, filters=filters)
         if not twins:
@@ -330,6 +452,24 @@ class PayrollEngine:
             return default
         return float(state.data.get(field, default) or default)
 
+    def _range_period_records(self, twin_name: str) -> Dict[str, Dict[str, Any]]:
+        """compute_range 期间某时序 Twin 在整段区间内的记录 {time_key: data}（每个 Twin 只读一次）"""
+        range_inputs = self._range_inputs
+        records = range_inputs.period_records.get(twin_name)
+        if records is not None:
+            _count_cache_hit()
+        else:
+            records = {}
+            filters = self._build_twin_filters(twin_name, range_inputs.person_id, range_inputs.company_id)
+            twins = self.twin_service.list_twins(twin_name, filters=filters)
+            if twins:
+                for state in self.state_dao.list_states_in_range(
+                    twin_name, int(twins[0]["id"]), range_inputs.first_period, range_inputs.last_period
+                ):
+                    records[state.time_key] = state.data or {}
+            range_inputs.period_records[twin_name] = records
+        return records
+
     def _resolve_config_lookup(self, source: Dict[str, Any], period: str) -> float:
         """从配置文件按 period 查取对应行的字段值"""
         from app.config.payroll_config import get_social_security_config
@@ -350,27 +490,24 @@ class PayrollEngine:
         deduction_tax_period: str,
         person_id: int,
         company_id: int,
+        prev_payslip: Optional[Dict[str, Any]] = None,
     ) -> float:
         """
         当年至上期的历史工资单累计 sum（deduction_tax 口径）。
 
         deduction_tax_period D 所在年 = 参考日（D 月 26 日）所在年。
-        对每个范围内的 deduction_period d：salary_period = d - 1 个月，
-        查该 salary_period 对应的工资单，累加 from_metric 字段。
+        工资单上保存了 from_metric 的当年累计（ytd_total_<from_metric>，含该期），
+        因此只需读取本年度内、本期之前最近的一张工资单；
+        该工资单缺少累计字段（历史数据）时才回退为逐月扫描。
+        prev_payslip 不为 None 时直接使用调用方在内存中传入的上一张工资单，不读库。
         """
         from_metric = source["from_metric"]
 
-        try:
-            dt_y, dt_m = map(int, deduction_tax_period.split("-"))
-        except (ValueError, TypeError):
+        cur_year = _tax_year_of(deduction_tax_period)
+        if cur_year is None:
             return 0.0
 
-        last_day = calendar.monthrange(dt_y, dt_m)[1]
-        ref_date = date(dt_y, dt_m, min(PAYROLL_REFERENCE_DAY, last_day))
-        cur_year = ref_date.year
-        year_start = f"{cur_year:04d}-01"
-
-        prev_dt = _prev_period(deduction_tax_period)
+        prev_dt = prev_period(deduction_tax_period)
         try:
             prev_year = int(prev_dt.split("-")[0])
         except (ValueError, TypeError):
@@ -380,6 +517,12 @@ class PayrollEngine:
         if prev_year < cur_year:
             return 0.0
 
+        year_first_salary_period, _ = _tax_year_salary_periods(cur_year)
+        if prev_payslip is not None:
+            if (prev_payslip.get("salary_period") or "") < year_first_salary_period:
+                return 0.0
+            return float(prev_payslip.get(ytd_accumulator_key(from_metric)) or 0)
+
         payroll_twins = self.twin_service.list_twins(
             "person_company_payroll",
             filters={"person_id": str(person_id), "company_id": str(company_id)},
@@ -388,29 +531,55 @@ class PayrollEngine:
             return 0.0
         payroll_id = int(payroll_twins[0]["id"])
 
+        prev_state = self.state_dao.get_previous_state_by_time_key(
+            "person_company_payroll", payroll_id, salary_period, since_time_key=year_first_salary_period
+        )
+        if not prev_state or not prev_state.data:
+            return 0.0
+        acc_key = ytd_accumulator_key(from_metric)
+        if acc_key in prev_state.data:
+            return float(prev_state.data.get(acc_key) or 0)
+
+        return self._scan_ytd_sum(from_metric, payroll_id, cur_year, prev_dt)
+
+    def _scan_ytd_sum(
+        self, from_metric: str, payroll_id: int, year: int, prev_deduction_period: str
+    ) -> float:
+        """逐月扫描历史工资单累加 from_metric（无累计字段的历史工资单回退路径）"""
         total = 0.0
-        for d in _period_range(year_start, prev_dt):
-            s_key = _prev_period(d)  # deduction_period → salary_period（工资单存储键）
+        for d in period_range(f"{year:04d}-01", prev_deduction_period):
+            s_key = prev_period(d)  # deduction_period → salary_period（工资单存储键）
             state = self.state_dao.get_state_by_time_key("person_company_payroll", payroll_id, s_key)
             if state and state.data:
                 total += float(state.data.get(from_metric, 0) or 0)
         return total
 
+    def ytd_sum_sources(self) -> Dict[str, str]:
+        """所有 ytd_sum 指标：{指标key: from_metric}"""
+        metrics = self.load_metrics().get("metrics", {})
+        return {
+            key: (metric.get("source") or {}).get("from_metric")
+            for key, metric in metrics.items()
+            if metric.get("temporal_type") == "ytd_sum" and (metric.get("source") or {}).get("from_metric")
+        }
+
     def _resolve_prev_value(
         self,
         source: Dict[str, Any],
         deduction_tax_period: str,
         person_id: int,
         company_id: int,
+        prev_payslip: Optional[Dict[str, Any]] = None,
     ) -> float:
         """
         上期工资单的指定字段值（同年内，跨年归零）。
 
         上期 deduction_tax_period = D - 1，对应 salary_period = D - 2。
+        prev_payslip 不为 None 时使用内存中的上一张工资单（须恰为上期，否则视为无上期）。
         """
         from_metric = source["from_metric"]
 
-        prev_dt = _prev_period(deduction_tax_period)
+        prev_dt = prev_period(deduction_tax_period)
         try:
             prev_year = int(prev_dt.split("-")[0])
             cur_year = int(deduction_tax_period.split("-")[0])
@@ -421,7 +590,12 @@ class PayrollEngine:
         if prev_year != cur_year:
             return 0.0
 
-        prev_salary_period = _prev_period(prev_dt)
+        prev_salary_period = prev_period(prev_dt)
+        if prev_payslip is not None:
+            if prev_payslip.get("salary_period") != prev_salary_period:
+                return 0.0
+            return float(prev_payslip.get(from_metric, 0) or 0)
+
         payroll_twins = self.twin_service.list_twins(
             "person_company_payroll",
             filters={"person_id": str(person_id), "company_id": str(company_id)},
@@ -474,6 +648,26 @@ class PayrollEngine:
         company_id: int,
         salary_period: str,
         deduction_tax_period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
+        key: Optional[str] = None,
+    ) -> float:
+        """求值单个指标；处于 profiling() 中时按指标记录耗时、查询数与缓存命中"""
+        args = (metric, resolved, person_id, company_id, salary_period, deduction_tax_period, prev_payslip)
+        profile = current_profile()
+        if profile is None:
+            return self._resolve_metric_value(*args)
+        with profile.measure(key or metric.get("label") or "?", metric.get("temporal_type", "formula")):
+            return self._resolve_metric_value(*args)
+
+    def _resolve_metric_value(
+        self,
+        metric: Dict[str, Any],
+        resolved: Dict[str, float],
+        person_id: int,
+        company_id: int,
+        salary_period: str,
+        deduction_tax_period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
     ) -> float:
         temporal_type = metric.get("temporal_type", "formula")
         period_basis = metric.get("period_basis", "none")
@@ -491,9 +685,13 @@ class PayrollEngine:
         if temporal_type == "config_lookup":
             return self._resolve_config_lookup(source, period)
         if temporal_type == "ytd_sum":
-            return self._resolve_ytd_sum(source, salary_period, deduction_tax_period, person_id, company_id)
+            return self._resolve_ytd_sum(
+                source, salary_period, deduction_tax_period, person_id, company_id, prev_payslip
+            )
         if temporal_type == "prev_value":
-            return self._resolve_prev_value(source, deduction_tax_period, person_id, company_id)
+            return self._resolve_prev_value(
+                source, deduction_tax_period, person_id, company_id, prev_payslip
+            )
         if temporal_type == "cross_period":
             return self._resolve_cross_period(source, deduction_tax_period, person_id, company_id)
         if temporal_type == "formula":
@@ -503,31 +701,300 @@ class PayrollEngine:
     # ── 主入口 ────────────────────────────────────────────────────────────────
 
     def compute(
-        self, person_id: int, company_id: int, salary_period: str
+        self,
+        person_id: int,
+        company_id: int,
+        salary_period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, float]:
         """
         计算所有指标，返回 {指标key: 值} 字典。
 
         执行顺序由拓扑排序保证：formula 指标在其 depends_on 全部求值后才执行。
+        prev_payslip：本个税年度内本期之前最近一张工资单的 data（{} 表示没有），
+        供 prev_value / ytd_sum 直接使用；None 表示从数据库读取。
         """
-        deduction_tax_period = _deduction_tax_period(salary_period)
-        config = self.load_metrics()
-        metrics = config.get("metrics", {})
+        return self.compute_with_fingerprint(person_id, company_id, salary_period, prev_payslip)[0]
+
+    def compute_with_fingerprint(
+        self,
+        person_id: int,
+        company_id: int,
+        salary_period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
+        metrics: Optional[Dict[str, Any]] = None,
+        order: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, float], Optional[str]]:
+        """
+        计算所有指标并返回 (结果, 输入指纹)。
+        从数据库取数时（prev_payslip is None）经 ComputeResultCache 复用指纹相同的已有结果，
+        预览后紧接着生成不会重复计算；带入 prev_payslip 的结果依赖调用方数据，不缓存，
+        也不计算指纹（返回 None）——其上期工资单可能尚未写入，需要落库的调用方在写入后
+        用 input_fingerprint(source_markers=...) 补算。
+        """
+        if metrics is None:
+            metrics = self.load_metrics().get("metrics", {})
+            order = self._topological_sort(metrics)
+        profile = current_profile()
+        if profile is not None:
+            profile.computes += 1
+        if prev_payslip is not None:
+            resolved = self._compute_ordered(
+                metrics, order, person_id, company_id, salary_period, prev_payslip
+            )
+            return resolved, None
+
+        if profile is None:
+            fingerprint, deps = self._input_fingerprint_and_deps(person_id, company_id, salary_period)
+        else:
+            with profile.measure("input_fingerprint"):
+                fingerprint, deps = self._input_fingerprint_and_deps(person_id, company_id, salary_period)
+
+        key = (str(self.state_dao.db_path), person_id, company_id, salary_period, fingerprint)
+        resolved = _compute_cache.get(key)
+        if resolved is None:
+            resolved = self._compute_ordered(metrics, order, person_id, company_id, salary_period)
+            _compute_cache.put(key, resolved, deps)
+        elif profile is not None:
+            profile.compute_cache_hits += 1
+        return resolved, fingerprint
+
+    def compute_batch(
+        self,
+        targets: List[Tuple[int, int]],
+        salary_period: str,
+    ) -> Tuple[Dict[Tuple[int, int], Dict[str, float]], List[Dict[str, Any]]]:
+        """
+        批量计算多人同一期的指标：指标注册表与拓扑顺序只取一次，单人失败不影响其他人。
+        返回 ({(person_id, company_id): {指标key: 值}}, errors)。
+        """
+        metrics = self.load_metrics().get("metrics", {})
+        order = self._topological_sort(metrics)
+        results: Dict[Tuple[int, int], Dict[str, float]] = {}
+        errors: List[Dict[str, Any]] = []
+        for pid, cid in targets:
+            try:
+                results[(pid, cid)] = self.compute_with_fingerprint(
+                    pid, cid, salary_period, metrics=metrics, order=order
+                )[0]
+            except Exception as e:
+                errors.append({"person_id": pid, "reason": str(e)})
+        return results, errors
+
+    def carry_payslip(
+        self, salary_period: str, resolved: Dict[str, float], fingerprint: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """由一期的计算结果构造传给下一期的上期工资单（prev_value / ytd_sum 所需字段）"""
+        data: Dict[str, Any] = dict(resolved)
+        data["salary_period"] = salary_period
+        for ytd_key, from_metric in self.ytd_sum_sources().items():
+            data[ytd_accumulator_key(from_metric)] = (
+                float(resolved.get(ytd_key, 0) or 0) + float(resolved.get(from_metric, 0) or 0)
+            )
+        return data
+
+    @contextmanager
+    def preloaded_range(
+        self, person_id: int, company_id: int, start_period: str, end_period: str
+    ) -> Iterator[None]:
+        """在该上下文内，对 (person_id, company_id) 在 [start_period, end_period] 内的计算复用预加载输入"""
+        previous = self._range_inputs
+        self._range_inputs = _RangeInputs(person_id, company_id, start_period, end_period)
+        try:
+            yield
+        finally:
+            self._range_inputs = previous
+
+    def compute_range(
+        self,
+        person_id: int,
+        company_id: int,
+        start_period: str,
+        end_period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
+        to_payslip=None,
+    ) -> Tuple[List[Tuple[str, Dict[str, float], Dict[str, Any]]], List[Dict[str, Any]]]:
+        """
+        一次计算一名人员 [start_period, end_period] 内各期的工资（如全年 12 期）。
+
+        在同一只读快照内：生效区间、时序记录等输入整段只读一次，各月按顺序计算，
+        每期结果经 to_payslip(period, resolved, fingerprint)（默认 carry_payslip）转为工资单 data
+        （fingerprint 仅在首期从数据库读取上期时给出，其余为 None，见 compute_with_fingerprint），
+        直接作为下一期的 prev_payslip（累计个税、上期值、年度累计在内存中传递，跨个税年度时自动归零）。
+        prev_payslip 为首期的上期工资单（None 表示从数据库读取；首期为个税年度首期时无需读取）。
+
+        返回 ([(period, resolved, payslip)], errors)；某期失败即停止（其后各期依赖该期结果），
+        errors 记录失败的期数与原因。
+        """
+        periods = period_range(start_period, end_period)
+        if not periods:
+            raise ValueError("期数格式应为 YYYY-MM，且结束期数不能早于开始期数")
+        to_payslip = to_payslip or self.carry_payslip
+        if prev_payslip is None:
+            year = _tax_year_of(_deduction_tax_period(start_period))
+            if year and _tax_year_salary_periods(year)[0] == start_period:
+                prev_payslip = {}
+
+        metrics = self.load_metrics().get("metrics", {})
         order = self._topological_sort(metrics)
+        results: List[Tuple[str, Dict[str, float], Dict[str, Any]]] = []
+        errors: List[Dict[str, Any]] = []
+        with read_snapshot(str(self.state_dao.db_path)), \
+                self.preloaded_range(person_id, company_id, start_period, end_period):
+            for period in periods:
+                try:
+                    resolved, fingerprint = self.compute_with_fingerprint(
+                        person_id, company_id, period, prev_payslip=prev_payslip, metrics=metrics, order=order
+                    )
+                    payslip = to_payslip(period, resolved, fingerprint)
+                except Exception as e:
+                    errors.append({"person_id": person_id, "period": period, "reason": str(e)})
+                    break
+                results.append((period, resolved, payslip))
+                prev_payslip = payslip
+        return results, errors
 
+    def _compute_ordered(
+        self,
+        metrics: Dict[str, Any],
+        order: List[str],
+        person_id: int,
+        company_id: int,
+        salary_period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, float]:
+        deduction_tax_period = _deduction_tax_period(salary_period)
         resolved: Dict[str, float] = {}
-        for key in order:
-            metric = metrics.get(key)
-            if not metric:
-                continue
-            val = self._resolve_metric(
-                metric, resolved, person_id, company_id,
-                salary_period, deduction_tax_period,
-            )
-            resolved[key] = val
+        range_inputs = self._range_inputs
+        if range_inputs is not None and range_inputs.covers(person_id, company_id):
+            self._timeline_memo = range_inputs.timelines
+        else:
+            self._timeline_memo = {}
+        try:
+            for key in order:
+                metric = metrics.get(key)
+                if not metric:
+                    continue
+                val = self._resolve_metric(
+                    metric, resolved, person_id, company_id,
+                    salary_period, deduction_tax_period, prev_payslip, key=key,
+                )
+                resolved[key] = val
+        finally:
+            self._timeline_memo = None
 
         return resolved
 
+    # ── 输入指纹（增量生成）────────────────────────────────────────────────────
+
+    def input_fingerprint(
+        self,
+        person_id: int,
+        company_id: int,
+        salary_period: str,
+        source_markers: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        计算某人某期工资单的输入指纹：
+        各来源 Twin 的状态变更标记（状态行 id）、本年度此前工资单的标记、配置文件哈希。
+        任一输入变化指纹即变化；只查标记列，不解析 data。
+
+        source_markers：计算时同一快照内取得的来源标记（input_source_markers），
+        给出时只重新读取此前工资单的标记——级联 / 整段重算写入后据此补算指纹。
+        """
+        return self._input_fingerprint_and_deps(person_id, company_id, salary_period, source_markers)[0]
+
+    def input_source_markers(self, person_id: int, company_id: int, salary_period: str) -> Dict[str, Any]:
+        """
+        输入指纹中除此前工资单以外的部分（来源 Twin 的状态标记）；
+        指纹需涵盖此前工资单时含 "person_company_payroll": None，由 input_fingerprint 补读
+        """
+        markers, needs_prev_payslips = self._input_source_markers(person_id, company_id, salary_period)
+        if needs_prev_payslips:
+            markers["person_company_payroll"] = None
+        return markers
+
+    def _input_fingerprint_and_deps(
+        self,
+        person_id: int,
+        company_id: int,
+        salary_period: str,
+        source_markers: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, frozenset]:
+        """输入指纹，以及其涵盖的 (db_path, twin_name, twin_id) 集合（供缓存失效索引）"""
+        if source_markers is None:
+            markers, needs_prev_payslips = self._input_source_markers(person_id, company_id, salary_period)
+        else:
+            markers = dict(source_markers)
+            needs_prev_payslips = "person_company_payroll" in markers
+        if needs_prev_payslips:
+            year = _tax_year_of(_deduction_tax_period(salary_period))
+            since = _tax_year_salary_periods(year)[0] if year else salary_period
+            markers["person_company_payroll"] = self.state_dao.get_state_markers(
+                "person_company_payroll",
+                {"person_id": str(person_id), "company_id": str(company_id)},
+                since_time_key=since,
+                before_time_key=salary_period,
+            )
+
+        payload = json.dumps(
+            [FINGERPRINT_VERSION, _config_fingerprint(), markers],
+            sort_keys=True, default=str,
+        )
+        db_path = str(self.state_dao.db_path)
+        deps = frozenset(
+            (db_path, twin_name, int(row[0]))
+            for twin_name, rows in markers.items()
+            for row in rows
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest(), deps
+
+    def _input_source_markers(
+        self, person_id: int, company_id: int, salary_period: str
+    ) -> Tuple[Dict[str, Any], bool]:
+        """来源 Twin 的状态标记，以及指纹是否还需涵盖此前工资单（有 ytd_sum / prev_value 指标）"""
+        deduction_tax_period = _deduction_tax_period(salary_period)
+        metrics = self.load_metrics().get("metrics", {})
+
+        versioned_twins: set = set()
+        period_keys: Dict[str, set] = {}
+        needs_prev_payslips = False
+        for metric in metrics.values():
+            temporal_type = metric.get("temporal_type")
+            source = metric.get("source") or {}
+            period = salary_period if metric.get("period_basis") == "salary" else deduction_tax_period
+            if temporal_type == "point_in_time" and source.get("twin"):
+                versioned_twins.add(source["twin"])
+            elif temporal_type == "period_record" and source.get("twin"):
+                period_keys.setdefault(source["twin"], set()).add(period)
+            elif temporal_type == "cross_period" and source.get("resolver") in _CROSS_PERIOD_TWINS:
+                versioned_twins.add(_CROSS_PERIOD_TWINS[source["resolver"]])
+            elif temporal_type in ("ytd_sum", "prev_value"):
+                needs_prev_payslips = True
+
+        range_inputs = self._range_inputs
+        if range_inputs is not None and not range_inputs.covers(person_id, company_id):
+            range_inputs = None
+        markers: Dict[str, Any] = {}
+        for twin_name in sorted(versioned_twins):
+            # 版本 Twin 的标记与期数无关，compute_range 期间只取一次
+            if range_inputs is not None and twin_name in range_inputs.markers:
+                _count_cache_hit()
+                markers[twin_name] = range_inputs.markers[twin_name]
+                continue
+            markers[twin_name] = self.state_dao.get_state_markers(
+                twin_name, self._build_twin_filters(twin_name, person_id, company_id)
+            )
+            if range_inputs is not None:
+                range_inputs.markers[twin_name] = markers[twin_name]
+        for twin_name in sorted(period_keys):
+            markers[twin_name] = self.state_dao.get_state_markers(
+                twin_name,
+                self._build_twin_filters(twin_name, person_id, company_id),
+                time_keys=sorted(period_keys[twin_name]),
+            )
+        return markers, needs_prev_payslips
+
     # ── 在岗月数（cross_period resolver）─────────────────────────────────────
 
     def _months_employed_in_year(
@@ -550,20 +1017,29 @@ class PayrollEngine:
         ref_date = date(dt_y, dt_m, min(PAYROLL_REFERENCE_DAY, last_day))
         year = ref_date.year
 
-        twins = self.twin_service.list_twins(
-            "person_company_employment",
-            filters={"person_id": str(person_id), "company_id": str(company_id)},
-        )
-        if not twins:
-            return 0
+        if self.interval_dao.is_indexed("person_company_employment", "change_type"):
+            # 区间索引中每个版本都有一行（含被覆盖的版本），valid_from 即归一后的 effective_date
+            timeline = self._timeline("person_company_employment", person_id, company_id)
+            if not len(timeline):
+                return 0
+            all_states = [
+                dict(v, effective_date=v.get("valid_from")) for v in timeline.versions()
+            ]
+        else:
+            twins = self.twin_service.list_twins(
+                "person_company_employment",
+                filters={"person_id": str(person_id), "company_id": str(company_id)},
+            )
+            if not twins:
+                return 0
 
-        detail = self.twin_service.get_twin("person_company_employment", int(twins[0]["id"]))
-        if not detail:
-            return 0
+            detail = self.twin_service.get_twin("person_company_employment", int(twins[0]["id"]))
+            if not detail:
+                return 0
 
-        current = detail.get("current") or {}
-        history = detail.get("history") or []
-        all_states = [current] + [h.get("data") or {} for h in history]
+            current = detail.get("current") or {}
+            history = detail.get("history") or []
+            all_states = [current] + [h.get("data") or {} for h in history]
 
         def _ym(s: Any) -> Tuple[int, int]:
             if not s:
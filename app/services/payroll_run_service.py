@@ -0,0 +1,228 @@
+"""
+Payroll Run Service - 异步工资单生成任务
+
+生成请求先落为 payroll_run 任务记录，由 worker 认领执行：
+逐人生成工资单并提交检查点（done / errors），执行期间定时刷新心跳，
+worker 崩溃或进程重启后，心跳超时的任务会被重新认领并从检查点继续。
+
+worker 默认以独立进程运行（flask --app main payroll-worker），也可按配置 PAYROLL_RUN_WORKER 随 Web 进程启动。
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.daos.base_dao import read_snapshot
+from app.daos.payroll_run_dao import (
+    PayrollRunDAO,
+    RUN_COMPLETED,
+    RUN_FAILED,
+)
+from app.profiling import profiling
+from app.services.payroll_service import PayrollService
+
+_log = logging.getLogger(__name__)
+
+# 心跳超过该秒数未刷新的 running 任务视为崩溃，可被重新认领
+RUN_STALE_SECONDS = 120
+
+# 执行期间刷新心跳的间隔（秒），须远小于 RUN_STALE_SECONDS
+RUN_HEARTBEAT_SECONDS = 20
+
+
+class RunOwnershipLost(Exception):
+    """任务心跳超时后已被其他 worker 重新认领（或已结束），当前 worker 应停止执行"""
+
+
+class _RunHeartbeat(threading.Thread):
+    """执行任务期间按固定间隔刷新心跳（单人计算耗时较长时任务也不会被视为崩溃）"""
+
+    def __init__(self, run_dao: PayrollRunDAO, run_id: int, worker: str, interval: float = RUN_HEARTBEAT_SECONDS):
+        super().__init__(name=f"payroll-run-heartbeat-{run_id}", daemon=True)
+        self.run_dao = run_dao
+        self.run_id = run_id
+        self.worker = worker
+        self.interval = interval
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                if not self.run_dao.heartbeat(self.run_id, self.worker):
+                    self.lost = True
+                    return
+            except Exception:
+                _log.exception("刷新工资单任务 %s 心跳失败", self.run_id)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class PayrollRunService:
+    """工资单生成任务：创建、查询、执行"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.payroll_service = PayrollService(db_path=db_path)
+        self.run_dao = PayrollRunDAO(db_path=self.payroll_service.db_path)
+
+    def create_run(
+        self,
+        scope: str,
+        company_id: int,
+        period: str,
+        person_id: Optional[int] = None,
+        department: Optional[str] = None,
+        profile: bool = False,
+    ) -> Dict[str, Any]:
+        """解析生成范围并创建任务，返回任务信息（含 run_id、total）；profile=True 时记录剖析结果"""
+        targets = self.payroll_service.resolve_targets(
+            scope, company_id, person_id=person_id, department=department
+        )
+        run_id = self.run_dao.create_run(
+            scope, company_id, period, targets,
+            person_id=person_id, department=department, profile=profile,
+        )
+        notify_payroll_run_worker()
+        return self.get_run(run_id)
+
+    def get_run(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """任务进度：status、done/total、generated、errors"""
+        return self.run_dao.get_run(run_id)
+
+    def list_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.run_dao.list_runs(limit=limit)
+
+    def get_run_profile(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """任务的剖析结果（按指标 / temporal_type 汇总）；未开启剖析返回 None"""
+        return self.run_dao.get_profile(run_id)
+
+    def execute_run(self, run: Dict[str, Any]) -> None:
+        """
+        执行（或续跑）已认领的任务：从检查点 done 开始逐人生成，
+        每人处理完即提交检查点，崩溃后最多重算一个人（工资单按期覆盖写入，可重入）。
+        所有人员在同一只读快照内取数（写入与检查点走独立连接），工资单记录相同的 snapshot_marker；
+        续跑时开启新的快照。
+        创建时开启了剖析的任务，本次执行的剖析结果并入已保存的结果（续跑前的部分不丢失）。
+
+        执行期间后台线程定时刷新心跳。检查点与结束状态只在任务仍归本 worker（run["worker"]）时写入：
+        心跳丢失或检查点被拒（已被其他 worker 重新认领）即停止执行，结束状态同样不会覆盖新 worker 的任务。
+        """
+        run_id = run["id"]
+        period = run["period"]
+        targets = run.get("targets") or []
+        done = int(run.get("done") or 0)
+        generated = int(run.get("generated") or 0)
+        worker = run.get("worker") or ""
+        saved_profile = self.run_dao.get_profile(run_id)
+        heartbeat = _RunHeartbeat(self.run_dao, run_id, worker)
+        heartbeat.start()
+        try:
+            with profiling(enabled=saved_profile is not None) as profile:
+                if profile is not None:
+                    profile.merge(saved_profile)
+                try:
+                    with read_snapshot(self.payroll_service.db_path):
+                        self._execute_targets(run_id, worker, period, targets, done, generated, heartbeat)
+                    status, error = RUN_COMPLETED, None
+                except RunOwnershipLost:
+                    _log.warning("工资单任务 %s 已被其他 worker 重新认领，停止执行", run_id)
+                    return
+                except Exception as e:
+                    _log.exception("工资单任务 %s 执行失败", run_id)
+                    status, error = RUN_FAILED, str(e)
+        finally:
+            heartbeat.stop()
+        summary = profile.summary() if profile is not None else None
+        if not self.run_dao.finish_run(run_id, worker, status, error=error, profile=summary):
+            _log.warning("工资单任务 %s 已被其他 worker 重新认领，不写入结束状态", run_id)
+
+    def _execute_targets(
+        self,
+        run_id: int,
+        worker: str,
+        period: str,
+        targets: List,
+        done: int,
+        generated: int,
+        heartbeat: Optional[_RunHeartbeat] = None,
+    ) -> None:
+        """从第 done 个目标开始逐人生成并提交检查点（心跳丢失或检查点写入被拒即抛出 RunOwnershipLost）"""
+        for index in range(done, len(targets)):
+            if heartbeat is not None and heartbeat.lost:
+                raise RunOwnershipLost(run_id)
+            pid, cid = targets[index]
+            err = self.payroll_service.generate_payroll_for_one(int(pid), int(cid), period)
+            if err:
+                error = {"person_id": pid, "reason": err}
+            else:
+                error = None
+                generated += 1
+            if not self.run_dao.record_progress(run_id, worker, index + 1, generated, error=error):
+                raise RunOwnershipLost(run_id)
+
+
+class PayrollRunWorker(threading.Thread):
+    """后台 worker：轮询认领 payroll_run 任务并执行"""
+
+    def __init__(self, db_path: str, poll_interval: float = 2.0):
+        super().__init__(name="payroll-run-worker", daemon=True)
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+
+    def run(self) -> None:
+        service = PayrollRunService(db_path=self.db_path)
+        while not self._stop_event.is_set():
+            try:
+                run = service.run_dao.claim_next_run(self.worker_id, RUN_STALE_SECONDS)
+            except Exception:
+                _log.exception("认领工资单任务失败")
+                run = None
+            if run:
+                service.execute_run(run)
+                continue
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+_worker: Optional[PayrollRunWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_payroll_run_worker(db_path: str, poll_interval: float = 2.0) -> PayrollRunWorker:
+    """启动当前进程的后台 worker（幂等）"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = PayrollRunWorker(db_path, poll_interval=poll_interval)
+            _worker.start()
+        return _worker
+
+
+def run_payroll_run_worker(db_path: str, poll_interval: float = 2.0) -> None:
+    """在前台运行 worker 直到中断（独立 worker 进程的入口，见 flask payroll-worker）"""
+    worker = PayrollRunWorker(db_path, poll_interval=poll_interval)
+    _log.info("工资单任务 worker %s 已启动", worker.worker_id)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+def notify_payroll_run_worker() -> None:
+    """唤醒当前进程的 worker，使新任务无需等待轮询间隔"""
+    if _worker is not None:
+        _worker.wake()
@@ -6,9 +6,85 @@ Payroll Service - 工资计算与发放服务
 """
 from __future__ import annotations
 
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
-from app.services.payroll_engine import PayrollEngine, _deduction_tax_period
+from app.config.config_registry import get_config_snapshot
+from app.daos.base_dao import read_snapshot
+from app.daos.payroll_record_dao import PAYROLL_AMOUNT_COLUMNS, PayrollRecordDAO
+from app.profiling import current_profile, profiling
+from app.services.payroll_engine import (
+    PayrollEngine,
+    _deduction_tax_period,
+    _tax_year_of,
+    _tax_year_salary_periods,
+    ytd_accumulator_key,
+)
+
+# 并行生成的默认分片大小（每个分片一次提交给一个工作进程）
+DEFAULT_PARALLEL_CHUNK_SIZE = 20
+
+# 工资单列表分页
+DEFAULT_RECORDS_PAGE_SIZE = 50
+MAX_RECORDS_PAGE_SIZE = 500
+
+# 公式中文解读缓存：(配置版本, {指标key: 解读})，配置重新加载后版本变化即重建
+_readable_formula_cache: Tuple[Optional[str], Dict[str, str]] = (None, {})
+
+
+def _readable_formulas() -> Dict[str, str]:
+    """当前配置版本下各 formula 指标的中文解读（每个配置版本只渲染一次）"""
+    global _readable_formula_cache
+    from app.payroll_formula import formula_to_readable
+
+    snapshot = get_config_snapshot()
+    version, cached = _readable_formula_cache
+    if version == snapshot.version:
+        return cached
+    metrics = snapshot.metrics.get("metrics", {})
+    variable_labels = {k: v.get("label", k) for k, v in metrics.items()}
+    readable: Dict[str, str] = {}
+    for key, metric in metrics.items():
+        expression = (metric.get("source") or {}).get("expression", "")
+        if expression:
+            readable[key] = formula_to_readable(expression, variable_labels)
+    _readable_formula_cache = (snapshot.version, readable)
+    return readable
+
+
+def payroll_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    计算用进程池。使用 spawn 启动工作进程：池在请求处理线程中创建时，
+    进程内还有后台线程与打开的 SQLite 连接，fork 会把它们持有的锁复制进子进程而可能死锁。
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _compute_payroll_shard(
+    db_path: str, targets: List[Tuple[int, int]], period: str, profile: bool = False
+) -> Dict[str, Any]:
+    """
+    工作进程入口：在独立进程中计算一个分片的工资单（只读，不写库）。
+
+    每个进程自行创建 PayrollService，使用自己的数据库连接读取；
+    结果回传主进程，由单一写入方统一落库。
+    profile=True 时附带本分片的剖析结果，由主进程合并。
+    """
+    started = time.perf_counter()
+    service = PayrollService(db_path=db_path)
+    # 各工作进程在自己的只读快照内计算（SQLite 快照无法跨进程共享，分片间以 snapshot_marker 区分）
+    with profiling(profile) as shard_profile, read_snapshot(db_path) as marker:
+        results, errors = service._compute_payslips(targets, period, marker)
+    return {
+        "results": results,
+        "errors": errors,
+        "snapshot_marker": marker,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "profile": shard_profile.summary() if shard_profile is not None else None,
+    }
 
 
 class PayrollService:
@@ -26,6 +102,8 @@ class PayrollService:
         self.engine = PayrollEngine(db_path=db_path)
         self.twin_service = self.engine.twin_service
         self.state_dao = self.engine.state_dao
+        self.db_path = str(self.state_dao.db_path)
+        self.record_dao = PayrollRecordDAO(db_path=self.db_path)
 
     # ── 配置与步骤展示 ────────────────────────────────────────────────────────
 
@@ -38,12 +116,10 @@ class PayrollService:
         返回三块步骤定义（不含计算值），供前端展示计算逻辑。
         { "gross": {"label": ..., "steps": [...]}, "social": {...}, "tax": {...} }
         """
-        from app.payroll_formula import formula_to_readable
-
         config = self.engine.load_metrics()
         metrics = config.get("metrics", {})
         sections_def = config.get("sections", {})
-        variable_labels = {k: v.get("label", k) for k, v in metrics.items()}
+        readable_formulas = _readable_formulas()
 
         result: Dict[str, Any] = {}
         for section_id, section_def in sections_def.items():
@@ -54,7 +130,7 @@ class PayrollService:
                 expression = source.get("expression", "")
                 desc = metric.get("desc", "")
                 if expression:
-                    readable = formula_to_readable(expression, variable_labels)
+                    readable = readable_formulas.get(key, "")
                     if readable:
                         desc = (desc + "\n" if desc else "") + readable
                 steps.append({
@@ -85,11 +161,11 @@ class PayrollService:
         self, resolved: Dict[str, float], config: Dict[str, Any]
     ) -> Dict[str, Any]:
         """将引擎计算结果按 sections 组织为展示结构"""
-        from app.payroll_formula import formula_to_readable, formula_with_values
+        from app.payroll_formula import formula_with_values
 
         metrics = config.get("metrics", {})
         sections_def = config.get("sections", {})
-        variable_labels = {k: v.get("label", k) for k, v in metrics.items()}
+        readable_formulas = _readable_formulas()
 
         result: Dict[str, Any] = {}
         for section_id, section_def in sections_def.items():
@@ -103,7 +179,7 @@ class PayrollService:
 
                 desc = metric.get("desc", "")
                 if expression:
-                    readable = formula_to_readable(expression, variable_labels)
+                    readable = readable_formulas.get(key, "")
                     with_vals = formula_with_values(expression, resolved)
                     if readable:
                         desc = (desc + "\n" if desc else "") + readable
@@ -128,23 +204,131 @@ class PayrollService:
                 "values": values,
             }
 
+        result["total_amount"] = self._total_amount(resolved)
+        return result
+
+    @staticmethod
+    def _total_amount(resolved: Dict[str, float]) -> float:
+        """实发 = 应发 − 社保公积金个人合计 − 本月个税（不低于 0）"""
         base = resolved.get("base_amount", 0.0)
         social = resolved.get("social_deduction_total", 0.0)
         tax = resolved.get("tax_monthly", 0.0)
-        result["total_amount"] = round(max(0.0, base - social - tax), 2)
+        return round(max(0.0, base - social - tax), 2)
+
+    def preview_payroll_matrix(
+        self,
+        scope: str,
+        company_id: int,
+        period: str,
+        person_id: Optional[int] = None,
+        department: Optional[str] = None,
+        metric_keys: Optional[List[str]] = None,
+        explain_person_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        按范围批量预览（不写库），返回紧凑矩阵：
+        { columns: [{key, label, unit, section}], rows: [{person_id, name, department, values}], errors }
+
+        - columns 默认为各 sections 的 display_order 指标（去重保序）加 total_amount，
+          可用 metric_keys 指定；rows 的 values 与 columns 一一对应
+        - 公式说明不随矩阵返回；explain_person_id 指定的那一行附带完整步骤展示（explanation）
+        """
+        config = self.engine.load_metrics()
+        metrics = config.get("metrics", {})
+        columns: List[Dict[str, Any]] = []
+        seen: set = set()
+        if metric_keys:
+            keys_with_section = [(k, None) for k in metric_keys]
+        else:
+            keys_with_section = [
+                (key, section_id)
+                for section_id, section_def in config.get("sections", {}).items()
+                for key in section_def.get("display_order", [])
+            ] + [("total_amount", None)]
+        for key, section_id in keys_with_section:
+            if key in seen or (key not in metrics and key != "total_amount"):
+                continue
+            seen.add(key)
+            metric = metrics.get(key, {})
+            columns.append({
+                "key": key,
+                "label": metric.get("label", "实发金额" if key == "total_amount" else key),
+                "unit": metric.get("unit", "元" if key == "total_amount" else None),
+                "section": section_id,
+            })
+
+        targets = self.resolve_targets(scope, company_id, person_id=person_id, department=department)
+        results, errors = self.engine.compute_batch(targets, period)
+
+        names = {
+            int(p["id"]): p.get("name")
+            for p in self.twin_service.list_twins("person")
+        }
+        departments = {
+            int(e["person_id"]): e.get("department")
+            for e in self.twin_service.list_twins(
+                "person_company_employment", filters={"company_id": str(int(company_id))}
+            )
+            if e.get("person_id") is not None
+        }
+
+        rows: List[Dict[str, Any]] = []
+        explanation = None
+        for pid, cid in targets:
+            resolved = results.get((pid, cid))
+            if resolved is None:
+                continue
+            values = [
+                self._total_amount(resolved) if col["key"] == "total_amount" else resolved.get(col["key"], 0.0)
+                for col in columns
+            ]
+            rows.append({
+                "person_id": pid,
+                "company_id": cid,
+                "name": names.get(pid),
+                "department": departments.get(pid),
+                "values": values,
+            })
+            if explain_person_id is not None and pid == int(explain_person_id):
+                explanation = self._structure_result(resolved, config)
+
+        result: Dict[str, Any] = {
+            "period": period,
+            "config_version": get_config_snapshot().version,
+            "columns": columns,
+            "rows": rows,
+            "errors": errors,
+        }
+        if explain_person_id is not None:
+            result["explanation"] = explanation
         return result
 
     # ── 工资单生成 ────────────────────────────────────────────────────────────
 
     def _build_payroll_state_data(
-        self, person_id: int, company_id: int, period: str
+        self,
+        person_id: int,
+        company_id: int,
+        period: str,
+        prev_payslip: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """
         构建写入 person_company_payroll 状态表的完整 data 字典。
         所有 persist: true 的指标都会写入，保证历史可追溯。
+        prev_payslip 见 PayrollEngine.compute。
         """
+        # 指纹先于计算取得：计算期间若输入被修改，下次增量生成会因指纹不符而重算；
+        # 指纹相同的预览结果直接复用。带入 prev_payslip 时不计算指纹（见 _stamp_fingerprints）
+        resolved, fingerprint = self.engine.compute_with_fingerprint(
+            person_id, company_id, period, prev_payslip=prev_payslip
+        )
+        return self._payslip_data(period, resolved, fingerprint)
+
+    def _payslip_data(
+        self, period: str, resolved: Dict[str, float], fingerprint: Optional[str]
+    ) -> Dict[str, Any]:
+        """由引擎计算结果组装工资单 data（供 _build_payroll_state_data 与 compute_range 共用）"""
         deduction_tax = _deduction_tax_period(period)
-        resolved = self.engine.compute(person_id, company_id, period)
         config = self.engine.load_metrics()
         metrics = config.get("metrics", {})
 
@@ -154,6 +338,7 @@ class PayrollService:
             "status": "待发放",
             "payment_date": None,
             "remarks": None,
+            "input_fingerprint": fingerprint,
         }
 
         # 写入所有 persist: true 的指标
@@ -170,38 +355,183 @@ class PayrollService:
         data["total_amount"] = round(
             max(0.0, data["base_amount"] - data["social_deduction_total"] - data["tax_monthly"]), 2
         )
+
+        # ytd_sum 的当年累计（含本期），下期只需读本张工资单即可得到 ytd
+        for ytd_key, from_metric in self.engine.ytd_sum_sources().items():
+            current = data.get(from_metric, resolved.get(from_metric, 0))
+            data[ytd_accumulator_key(from_metric)] = round(
+                float(resolved.get(ytd_key, 0) or 0) + float(current or 0), 2
+            )
         return data
 
-    def _get_or_create_payroll_activity(self, person_id: int, company_id: int) -> int:
-        """获取或创建 person_company_payroll 的 activity，返回 activity_id"""
+    def _find_payroll_activity(self, person_id: int, company_id: int) -> Optional[int]:
+        """查找 person_company_payroll 的 activity_id（不存在返回 None，不创建）"""
         twins = self.twin_service.list_twins(
             "person_company_payroll",
             filters={"person_id": str(person_id), "company_id": str(company_id)},
         )
-        if twins:
-            return int(twins[0]["id"])
-        return self.twin_service.twin_dao.create_activity_twin(
-            "person_company_payroll",
-            {"person_id": person_id, "company_id": company_id},
-        )
+        return int(twins[0]["id"]) if twins else None
+
+    @staticmethod
+    def _payroll_activity_key(person_id: int, company_id: int) -> Dict[str, int]:
+        """写入工资单时的 activity 标识：由 append_many 在写入事务内查找或创建注册表行"""
+        return {"person_id": int(person_id), "company_id": int(company_id)}
+
+    def _stamp_fingerprints(
+        self, person_id: int, company_id: int, source_markers: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, str]:
+        """
+        级联 / 整段重算写入后补写各期工资单的输入指纹：{period: 计算时的来源标记} -> {period: 指纹}。
+
+        各期指纹涵盖此前工资单的状态行 id，须在同批的上期工资单写入之后才能取得；
+        来源标记取自计算所在的快照，计算期间输入若被修改，下次增量生成仍会重算。
+        """
+        if not source_markers:
+            return {}
+        with read_snapshot(self.db_path):
+            activity_id = self._find_payroll_activity(person_id, company_id)
+            fingerprints = {
+                period: self.engine.input_fingerprint(person_id, company_id, period, source_markers=markers)
+                for period, markers in source_markers.items()
+            }
+        if activity_id is not None:
+            self.state_dao.set_time_series_field(
+                "person_company_payroll", activity_id, "input_fingerprint", fingerprints
+            )
+        return fingerprints
 
     def generate_payroll_for_one(
         self, person_id: int, company_id: int, period: str
     ) -> Optional[str]:
         """为单人生成工资单并写入 person_company_payroll。成功返回 None，失败返回错误信息。"""
         try:
-            data = self._build_payroll_state_data(person_id, company_id, period)
-            activity_id = self._get_or_create_payroll_activity(person_id, company_id)
-            self.state_dao.append(
+            with read_snapshot(self.db_path) as marker:
+                data = self._build_payroll_state_data(person_id, company_id, period)
+            data["snapshot_marker"] = marker
+            self.state_dao.append_many(
                 "person_company_payroll",
-                activity_id,
-                data,
-                time_key=period,
+                [(self._payroll_activity_key(person_id, company_id), data, period)],
             )
             return None
         except Exception as e:
             return str(e)
 
+    def cascade_recompute(
+        self, person_id: int, company_id: int, period: str
+    ) -> Dict[str, Any]:
+        """
+        级联重算：重新计算 period 的工资单，并按顺序重算同一个税年度内
+        其后已存在的工资单（累计个税、上期值、年度累计逐月传递）。
+
+        每个月的计算结果直接作为下个月的 prev_value / ytd 输入（内存传递，不回读数据库），
+        全部结果在一个事务内写入。只重算已存在的后续工资单，不新建。
+        某期失败时写入其之前已算完的各期，该期及其后各期记入 errors。
+        返回 { "recomputed": [period, ...], "errors": [...] }
+        """
+        with read_snapshot(self.db_path) as marker:
+            items, source_markers, errors = self._compute_cascade(person_id, company_id, period, marker)
+        if items:
+            self._write_cascades(items, {(person_id, company_id): source_markers})
+        return {"recomputed": [p for _, _, p in items], "errors": errors}
+
+    def _compute_cascade(
+        self, person_id: int, company_id: int, period: str, snapshot_marker: str
+    ) -> Tuple[List[Tuple[Dict[str, int], Dict[str, Any], str]], Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        在调用方的只读快照内计算一人的级联重算（只读），
+        返回 (append_many 的写入项, {period: 来源标记}, errors)。
+        某期失败时停止：写入项只含此前已算完的各期，其后各期以「依赖的薪资期计算失败」记入 errors
+        """
+        _, year_last_period = _tax_year_salary_periods(
+            _tax_year_of(_deduction_tax_period(period)) or int(period[:4])
+        )
+        activity_key = self._payroll_activity_key(person_id, company_id)
+        activity_id = self._find_payroll_activity(person_id, company_id)
+        downstream = [
+            state.time_key
+            for state in self.state_dao.list_states_in_range(
+                "person_company_payroll", activity_id, period, year_last_period
+            )
+            if state.time_key and state.time_key > period
+        ] if activity_id is not None else []
+
+        items: List[Tuple[Dict[str, int], Dict[str, Any], str]] = []
+        source_markers: Dict[str, Dict[str, Any]] = {}
+        prev_payslip: Optional[Dict[str, Any]] = None  # 首月从数据库读取上期
+        chain = [period] + downstream
+        for index, p in enumerate(chain):
+            try:
+                data = self._build_payroll_state_data(person_id, company_id, p, prev_payslip=prev_payslip)
+            except Exception as e:
+                errors = [{"person_id": person_id, "company_id": company_id, "period": p, "reason": str(e)}]
+                errors.extend(
+                    {
+                        "person_id": person_id,
+                        "company_id": company_id,
+                        "period": later,
+                        "reason": f"依赖的薪资期 {p} 计算失败",
+                    }
+                    for later in chain[index + 1:]
+                )
+                return items, source_markers, errors
+            data["snapshot_marker"] = snapshot_marker
+            items.append((activity_key, data, p))
+            source_markers[p] = self.engine.input_source_markers(person_id, company_id, p)
+            prev_payslip = data
+        return items, source_markers, []
+
+    def _write_cascades(
+        self,
+        items: List[Tuple[Dict[str, int], Dict[str, Any], str]],
+        source_markers: Dict[Tuple[int, int], Dict[str, Dict[str, Any]]],
+    ) -> int:
+        """在一个事务内写入若干人的级联重算结果，再逐人补写输入指纹；返回写入条数"""
+        written = self.state_dao.append_many("person_company_payroll", items)
+        for (pid, cid), markers in source_markers.items():
+            self._stamp_fingerprints(pid, cid, markers)
+        return written
+
+    def compute_payroll_range(
+        self,
+        person_id: int,
+        company_id: int,
+        start_period: str,
+        end_period: str,
+        persist: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        一次计算一名人员 [start_period, end_period] 内各期的工资单（年终重算、历史数据导入）。
+
+        输入整段只读一次，各月在内存中传递上期工资单（PayrollEngine.compute_range）；
+        persist=True 时全部工资单在一个事务内写入（按期覆盖），否则只返回计算结果。
+        某期失败时其后各期不再计算，已算出的各期仍会返回（persist 时一并写入）。
+        返回 { "periods": [...], "payslips": {period: data}, "errors": [...], "persisted": int }
+        """
+        source_markers: Dict[str, Dict[str, Any]] = {}
+        with read_snapshot(self.db_path) as marker:
+            results, errors = self.engine.compute_range(
+                person_id, company_id, start_period, end_period, to_payslip=self._payslip_data
+            )
+            if persist:
+                # 指纹只在落库时需要：来源标记取自同一快照，写入后再补算（见 _stamp_fingerprints）
+                with self.engine.preloaded_range(person_id, company_id, start_period, end_period):
+                    for period, _, _ in results:
+                        source_markers[period] = self.engine.input_source_markers(person_id, company_id, period)
+        payslips: Dict[str, Dict[str, Any]] = {}
+        for period, _, data in results:
+            data["snapshot_marker"] = marker
+            payslips[period] = data
+        persisted = 0
+        if persist and payslips:
+            self.state_dao.append_many(
+                "person_company_payroll",
+                [(self._payroll_activity_key(person_id, company_id), data, period) for period, data in payslips.items()],
+            )
+            persisted = len(payslips)
+            for period, fingerprint in self._stamp_fingerprints(person_id, company_id, source_markers).items():
+                payslips[period]["input_fingerprint"] = fingerprint
+        return {"periods": list(payslips), "payslips": payslips, "errors": errors, "persisted": persisted}
+
     def resolve_targets(
         self,
         scope: str,
@@ -246,18 +576,182 @@ class PayrollService:
         period: str,
         person_id: Optional[int] = None,
         department: Optional[str] = None,
+        parallel: bool = False,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        cascade: bool = False,
+        incremental: bool = False,
     ) -> Dict[str, Any]:
-        """按范围批量生成工资单。返回 { "generated": int, "errors": [...] }"""
-        targets = self.resolve_targets(scope, company_id, person_id=person_id, department=department)
-        generated = 0
+        """
+        按范围批量生成工资单。返回 { "generated": int, "errors": [...] }
+
+        incremental=True 时先比较已有工资单记录的输入指纹，输入未变化的人员跳过，
+        返回值额外包含 "recomputed" / "skipped"。
+
+        parallel=True 时按 chunk_size 分片，交给 workers 个进程并行计算，
+        结果由当前进程在一个事务内批量写入；返回值额外包含各分片耗时 "shards"。
+        cascade=True 时每人同时级联重算本个税年度内其后已存在的工资单（串行，与 parallel 无关），
+        全部人员在同一快照内算完后一个事务写入；返回值额外包含级联重算的工资单数 "cascaded"。
+        cascade 与 incremental 不能同时使用（ValueError）：级联重算的后续各期依赖本期结果，不按指纹跳过。
+        """
+        if cascade and incremental:
+            raise ValueError("cascade 与 incremental 不能同时使用")
+
+        # 目标解析、增量比对与计算都在同一只读快照内完成，全部算完后再统一写入
+        with read_snapshot(self.db_path) as marker:
+            targets = self.resolve_targets(scope, company_id, person_id=person_id, department=department)
+            skipped = None
+            if incremental:
+                targets, skipped = self._filter_changed_targets(targets, period)
+            serial = not cascade and not (parallel and len(targets) > 1)
+            if serial:
+                computed, errors = self._compute_payslips(targets, period, marker)
+            elif cascade:
+                items, source_markers, errors = [], {}, []
+                for pid, cid in targets:
+                    person_items, person_markers, person_errors = self._compute_cascade(pid, cid, period, marker)
+                    items.extend(person_items)
+                    errors.extend(person_errors)
+                    if person_items:
+                        source_markers[(pid, cid)] = person_markers
+
+        if cascade:
+            try:
+                self._write_cascades(items, source_markers)
+            except Exception as e:
+                errors.extend({"person_id": pid, "company_id": cid, "reason": str(e)} for pid, cid in source_markers)
+                items, source_markers = [], {}
+            return {
+                "generated": len(source_markers),
+                "cascaded": len(items) - len(source_markers),
+                "errors": errors,
+                "snapshot_marker": marker,
+            }
+
+        if not serial:
+            result = self._generate_payroll_parallel(targets, period, workers, chunk_size)
+        else:
+            generated = self._write_payslips(computed, period, errors)
+            result = {"generated": generated, "errors": errors, "snapshot_marker": marker}
+        if skipped is not None:
+            result.update({"recomputed": result["generated"], "skipped": skipped})
+        return result
+
+    def _compute_payslips(
+        self, targets: List[Tuple[int, int]], period: str, snapshot_marker: Optional[str] = None
+    ) -> Tuple[List[Tuple[int, int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """逐人计算工资单数据（只读），返回 ([(person_id, company_id, data)], errors)"""
+        computed: List[Tuple[int, int, Dict[str, Any]]] = []
         errors: List[Dict[str, Any]] = []
         for pid, cid in targets:
-            err = self.generate_payroll_for_one(pid, cid, period)
-            if err:
-                errors.append({"person_id": pid, "reason": err})
+            try:
+                data = self._build_payroll_state_data(pid, cid, period)
+            except Exception as e:
+                errors.append({"person_id": pid, "reason": str(e)})
+                continue
+            if snapshot_marker:
+                data["snapshot_marker"] = snapshot_marker
+            computed.append((pid, cid, data))
+        return computed, errors
+
+    def _write_payslips(
+        self,
+        computed: List[Tuple[int, int, Dict[str, Any]]],
+        period: str,
+        errors: List[Dict[str, Any]],
+    ) -> int:
+        """
+        将已计算的工资单（连同尚不存在的 activity 注册表行）在一个事务内写入，
+        失败时整批回滚、全部人员追加到 errors，返回写入条数
+        """
+        items = [(self._payroll_activity_key(pid, cid), data, period) for pid, cid, data in computed]
+        item_person_ids = [pid for pid, _, _ in computed]
+        try:
+            return self.state_dao.append_many("person_company_payroll", items)
+        except Exception as e:
+            errors.extend({"person_id": pid, "reason": str(e)} for pid in item_person_ids)
+            return 0
+
+    def _filter_changed_targets(
+        self, targets: List[Tuple[int, int]], period: str
+    ) -> Tuple[List[Tuple[int, int]], int]:
+        """增量生成：剔除已有工资单且输入指纹未变化的目标，返回 (待重算目标, 跳过人数)"""
+        payroll_ids: Dict[Tuple[int, int], int] = {}
+        company_ids = {cid for _, cid in targets}
+        for cid in company_ids:
+            for act in self.twin_service.list_twins(
+                "person_company_payroll", filters={"company_id": str(cid)}
+            ):
+                if act.get("person_id") is not None:
+                    payroll_ids.setdefault((int(act["person_id"]), cid), int(act["id"]))
+
+        changed: List[Tuple[int, int]] = []
+        skipped = 0
+        for pid, cid in targets:
+            activity_id = payroll_ids.get((pid, cid))
+            state = (
+                self.state_dao.get_state_by_time_key("person_company_payroll", activity_id, period)
+                if activity_id is not None else None
+            )
+            stored = (state.data or {}).get("input_fingerprint") if state else None
+            if stored and stored == self.engine.input_fingerprint(pid, cid, period):
+                skipped += 1
             else:
-                generated += 1
-        return {"generated": generated, "errors": errors}
+                changed.append((pid, cid))
+        return changed, skipped
+
+    def _generate_payroll_parallel(
+        self,
+        targets: List[Tuple[int, int]],
+        period: str,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """进程池并行计算 + 单一写入方批量落库"""
+        chunk_size = max(1, int(chunk_size or DEFAULT_PARALLEL_CHUNK_SIZE))
+        shards = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+        workers = max(1, min(int(workers or os.cpu_count() or 1), len(shards)))
+
+        computed: List[Tuple[int, int, Dict[str, Any]]] = []
+        errors: List[Dict[str, Any]] = []
+        shard_stats: List[Dict[str, Any]] = []
+        # 剖析开启时各工作进程各自剖析，结果并入当前剖析
+        profile = current_profile()
+        with payroll_process_pool(workers) as pool:
+            futures = [
+                pool.submit(_compute_payroll_shard, self.db_path, shard, period, profile is not None)
+                for shard in shards
+            ]
+            for index, (shard, future) in enumerate(zip(shards, futures)):
+                try:
+                    out = future.result()
+                except Exception as e:
+                    errors.extend({"person_id": pid, "reason": str(e)} for pid, _ in shard)
+                    shard_stats.append({"shard": index, "size": len(shard), "elapsed_ms": None, "errors": len(shard)})
+                    continue
+                computed.extend(out["results"])
+                errors.extend(out["errors"])
+                if profile is not None:
+                    profile.merge(out["profile"], add_wall_time=False)
+                shard_stats.append({
+                    "shard": index,
+                    "size": len(shard),
+                    "elapsed_ms": out["elapsed_ms"],
+                    "errors": len(out["errors"]),
+                    "snapshot_marker": out["snapshot_marker"],
+                })
+
+        write_started = time.perf_counter()
+        generated = self._write_payslips(computed, period, errors)
+
+        return {
+            "generated": generated,
+            "errors": errors,
+            "workers": workers,
+            "chunk_size": chunk_size,
+            "shards": shard_stats,
+            "write_ms": round((time.perf_counter() - write_started) * 1000, 1),
+        }
 
     def get_generate_preview_count(
         self,
@@ -269,45 +763,92 @@ class PayrollService:
         """预览将生成工资单的人数（不实际写入）"""
         return len(self.resolve_targets(scope, company_id, person_id=person_id, department=department))
 
+    # ── 年度累计修复 ────────────────────────────────────────────────────────
+
+    def rebuild_ytd_accumulators(
+        self, company_id: int, year: int, person_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        按个税年度重建工资单上的 ytd_total_* 累计字段（历史工资单被修改或补录后使用）。
+        在一个只读快照内核对，只原地改写累计字段（set_time_series_fields）：不新增状态行、
+        不改变工资单的状态行 id（后续各期的输入指纹仍然有效），也不触发事实表 / 汇总维护。
+        返回 { "checked": int, "updated": int }
+        """
+        filters = {"company_id": str(company_id)}
+        if person_id is not None:
+            filters["person_id"] = str(person_id)
+        from_metrics = sorted(set(self.engine.ytd_sum_sources().values()))
+        start, end = _tax_year_salary_periods(int(year))
+
+        checked = 0
+        changes: Dict[int, Dict[str, Dict[str, float]]] = {}
+        with read_snapshot(self.db_path):
+            activities = self.twin_service.list_twins("person_company_payroll", filters=filters)
+            for act in activities:
+                states = self.state_dao.list_states_in_range(
+                    "person_company_payroll", int(act["id"]), start, end
+                )
+                running = {m: 0.0 for m in from_metrics}
+                for state in states:
+                    checked += 1
+                    data = state.data or {}
+                    fields = {}
+                    for m in from_metrics:
+                        running[m] = round(running[m] + float(data.get(m, 0) or 0), 2)
+                        key = ytd_accumulator_key(m)
+                        if data.get(key) != running[m]:
+                            fields[key] = running[m]
+                    if fields:
+                        changes.setdefault(int(act["id"]), {})[state.time_key] = fields
+
+        updated = 0
+        for activity_id, values in changes.items():
+            updated += self.state_dao.set_time_series_fields("person_company_payroll", activity_id, values)
+        return {"checked": checked, "updated": updated}
+
     # ── 工资单查询 ────────────────────────────────────────────────────────────
 
     def list_payroll_records(
         self, period: str, company_id: int
     ) -> List[Dict[str, Any]]:
-        """列出指定周期、公司下已生成的工资单"""
-        activities = self.twin_service.list_twins(
-            "person_company_payroll",
-            filters={"company_id": str(company_id)},
-        )
-        records: List[Dict[str, Any]] = []
-        for act in activities:
-            aid = act.get("id")
-            pid = act.get("person_id")
-            cid = act.get("company_id")
-            if aid is None or pid is None:
-                continue
-
-            state = self.state_dao.get_state_by_time_key(
-                "person_company_payroll", int(aid), period
-            )
-            if not state or not state.data:
-                continue
-
-            row: Dict[str, Any] = {
-                "id": aid,
-                "person_id": pid,
-                "company_id": cid,
-                "salary_period": period,
-                **{k: v for k, v in state.data.items() if k != "salary_period"},
-            }
-            person_state = self.state_dao.get_latest("person", int(pid))
-            row["person_name"] = (
-                (person_state.data or {}).get("name") or f"人员{pid}"
-                if person_state else f"人员{pid}"
-            )
-            records.append(row)
+        """列出指定周期、公司下已生成的工资单（单条联接查询）"""
+        records, _, _ = self.record_dao.list_records(period, company_id)
         return records
 
+    def list_payroll_records_page(
+        self,
+        period: str,
+        company_id: int,
+        page: int = 1,
+        page_size: int = DEFAULT_RECORDS_PAGE_SIZE,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        分页列出工资单：
+        { items, total, page, page_size, page_totals, totals }
+        page_totals 为本页金额合计，totals 为全部结果的金额合计（均按 PAYROLL_AMOUNT_COLUMNS）。
+        """
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), MAX_RECORDS_PAGE_SIZE))
+        items, total, totals = self.record_dao.list_records(
+            period, company_id,
+            limit=page_size, offset=(page - 1) * page_size,
+            sort_by=sort_by, descending=descending,
+        )
+        page_totals = {
+            column: round(sum(float(item.get(column) or 0) for item in items), 2)
+            for column in PAYROLL_AMOUNT_COLUMNS
+        }
+        return {
+            "items": items,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "page_totals": page_totals,
+            "totals": totals,
+        }
+
     def get_payroll_record_detail(
         self, activity_id: int, period: str
     ) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,293 @@
+"""
+Payroll Simulation Service - 工资配置变更模拟（what-if）
+
+调整税率表、社保配置、岗位工资比例等 YAML 之前，先以内存中的配置文档覆盖注册表
+（config_overrides），对全部在册人员逐月计算「现行配置」与「模拟配置」两套工资单并汇总差额。
+
+- 不写任何 Twin：不创建 person_company_payroll 活动，也不读取已有工资单作为上期
+- 每人每个个税年度从年初（上年 12 月薪资期）起在内存中逐月传递上期工资单，
+  两套结果的累计个税 / 年度累计各自独立，差额只来自配置
+- 同一只读快照内计算；人数较多时可按分片交给进程池并行
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config.config_registry import config_overrides, get_config_snapshot
+from app.daos.base_dao import read_snapshot
+from app.periods import period_range
+from app.services.payroll_engine import (
+    _deduction_tax_period,
+    _tax_year_of,
+    _tax_year_salary_periods,
+)
+from app.services.payroll_service import PayrollService, payroll_process_pool
+from app.services.twin_service import TwinService
+
+# 未指定 metrics 时汇总的指标（工资单关键汇总字段）
+DEFAULT_SIMULATION_METRICS = ["base_amount", "social_deduction_total", "tax_monthly", "total_amount"]
+
+# 每次最多模拟的薪资期数
+MAX_SIMULATION_PERIODS = 24
+
+# 并行模拟的默认分片大小（人）
+DEFAULT_SIMULATION_CHUNK_SIZE = 50
+
+
+def _chain_periods(periods: List[str]) -> List[str]:
+    """计算 periods 所需的全部薪资期：从首个期数所在个税年度的年初起连续到末个期数"""
+    first = periods[0]
+    year = _tax_year_of(_deduction_tax_period(first)) or int(first[:4])
+    year_first, _ = _tax_year_salary_periods(year)
+    return period_range(year_first, periods[-1]) if year_first < first else list(periods)
+
+
+def _simulate_person(
+    service: PayrollService,
+    person_id: int,
+    company_id: int,
+    chain: List[str],
+    wanted: set,
+    metric_keys: List[str],
+) -> Tuple[Dict[str, Dict[str, float]], List[Dict[str, Any]]]:
+    """
+    在当前配置上下文中按 chain 逐月计算一人的工资单（内存传递上期，跨个税年度时重置），
+    返回 ({period: {metric: value}}（仅 wanted 内的期数）, errors)。
+    某期失败时其后各期不再计算（上期与累计值依赖该期），wanted 内的后续期数记为依赖失败期数的错误。
+    """
+    values: Dict[str, Dict[str, float]] = {}
+    errors: List[Dict[str, Any]] = []
+    prev_payslip: Dict[str, Any] = {}  # 空 dict：年初无上期，不回读数据库中的工资单
+    for index, period in enumerate(chain):
+        try:
+            data = service._build_payroll_state_data(person_id, company_id, period, prev_payslip=prev_payslip)
+        except Exception as e:
+            if period in wanted:
+                errors.append({"person_id": person_id, "company_id": company_id, "period": period, "reason": str(e)})
+            errors.extend(
+                {
+                    "person_id": person_id,
+                    "company_id": company_id,
+                    "period": later,
+                    "reason": f"依赖的薪资期 {period} 计算失败",
+                }
+                for later in chain[index + 1:]
+                if later in wanted
+            )
+            break
+        prev_payslip = data
+        if period in wanted:
+            values[period] = {key: float(data.get(key) or 0) for key in metric_keys}
+    return values, errors
+
+
+def _simulate_targets(
+    service: PayrollService,
+    targets: List[Tuple[int, int]],
+    periods: List[str],
+    overrides: Dict[str, dict],
+    metric_keys: List[str],
+) -> Tuple[List[Tuple[int, int, str, Dict[str, float], Dict[str, float]]], List[Dict[str, Any]]]:
+    """逐人计算现行与模拟两套结果，返回 ([(person_id, company_id, period, baseline, scenario)], errors)"""
+    chain = _chain_periods(periods)
+    wanted = set(periods)
+    rows: List[Tuple[int, int, str, Dict[str, float], Dict[str, float]]] = []
+    errors: List[Dict[str, Any]] = []
+    for pid, cid in targets:
+        baseline, base_errors = _simulate_person(service, pid, cid, chain, wanted, metric_keys)
+        with config_overrides(overrides):
+            scenario, scenario_errors = _simulate_person(service, pid, cid, chain, wanted, metric_keys)
+        errors.extend(base_errors)
+        errors.extend(e for e in scenario_errors if e not in base_errors)
+        for period in periods:
+            if period in baseline and period in scenario:
+                rows.append((pid, cid, period, baseline[period], scenario[period]))
+    return rows, errors
+
+
+def _simulate_shard(
+    db_path: str,
+    targets: List[Tuple[int, int]],
+    periods: List[str],
+    overrides: Dict[str, dict],
+    metric_keys: List[str],
+) -> Dict[str, Any]:
+    """工作进程入口：在独立进程、独立只读快照中模拟一个分片（不写库）"""
+    started = time.perf_counter()
+    service = PayrollService(db_path=db_path)
+    with read_snapshot(db_path) as marker:
+        rows, errors = _simulate_targets(service, targets, periods, overrides, metric_keys)
+    return {
+        "rows": rows,
+        "errors": errors,
+        "snapshot_marker": marker,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _new_bucket(metric_keys: List[str]) -> Dict[str, Dict[str, float]]:
+    return {key: {"baseline": 0.0, "scenario": 0.0, "delta": 0.0} for key in metric_keys}
+
+
+def _add_to_bucket(
+    bucket: Dict[str, Dict[str, float]], baseline: Dict[str, float], scenario: Dict[str, float]
+) -> None:
+    for key, entry in bucket.items():
+        entry["baseline"] += baseline.get(key, 0.0)
+        entry["scenario"] += scenario.get(key, 0.0)
+
+
+def _round_bucket(bucket: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    for entry in bucket.values():
+        entry["baseline"] = round(entry["baseline"], 2)
+        entry["scenario"] = round(entry["scenario"], 2)
+        entry["delta"] = round(entry["scenario"] - entry["baseline"], 2)
+    return bucket
+
+
+class PayrollSimulationService:
+    """工资配置变更模拟：现行配置 vs 覆盖后配置，按公司 / 部门 / 指标汇总差额"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.payroll_service = PayrollService(db_path=db_path)
+        self.db_path = self.payroll_service.db_path
+        self.twin_service = TwinService(db_path=self.db_path)
+
+    def _resolve_targets(
+        self, company_id: Optional[int], department: Optional[str]
+    ) -> Tuple[List[Tuple[int, int]], Dict[Tuple[int, int], str]]:
+        """模拟范围内的 (person_id, company_id) 与其部门；company_id 为空时为全部公司"""
+        filters = {"company_id": str(int(company_id))} if company_id is not None else None
+        employments = self.twin_service.list_twins("person_company_employment", filters=filters)
+        targets: List[Tuple[int, int]] = []
+        departments: Dict[Tuple[int, int], str] = {}
+        for e in employments:
+            if e.get("person_id") is None or e.get("company_id") is None:
+                continue
+            dept = (e.get("department") or "").strip()
+            if department and dept != department.strip():
+                continue
+            key = (int(e["person_id"]), int(e["company_id"]))
+            if key not in departments:
+                targets.append(key)
+            departments[key] = dept
+        return targets, departments
+
+    def simulate(
+        self,
+        overrides: Dict[str, dict],
+        from_period: str,
+        to_period: Optional[str] = None,
+        company_id: Optional[int] = None,
+        department: Optional[str] = None,
+        metric_keys: Optional[List[str]] = None,
+        parallel: bool = False,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        模拟 overrides（{配置文档名: 与 YAML 同结构的对象}）对 [from_period, to_period] 的影响。
+        返回：
+        {
+          periods, targets, config_version, scenario_version,
+          totals: {metric: {baseline, scenario, delta}},
+          by_period / by_company / by_department: {键: {metric: {...}}},
+          errors
+        }
+        by_department 的键为 "公司ID/部门"。
+        """
+        periods = period_range(from_period, to_period or from_period)
+        if not periods:
+            raise ValueError("期数格式应为 YYYY-MM，且结束期数不能早于开始期数")
+        if len(periods) > MAX_SIMULATION_PERIODS:
+            raise ValueError(f"模拟区间不能超过 {MAX_SIMULATION_PERIODS} 个月")
+        metric_keys = list(metric_keys or DEFAULT_SIMULATION_METRICS)
+        # 提前校验覆盖内容，避免逐人计算时才报错
+        with config_overrides(overrides) as scenario_config:
+            scenario_version = scenario_config.version
+        config_version = get_config_snapshot().version
+
+        started = time.perf_counter()
+        shard_stats: Optional[List[Dict[str, Any]]] = None
+        with read_snapshot(self.db_path) as marker:
+            targets, departments = self._resolve_targets(company_id, department)
+            if not (parallel and len(targets) > 1):
+                rows, errors = _simulate_targets(self.payroll_service, targets, periods, overrides, metric_keys)
+        if parallel and len(targets) > 1:
+            rows, errors, shard_stats = self._simulate_parallel(
+                targets, periods, overrides, metric_keys, workers, chunk_size
+            )
+
+        totals = _new_bucket(metric_keys)
+        by_period: Dict[str, Dict[str, Dict[str, float]]] = {}
+        by_company: Dict[str, Dict[str, Dict[str, float]]] = {}
+        by_department: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for pid, cid, period, baseline, scenario in rows:
+            dept_key = f"{cid}/{departments.get((pid, cid)) or '未分配'}"
+            for bucket in (
+                totals,
+                by_period.setdefault(period, _new_bucket(metric_keys)),
+                by_company.setdefault(str(cid), _new_bucket(metric_keys)),
+                by_department.setdefault(dept_key, _new_bucket(metric_keys)),
+            ):
+                _add_to_bucket(bucket, baseline, scenario)
+
+        result: Dict[str, Any] = {
+            "periods": periods,
+            "targets": len(targets),
+            "config_version": config_version,
+            "scenario_version": scenario_version,
+            "totals": _round_bucket(totals),
+            "by_period": {k: _round_bucket(v) for k, v in sorted(by_period.items())},
+            "by_company": {k: _round_bucket(v) for k, v in sorted(by_company.items())},
+            "by_department": {k: _round_bucket(v) for k, v in sorted(by_department.items())},
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        if shard_stats is not None:
+            result["shards"] = shard_stats
+        else:
+            result["snapshot_marker"] = marker
+        return result
+
+    def _simulate_parallel(
+        self,
+        targets: List[Tuple[int, int]],
+        periods: List[str],
+        overrides: Dict[str, dict],
+        metric_keys: List[str],
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        """进程池按人员分片并行模拟，返回 (rows, errors, shard_stats)"""
+        chunk_size = max(1, int(chunk_size or DEFAULT_SIMULATION_CHUNK_SIZE))
+        shards = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+        workers = max(1, min(int(workers or os.cpu_count() or 1), len(shards)))
+
+        rows: List[Tuple[int, int, str, Dict[str, float], Dict[str, float]]] = []
+        errors: List[Dict[str, Any]] = []
+        shard_stats: List[Dict[str, Any]] = []
+        with payroll_process_pool(workers) as pool:
+            futures = [
+                pool.submit(_simulate_shard, self.db_path, shard, periods, overrides, metric_keys)
+                for shard in shards
+            ]
+            for index, (shard, future) in enumerate(zip(shards, futures)):
+                try:
+                    out = future.result()
+                except Exception as e:
+                    errors.extend({"person_id": pid, "company_id": cid, "reason": str(e)} for pid, cid in shard)
+                    shard_stats.append({"shard": index, "size": len(shard), "elapsed_ms": None, "errors": len(shard)})
+                    continue
+                rows.extend(tuple(row) for row in out["rows"])
+                errors.extend(out["errors"])
+                shard_stats.append({
+                    "shard": index,
+                    "size": len(shard),
+                    "elapsed_ms": out["elapsed_ms"],
+                    "errors": len(out["errors"]),
+                    "snapshot_marker": out["snapshot_marker"],
+                })
+        return rows, errors, shard_stats
@@ -6,12 +6,18 @@ from __future__ import annotations
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from app.daos.base_dao import read_snapshot
 from app.daos.twins.twin_dao import TwinDAO
 from app.daos.twins.state_dao import TwinStateDAO
+from app.periods import parse_month, period_range
 from app.schema.loader import SchemaLoader
 from app.models.twins import ActivityTwin
 
 
+# 透视查询最多跨越的期数
+MAX_PIVOT_PERIODS = 120
+
+
 class TwinService:
     """通用 Twin 服务层"""
     
@@ -367,4 +373,90 @@ class TwinService:
         self.state_dao.append(twin_name, twin_id, data, time_key=time_key)
         
         # 返回更新后的 Twin 信息
-        return self.get_twin(twin_name, twin_id)
\ No newline at end of file
+        return self.get_twin(twin_name, twin_id)
+
+    def pivot_time_series(
+        self,
+        twin_name: str,
+        start_period: str,
+        end_period: str,
+        fields: Optional[List[str]] = None,
+        related_filters: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        时间序列 Twin（考勤、工资单、专项附加扣除等，time_key 为 YYYY-MM）按 Twin × 期数透视为稠密矩阵，
+        一次 time_key 区间扫描取数。
+
+        Args:
+            twin_name: time_series Twin 名称
+            start_period / end_period: 期数区间（YYYY-MM，含两端）
+            fields: 要透视的 data 字段，默认全部数值字段（decimal / integer）
+            related_filters: 注册表外键过滤（如 {"company_id": 1}）
+
+        Returns:
+            列式结构（不是逐行 dict）：
+            - periods: 期数列表（列）
+            - rows: {"twin_id": [...], 注册表外键: [...], "<实体>_name": [...]}（行，各列等长）
+            - values: {字段: [[每期的值或 None, ...], ...每行一个列表]}
+        """
+        schema = self.schema_loader.get_twin_schema(twin_name)
+        if not schema:
+            raise ValueError(f"Unknown twin: {twin_name}")
+        if schema.get("mode") != "time_series":
+            raise ValueError(f"{twin_name} is not a time_series twin")
+
+        start, end = parse_month(start_period), parse_month(end_period)
+        if end < start:
+            raise ValueError("to 不能早于 from")
+        if end - start + 1 > MAX_PIVOT_PERIODS:
+            raise ValueError(f"期数区间不能超过 {MAX_PIVOT_PERIODS} 个月")
+        periods = period_range(start_period, end_period)
+        if fields is None:
+            fields = [
+                name for name, field_def in (schema.get("fields") or {}).items()
+                if field_def.get("type") in ("decimal", "integer")
+            ]
+
+        # 矩阵与关联实体名称取自同一只读快照
+        with read_snapshot(self.state_dao.db_path):
+            rows = self.state_dao.scan_time_range(twin_name, periods[0], periods[-1], fields, related_filters)
+
+            related = [
+                (rel["entity"], rel["key"]) for rel in schema.get("related_entities") or []
+            ] if schema.get("type") == "activity" else []
+            period_index = {period: i for i, period in enumerate(periods)}
+            row_index: Dict[int, int] = {}
+            row_columns: Dict[str, List[Any]] = {"twin_id": [], **{key: [] for _, key in related}}
+            values: Dict[str, List[List[Any]]] = {field: [] for field in fields}
+            value_offset = 2 + len(related)
+            for row in rows:
+                twin_id, time_key = row[0], row[1]
+                if time_key not in period_index:
+                    continue  # 区间内但不是规范 YYYY-MM 的 time_key
+                index = row_index.get(twin_id)
+                if index is None:
+                    index = row_index[twin_id] = len(row_columns["twin_id"])
+                    row_columns["twin_id"].append(twin_id)
+                    for offset, (_, key) in enumerate(related):
+                        row_columns[key].append(row[2 + offset])
+                    for field in fields:
+                        values[field].append([None] * len(periods))
+                for offset, field in enumerate(fields):
+                    values[field][index][period_index[time_key]] = row[value_offset + offset]
+
+            # 关联实体的名称（有 name 字段的实体），按实体批量取一次
+            for entity, key in related:
+                entity_schema = self.schema_loader.get_twin_schema(entity) or {}
+                if "name" not in (entity_schema.get("fields") or {}):
+                    continue
+                entity_ids = sorted({entity_id for entity_id in row_columns[key] if entity_id is not None})
+                names = self.state_dao.get_latest_field_values(entity, entity_ids, "name")
+                row_columns[f"{entity}_name"] = [names.get(entity_id) for entity_id in row_columns[key]]
+
+        return {
+            "twin_name": twin_name,
+            "periods": periods,
+            "fields": fields,
+            "rows": row_columns,
+            "values": values,
+        }
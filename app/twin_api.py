@@ -5,7 +5,7 @@ from __future__ import annotations
 
 from flask import Blueprint, request
 
-from app.api_utils import standard_response, get_twin_service
+from app.api_utils import standard_response, get_twin_service, get_facet_service
 
 twin_api_bp = Blueprint("twin_api", __name__)
 
@@ -48,6 +48,70 @@ def list_twins(twin_name: str):
         return standard_response(False, error=str(e), status_code=500)
 
 
+@twin_api_bp.route("/twins/<twin_name>/facets", methods=["GET"])
+def twin_facets(twin_name: str):
+    """
+    枚举字段分面：按最新状态统计每个枚举取值的 Twin 数（列表页筛选项旁的计数）
+
+    GET /api/twins/<twin_name>/facets
+    GET /api/twins/<twin_name>/facets?company_id=1&change_type=入职,转正
+
+    参数：枚举字段或注册表外键的过滤条件（逗号分隔表示任一）；某字段的计数不受该字段自身的过滤约束
+    """
+    try:
+        filters = {key: value.strip() for key, value in request.args.items() if value and value.strip()}
+        service = get_facet_service()
+        return standard_response(True, service.get_facets(twin_name, filters=filters))
+    except ValueError as e:
+        return standard_response(False, error=str(e), status_code=400)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
+@twin_api_bp.route("/twins/<twin_name>/pivot", methods=["GET"])
+def pivot_twins(twin_name: str):
+    """
+    时间序列 Twin 按 Twin（行）× 期数（列）透视为稠密矩阵（如全年考勤 / 工资单一览）
+
+    GET /api/twins/<twin_name>/pivot?from=2025-01&to=2025-12&company_id=1&fields=sick_leave_days,personal_leave_days
+
+    参数：
+    - from, to: 期数区间（YYYY-MM，必填，含两端）
+    - fields: 逗号分隔的字段，默认全部数值字段
+    - 其他参数：注册表外键过滤（如 company_id、person_id）
+
+    返回列式结构：periods、fields、rows（twin_id / 外键 / 关联实体名称各一列）、
+    values（字段 -> 每行一个按 periods 对齐的值列表，无数据为 null）
+    """
+    try:
+        start_period = request.args.get("from", "").strip()
+        end_period = request.args.get("to", "").strip() or start_period
+        if not start_period:
+            return standard_response(False, error="from is required", status_code=400)
+        fields = None
+        if request.args.get("fields", "").strip():
+            fields = [f.strip() for f in request.args["fields"].split(",") if f.strip()]
+
+        related_filters = {}
+        for key, value in request.args.items():
+            if key in ("from", "to", "fields") or not value.strip():
+                continue
+            try:
+                related_filters[key] = int(value)
+            except ValueError:
+                return standard_response(False, error=f"{key} must be an integer id", status_code=400)
+
+        service = get_twin_service()
+        pivot = service.pivot_time_series(
+            twin_name, start_period, end_period, fields=fields, related_filters=related_filters
+        )
+        return standard_response(True, pivot)
+    except ValueError as e:
+        return standard_response(False, error=str(e), status_code=400)
+    except Exception as e:
+        return standard_response(False, error=str(e), status_code=500)
+
+
 @twin_api_bp.route("/twins/<twin_name>/<int:twin_id>", methods=["GET"])
 def get_twin(twin_name: str, twin_id: int):
     """
@@ -1,6 +1,7 @@
 """
 配置模块
 """
+import os
 from pathlib import Path
 
 
@@ -8,6 +9,13 @@ class Config:
     """应用配置"""
     BASE_DIR = Path(__file__).parent
     DATABASE_PATH = BASE_DIR / "data" / "twin.db"
+    # 后台工资单生成任务（payroll_run）worker：默认不随 Web 进程启动，
+    # 由单独的 `flask --app main payroll-worker` 进程执行（docker-entrypoint.sh 会启动它），
+    # 或设置 PAYROLL_RUN_WORKER=1 在 Web 进程内启动
+    PAYROLL_RUN_WORKER = os.environ.get("PAYROLL_RUN_WORKER", "0") == "1"
+    PAYROLL_RUN_POLL_INTERVAL = 2.0
+    # 经营分析查询后端：sqlite（默认）或 duckdb（需 pip install duckdb 并预装其 sqlite 扩展，缺失时回退 sqlite）
+    ANALYTICS_BACKEND = os.environ.get("ANALYTICS_BACKEND", "sqlite")
 
 
 class DevelopmentConfig(Config):
@@ -18,4 +18,11 @@ else
     echo "[entrypoint] 数据库已存在，跳过初始化"
 fi
 
+# 后台工资单任务 worker（异步生成的 payroll_run 任务由它执行）；
+# 设置 PAYROLL_RUN_WORKER=1 时改为在各 Web 进程内启动，这里不再单独启动
+if [ "${PAYROLL_RUN_WORKER:-0}" != "1" ]; then
+    echo "[entrypoint] 启动工资单任务 worker"
+    flask --app main payroll-worker &
+fi
+
 exec gunicorn -w 2 -b 0.0.0.0:5000 main:app
@@ -0,0 +1,31 @@
+import contextlib
+import io
+
+import pytest
+
+from app.root_config import Config
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    """每个测试模块一份已生成测试数据的数据库"""
+    path = str(tmp_path_factory.mktemp("twin") / "twin.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app.db import init_db
+        from app.seed import generate_project_data, generate_test_data
+
+        init_db(path)
+        generate_test_data(path)
+        generate_project_data(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def client(db_path):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(Config, "DATABASE_PATH", db_path)
+        mp.setattr(Config, "PAYROLL_RUN_WORKER", False)
+        from app import create_app
+
+        app = create_app()
+    return app.test_client()
@@ -0,0 +1,31 @@
+"""
+经营分析结果缓存：缓存键只含各接口的白名单参数（规范化后），命中缓存的看板不返回计时
+"""
+
+
+def _entries(client):
+    return client.get("/api/analytics/cache-stats").get_json()["data"]["entries"]
+
+
+def test_cache_key_ignores_unknown_and_unnormalized_params(client):
+    first = client.get("/api/analytics/collection-trend?months=7")
+    assert first.headers["X-Cache"] == "MISS"
+    entries = _entries(client)
+
+    for query in ("months=07", "months=%207&junk=1", "months=7&granularity=&utm=x&backend=sqlite"):
+        response = client.get(f"/api/analytics/collection-trend?{query}")
+        assert response.headers["X-Cache"] == "HIT", query
+        assert response.data == first.data
+    assert _entries(client) == entries
+
+
+def test_dashboard_hit_omits_timings(client):
+    miss = client.get("/api/analytics/dashboard?sections=overview,clients")
+    assert miss.headers["X-Cache"] == "MISS"
+    assert "timings_ms" in miss.get_json()
+
+    hit = client.get("/api/analytics/dashboard?sections=clients,overview,clients&junk=1")
+    assert hit.headers["X-Cache"] == "HIT"
+    body = hit.get_json()
+    assert "timings_ms" not in body
+    assert body["data"] == miss.get_json()["data"]
@@ -0,0 +1,45 @@
+"""
+经营分析 duckdb 后端：与 sqlite 后端结果一致、结果不进缓存、扩展缺失时回退 sqlite
+
+需安装 duckdb 并预装其 sqlite 扩展（见 app/analytics_backend.py），否则跳过。
+"""
+import json
+
+import pytest
+
+from app import analytics_api
+from app.analytics_backend import duckdb_available, duckdb_unavailable_reason
+
+
+requires_duckdb = pytest.mark.skipif(not duckdb_available(), reason=str(duckdb_unavailable_reason()))
+
+
+@requires_duckdb
+def test_backend_check_sections_identical(client):
+    response = client.get("/api/analytics/backend-check")
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert body["data"]["identical"], body["data"]["sections"]
+
+
+@requires_duckdb
+def test_duckdb_results_match_sqlite_and_are_not_cached(client):
+    for endpoint in ("overview", "clients", "projects", "project-profitability", "collection-trend?months=24"):
+        separator = "&" if "?" in endpoint else "?"
+        duck = client.get(f"/api/analytics/{endpoint}{separator}backend=duckdb")
+        assert duck.headers["X-Analytics-Backend"] == "duckdb"
+        assert duck.headers["X-Cache"] == "MISS"
+        again = client.get(f"/api/analytics/{endpoint}{separator}backend=duckdb")
+        assert again.headers["X-Cache"] == "MISS"
+
+        sqlite = client.get(f"/api/analytics/{endpoint}{separator}backend=sqlite")
+        assert sqlite.headers["X-Analytics-Backend"] == "sqlite"
+        assert json.loads(duck.data) == json.loads(sqlite.data)
+
+
+def test_duckdb_request_falls_back_to_sqlite_when_unavailable(client, monkeypatch):
+    monkeypatch.setattr(analytics_api, "duckdb_available", lambda: False)
+    response = client.get("/api/analytics/collection-trend?months=7&backend=duckdb")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.headers["X-Analytics-Backend"] == "sqlite"
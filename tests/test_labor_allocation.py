@@ -0,0 +1,107 @@
+"""
+fact_labor_allocation：聘用、工资单、参与变化时增量维护的分摊行与全量重算一致；
+当月有工资单时取工资单，否则取生效的聘用薪资
+"""
+import sqlite3
+
+import pytest
+
+from app.daos.twins.labor_dao import LABOR_ALLOCATION_TABLE, LaborAllocationDAO
+from app.daos.twins.state_dao import TwinStateDAO
+from app.daos.twins.twin_dao import TwinDAO
+
+
+@pytest.fixture(scope="module")
+def daos(db_path):
+    return TwinDAO(db_path=db_path), TwinStateDAO(db_path=db_path)
+
+
+def _allocation_rows(db_path, person_id):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            f"""
+            SELECT participation_id, month, payment_item_id, days, month_days, monthly_cost, cost, source
+            FROM {LABOR_ALLOCATION_TABLE} WHERE person_id = ?
+            ORDER BY participation_id, month
+            """,
+            (person_id,),
+        ).fetchall()
+
+
+def _assert_matches_rebuild(db_path, person_id):
+    incremental = _allocation_rows(db_path, person_id)
+    LaborAllocationDAO(db_path=db_path).rebuild()
+    assert incremental == _allocation_rows(db_path, person_id)
+    return incremental
+
+
+def _by_month(rows, participation_id):
+    return {row[1]: (row[5], row[7]) for row in rows if row[0] == participation_id}
+
+
+def _employment(person_id, company_id, salary, effective_date, change_type="入职"):
+    return {
+        "person_id": person_id, "company_id": company_id,
+        "salary_type": "月薪", "salary": salary,
+        "change_type": change_type, "change_date": effective_date, "effective_date": effective_date,
+    }
+
+
+def _participate(twin_dao, state_dao, person_id, item_id, start, end):
+    participation_id = twin_dao.create_activity_twin(
+        "person_payment_participation", {"person_id": person_id, "payment_item_id": item_id}
+    )
+    state_dao.append("person_payment_participation", participation_id, {
+        "person_id": person_id, "payment_item_id": item_id,
+        "participation_type": "实际参加", "start_date": start, "end_date": end,
+    })
+    return participation_id
+
+
+def test_incremental_allocation_matches_rebuild(db_path, daos):
+    twin_dao, state_dao = daos
+    person_id = twin_dao.create_entity_twin("person")
+    state_dao.append("person", person_id, {"name": "分摊测试"})
+    company_id = twin_dao.create_entity_twin("company")
+    item_id = twin_dao.create_entity_twin("payment_item")
+    employment_id = twin_dao.create_activity_twin(
+        "person_company_employment", {"person_id": person_id, "company_id": company_id}
+    )
+    state_dao.append("person_company_employment", employment_id, _employment(person_id, company_id, 10000.0, "2031-01-01"))
+
+    long_id = _participate(twin_dao, state_dao, person_id, item_id, "2031-01-10", "2031-04-20")
+    short_id = _participate(twin_dao, state_dao, person_id, item_id, "2031-02-01", "2031-03-31")
+    rows = _assert_matches_rebuild(db_path, person_id)
+    assert _by_month(rows, long_id) == {month: (10000.0, "salary") for month in ["2031-01", "2031-02", "2031-03", "2031-04"]}
+
+    # 调薪：自生效日起的月份按新薪资
+    state_dao.append(
+        "person_company_employment", employment_id, _employment(person_id, company_id, 20000.0, "2031-03-01", "转岗")
+    )
+    rows = _assert_matches_rebuild(db_path, person_id)
+    assert _by_month(rows, long_id)["2031-02"] == (10000.0, "salary")
+    assert _by_month(rows, long_id)["2031-03"] == (20000.0, "salary")
+
+    # 追加一个月的工资单（工资单注册表在写入事务内创建）：只有该月改取工资单
+    state_dao.append_many(
+        "person_company_payroll",
+        [({"person_id": person_id, "company_id": company_id}, {"salary_period": "2031-03", "base_amount": 15000.0}, "2031-03")],
+    )
+    rows = _assert_matches_rebuild(db_path, person_id)
+    assert _by_month(rows, short_id) == {"2031-02": (10000.0, "salary"), "2031-03": (15000.0, "payroll")}
+
+    # 工资单优先于聘用薪资：之后的调薪不影响已有工资单的月份
+    state_dao.append(
+        "person_company_employment", employment_id, _employment(person_id, company_id, 30000.0, "2031-02-01", "转岗")
+    )
+    rows = _assert_matches_rebuild(db_path, person_id)
+    assert _by_month(rows, short_id) == {"2031-02": (30000.0, "salary"), "2031-03": (15000.0, "payroll")}
+
+    # 删除参与、删除聘用
+    twin_dao.delete_twin("person_payment_participation", short_id)
+    twin_dao.delete_twin("person_company_employment", employment_id)
+    rows = _assert_matches_rebuild(db_path, person_id)
+    assert {row[0] for row in rows} == {long_id}
+    assert _by_month(rows, long_id) == {
+        "2031-01": (0.0, "none"), "2031-02": (0.0, "none"), "2031-03": (15000.0, "payroll"), "2031-04": (0.0, "none"),
+    }
@@ -0,0 +1,110 @@
+"""
+工资单级联重算：批量级联在同一快照内计算、一个事务写入；不能与增量生成同时使用；
+后续各期与逐月重新生成的结果一致；某期失败时保留此前已算完的各期
+"""
+import pytest
+
+from app.services.payroll_service import PayrollService
+
+COMPANY_ID = 4
+# 2025 个税年度的全部薪资期
+PERIODS = ["2024-12"] + [f"2025-{month:02d}" for month in range(1, 12)]
+CASCADE_FROM = PERIODS.index("2025-03")
+
+
+@pytest.fixture(scope="module")
+def service(db_path):
+    service = PayrollService(db_path=db_path)
+    for period in PERIODS:
+        result = service.generate_payroll("company", COMPANY_ID, period)
+        assert not result["errors"], result
+    return service
+
+
+def _payslips(service, person_id, company_id, start, end):
+    activity_id = service._find_payroll_activity(person_id, company_id)
+    return {
+        state.time_key: state.data
+        for state in service.state_dao.list_states_in_range("person_company_payroll", activity_id, start, end)
+    }
+
+
+def _accumulated(payslips):
+    """各期工资单中依赖此前各期的字段：累计个税、年度累计与实发"""
+    return {
+        period: {
+            key: value
+            for key, value in data.items()
+            if key.startswith(("tax_", "ytd_")) or key == "total_amount"
+        }
+        for period, data in payslips.items()
+    }
+
+
+def test_company_cascade_uses_one_snapshot(service):
+    targets = service.resolve_targets("company", COMPANY_ID)
+    result = service.generate_payroll("company", COMPANY_ID, "2025-03", cascade=True)
+
+    assert not result["errors"], result
+    assert result["generated"] == len(targets)
+    assert result["cascaded"] == (len(PERIODS) - CASCADE_FROM - 1) * len(targets)
+    for pid, cid in targets:
+        payslips = _payslips(service, pid, cid, "2025-03", PERIODS[-1])
+        assert sorted(payslips) == PERIODS[CASCADE_FROM:]
+        assert {data["snapshot_marker"] for data in payslips.values()} == {result["snapshot_marker"]}
+
+
+def test_cascade_rejects_incremental(service, client):
+    with pytest.raises(ValueError):
+        service.generate_payroll("company", COMPANY_ID, "2025-03", cascade=True, incremental=True)
+    response = client.post(
+        "/api/payroll/generate",
+        json={"period": "2025-03", "company_id": COMPANY_ID, "scope": "company", "cascade": True, "incremental": True},
+    )
+    assert response.status_code == 400
+
+
+def test_cascade_matches_month_by_month_generation(service):
+    pid, cid = service.resolve_targets("company", COMPANY_ID)[0]
+    before = _accumulated(_payslips(service, pid, cid, "2025-03", PERIODS[-1]))
+    # 三月发放奖金：本期及其后各期的累计个税都要变化
+    service.state_dao.append_many(
+        "person_company_attendance",
+        [({"person_id": pid, "company_id": cid}, {
+            "person_id": pid,
+            "company_id": cid,
+            "period": "2025-03",
+            "sick_leave_days": 0.0,
+            "personal_leave_days": 0.0,
+            "reward_punishment_amount": 50000.0,
+        }, "2025-03")],
+    )
+
+    result = service.cascade_recompute(pid, cid, "2025-03")
+    assert result == {"recomputed": PERIODS[CASCADE_FROM:], "errors": []}
+    cascaded = _accumulated(_payslips(service, pid, cid, "2025-03", PERIODS[-1]))
+    assert cascaded["2025-04"]["tax_cumulative"] != before["2025-04"]["tax_cumulative"]
+
+    for period in PERIODS[CASCADE_FROM:]:
+        assert service.generate_payroll_for_one(pid, cid, period) is None
+    assert cascaded == _accumulated(_payslips(service, pid, cid, "2025-03", PERIODS[-1]))
+
+
+def test_cascade_failure_keeps_months_computed_before(service, monkeypatch):
+    pid, cid = service.resolve_targets("company", COMPANY_ID)[1]
+    build = service._build_payroll_state_data
+
+    def failing_build(person_id, company_id, period, **kwargs):
+        if period == "2025-05":
+            raise RuntimeError("缺少五月考勤")
+        return build(person_id, company_id, period, **kwargs)
+
+    monkeypatch.setattr(service, "_build_payroll_state_data", failing_build)
+    result = service.cascade_recompute(pid, cid, "2025-03")
+
+    assert result["recomputed"] == ["2025-03", "2025-04"]
+    assert [error["period"] for error in result["errors"]] == PERIODS[PERIODS.index("2025-05"):]
+    assert all(error["person_id"] == pid and error["company_id"] == cid for error in result["errors"])
+    assert result["errors"][0]["reason"] == "缺少五月考勤"
+    markers = {period: data["snapshot_marker"] for period, data in _payslips(service, pid, cid, "2025-03", "2025-05").items()}
+    assert markers["2025-03"] == markers["2025-04"] != markers["2025-05"]
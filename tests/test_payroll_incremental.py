@@ -0,0 +1,72 @@
+"""
+增量生成工资单：按输入指纹只重算输入变化的人员——改一条考勤只重算该人，配置 YAML 变化时全部重算
+"""
+import shutil
+
+import pytest
+
+from app.services import payroll_engine
+from app.services.payroll_service import PayrollService
+
+COMPANY_ID = 4
+PERIOD = "2025-03"
+
+
+@pytest.fixture(scope="module")
+def service(db_path):
+    service = PayrollService(db_path=db_path)
+    result = service.generate_payroll("company", COMPANY_ID, PERIOD)
+    assert not result["errors"], result
+    return service
+
+
+def _payslip(service, person_id, company_id):
+    activity_id = service._find_payroll_activity(person_id, company_id)
+    return service.state_dao.get_state_by_time_key("person_company_payroll", activity_id, PERIOD).data
+
+
+def _incremental(service):
+    result = service.generate_payroll("company", COMPANY_ID, PERIOD, incremental=True)
+    assert not result["errors"], result
+    return result
+
+
+def test_unchanged_inputs_are_skipped(service):
+    targets = service.resolve_targets("company", COMPANY_ID)
+    result = _incremental(service)
+    assert (result["recomputed"], result["skipped"]) == (0, len(targets))
+
+
+def test_attendance_edit_recomputes_only_that_person(service):
+    targets = service.resolve_targets("company", COMPANY_ID)
+    pid, cid = targets[0]
+    before = {target: _payslip(service, *target)["snapshot_marker"] for target in targets}
+    service.state_dao.append_many(
+        "person_company_attendance",
+        [({"person_id": pid, "company_id": cid}, {
+            "person_id": pid, "company_id": cid, "period": PERIOD,
+            "sick_leave_days": 0.0, "personal_leave_days": 0.0, "reward_punishment_amount": 800.0,
+        }, PERIOD)],
+    )
+
+    result = _incremental(service)
+    assert (result["recomputed"], result["skipped"]) == (1, len(targets) - 1)
+    assert _payslip(service, pid, cid)["reward_punishment_amount"] == 800.0
+    changed = {target for target in targets if _payslip(service, *target)["snapshot_marker"] != before[target]}
+    assert changed == {(pid, cid)}
+    # 重算后补写了新指纹，再次增量生成全部跳过
+    assert _incremental(service)["recomputed"] == 0
+
+
+def test_config_yaml_change_recomputes_everyone(service, tmp_path, monkeypatch):
+    targets = service.resolve_targets("company", COMPANY_ID)
+    config_dir = tmp_path / "config"
+    shutil.copytree(payroll_engine._CONFIG_DIR, config_dir)
+    monkeypatch.setattr(payroll_engine, "_CONFIG_DIR", config_dir)
+    # 内容相同的配置不影响指纹
+    assert _incremental(service)["recomputed"] == 0
+
+    brackets = config_dir / "income_tax_brackets.yaml"
+    brackets.write_text(brackets.read_text(encoding="utf-8") + "\n# 调整\n", encoding="utf-8")
+    result = _incremental(service)
+    assert (result["recomputed"], result["skipped"]) == (len(targets), 0)
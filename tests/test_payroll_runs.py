@@ -0,0 +1,87 @@
+"""
+异步工资单任务：认领互斥、心跳超时后重新认领、从检查点续跑、失去认领的 worker 不再写入
+"""
+import sqlite3
+
+import pytest
+
+from app.daos.payroll_run_dao import RUN_COMPLETED, RUN_PENDING, RUN_RUNNING
+from app.services.payroll_run_service import RUN_STALE_SECONDS, PayrollRunService
+
+COMPANY_ID = 4
+PERIOD = "2025-03"
+
+
+@pytest.fixture
+def service(db_path):
+    return PayrollRunService(db_path=db_path)
+
+
+def _create_run(service):
+    run = service.create_run("company", COMPANY_ID, PERIOD)
+    assert run["status"] == RUN_PENDING and run["total"] >= 3
+    return run["id"]
+
+
+def _expire_heartbeat(db_path, run_id):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE payroll_run SET heartbeat_at = '2000-01-01T00:00:00' WHERE id = ?", (run_id,))
+
+
+def _claim(service, worker):
+    return service.run_dao.claim_next_run(worker, RUN_STALE_SECONDS)
+
+
+def test_run_is_claimed_once_until_heartbeat_goes_stale(service, db_path):
+    run_id = _create_run(service)
+    claimed = _claim(service, "worker-a")
+    assert claimed["id"] == run_id and claimed["status"] == RUN_RUNNING
+    assert _claim(service, "worker-b") is None
+
+    _expire_heartbeat(db_path, run_id)
+    reclaimed = _claim(service, "worker-b")
+    assert reclaimed["id"] == run_id and reclaimed["worker"] == "worker-b"
+
+    # 原 worker 的心跳、检查点、结束状态都不再生效
+    assert not service.run_dao.heartbeat(run_id, "worker-a")
+    assert not service.run_dao.record_progress(run_id, "worker-a", 1, 1)
+    assert not service.run_dao.finish_run(run_id, "worker-a", RUN_COMPLETED)
+    run = service.get_run(run_id)
+    assert (run["status"], run["done"], run["worker"]) == (RUN_RUNNING, 0, "worker-b")
+
+    service.execute_run(reclaimed)
+    assert service.get_run(run_id)["status"] == RUN_COMPLETED
+
+
+def test_reclaimed_run_resumes_from_checkpoint(service, db_path, monkeypatch):
+    run_id = _create_run(service)
+    claimed = _claim(service, "worker-a")
+    targets = claimed["targets"]
+    assert service.run_dao.record_progress(run_id, "worker-a", 2, 2)
+    _expire_heartbeat(db_path, run_id)  # worker-a 崩溃
+
+    generated = []
+    original = service.payroll_service.generate_payroll_for_one
+
+    def _generate(pid, cid, period):
+        generated.append([pid, cid])
+        return original(pid, cid, period)
+
+    monkeypatch.setattr(service.payroll_service, "generate_payroll_for_one", _generate)
+    service.execute_run(_claim(service, "worker-b"))
+
+    assert generated == [list(t) for t in targets[2:]]
+    run = service.get_run(run_id)
+    assert (run["status"], run["done"], run["generated"]) == (RUN_COMPLETED, len(targets), len(targets))
+
+
+def test_worker_that_lost_the_run_stops_without_writing(service, db_path):
+    run_id = _create_run(service)
+    stale = _claim(service, "worker-a")
+    _expire_heartbeat(db_path, run_id)
+    _claim(service, "worker-b")
+
+    service.execute_run(stale)  # 第一个检查点即被拒绝
+
+    run = service.get_run(run_id)
+    assert (run["status"], run["done"], run["worker"]) == (RUN_RUNNING, 0, "worker-b")
@@ -0,0 +1,47 @@
+"""
+ytd_total_* 累计字段修复：原地改写，不新增状态行、不影响后续各期的输入指纹与分析缓存令牌
+"""
+import json
+import sqlite3
+
+from app.daos.twins.change_dao import twin_change_token
+from app.services.payroll_engine import ytd_accumulator_key
+from app.services.payroll_service import PayrollService
+
+COMPANY_ID = 4
+PERIODS = ["2025-01", "2025-02", "2025-03"]
+
+
+def _states(db_path):
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT id, twin_id, time_key, data FROM person_company_payroll_history ORDER BY id"
+        ).fetchall()
+    return [(state_id, twin_id, time_key, json.loads(data)) for state_id, twin_id, time_key, data in rows]
+
+
+def _change_token(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return twin_change_token(conn.cursor(), ["person_company_payroll"])
+
+
+def test_rebuild_ytd_rewrites_in_place(db_path):
+    service = PayrollService(db_path=db_path)
+    for period in PERIODS:
+        assert not service.generate_payroll("company", COMPANY_ID, period)["errors"]
+    before = _states(db_path)
+    token = _change_token(db_path)
+
+    # 2 月工资单的某个累计字段被改坏
+    key = ytd_accumulator_key(sorted(set(service.engine.ytd_sum_sources().values()))[0])
+    pid, cid = service.resolve_targets("company", COMPANY_ID)[0]
+    activity_id = service._find_payroll_activity(pid, cid)
+    assert service.state_dao.set_time_series_field("person_company_payroll", activity_id, key, {"2025-02": -1})
+
+    result = service.rebuild_ytd_accumulators(COMPANY_ID, 2025)
+
+    assert result["updated"] == 1
+    assert _states(db_path) == before  # 状态行 id 与内容都恢复原样
+    assert _change_token(db_path) == token
+    incremental = service.generate_payroll("company", COMPANY_ID, "2025-03", incremental=True)
+    assert incremental["recomputed"] == 0
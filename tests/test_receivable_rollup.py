@@ -0,0 +1,117 @@
+"""
+rollup_receivable：款项、合同、项目-款项关联变化时增量维护的汇总与全量重建一致
+"""
+import sqlite3
+
+import pytest
+
+from app.daos.twins.rollup_dao import RECEIVABLE_ROLLUP_TABLE, ReceivableRollupDAO
+from app.daos.twins.state_dao import TwinStateDAO
+from app.daos.twins.twin_dao import TwinDAO
+
+
+@pytest.fixture(scope="module")
+def daos(db_path):
+    return TwinDAO(db_path=db_path), TwinStateDAO(db_path=db_path)
+
+
+def _rollup_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            f"""
+            SELECT basis, month, status, client_company, internal_project_id, amount, item_count
+            FROM {RECEIVABLE_ROLLUP_TABLE}
+            ORDER BY basis, month, status, client_company, internal_project_id
+            """
+        ).fetchall()
+
+
+def _assert_matches_rebuild(db_path):
+    incremental = _rollup_rows(db_path)
+    ReceivableRollupDAO(db_path=db_path).rebuild()
+    rebuilt = _rollup_rows(db_path)
+
+    assert [row[:5] + row[6:] for row in incremental] == [row[:5] + row[6:] for row in rebuilt]
+    for inc, full in zip(incremental, rebuilt):
+        assert inc[5] == pytest.approx(full[5], abs=1e-6), inc[:5]
+
+
+def _contract(twin_dao, state_dao, client_company):
+    contract_id = twin_dao.create_entity_twin("client_contract")
+    state_dao.append("client_contract", contract_id, {
+        "contract_name": f"汇总测试 {client_company}", "client_company": client_company,
+        "contract_amount": 1000, "contract_type": "专项", "status": "执行中",
+    })
+    return contract_id
+
+
+def _item_data(contract_id, amount, status="待付款", planned="2030-01-15", actual=None):
+    data = {
+        "client_contract_id": contract_id, "period": "测试款", "amount": amount,
+        "status": status, "planned_payment_date": planned,
+    }
+    if actual:
+        data["actual_payment_date"] = actual
+    return data
+
+
+def _item(twin_dao, state_dao, contract_id, amount):
+    item_id = twin_dao.create_entity_twin("payment_item")
+    state_dao.append("payment_item", item_id, _item_data(contract_id, amount))
+    return item_id
+
+
+def _link(twin_dao, state_dao, project_id, item_id):
+    link_id = twin_dao.create_activity_twin(
+        "internal_project_payment", {"internal_project_id": project_id, "payment_item_id": item_id}
+    )
+    state_dao.append("internal_project_payment", link_id, {"internal_project_id": project_id, "payment_item_id": item_id})
+    return link_id
+
+
+def test_incremental_rollup_matches_rebuild(db_path, daos):
+    twin_dao, state_dao = daos
+    projects = [twin_dao.create_entity_twin("internal_project") for _ in range(3)]
+    contract_a = _contract(twin_dao, state_dao, "汇总客户甲")
+    contract_b = _contract(twin_dao, state_dao, "汇总客户乙")
+
+    # 金额在多个项目关联间均分：每新增一个关联，已有关联的份额都要变化
+    split = _item(twin_dao, state_dao, contract_a, 100.0)
+    links = [_link(twin_dao, state_dao, project_id, split) for project_id in projects]
+    _assert_matches_rebuild(db_path)
+
+    # 款项新版本：付款后同时计入 actual 口径
+    state_dao.append("payment_item", split, _item_data(contract_a, 100.0, "已付款", actual="2030-02-03"))
+    # 款项改挂到另一合同、合同更换客户公司
+    moved = _item(twin_dao, state_dao, contract_a, 250.0)
+    _link(twin_dao, state_dao, projects[0], moved)
+    state_dao.append("payment_item", moved, _item_data(contract_b, 250.0))
+    state_dao.append("client_contract", contract_a, {
+        "contract_name": "汇总测试 汇总客户甲", "client_company": "汇总客户丙",
+        "contract_amount": 1000, "contract_type": "专项", "status": "执行中",
+    })
+    _assert_matches_rebuild(db_path)
+
+    # 批量追加多个款项
+    batch = [twin_dao.create_entity_twin("payment_item") for _ in range(2)]
+    state_dao.append_many(
+        "payment_item",
+        [(item_id, _item_data(contract_b, 70.0, planned="2030-03-01"), None) for item_id in batch],
+    )
+    # 删除一个关联（其余关联的份额变大）与一个款项
+    twin_dao.delete_twin("internal_project_payment", links[0])
+    twin_dao.delete_twin("payment_item", batch[0])
+    _assert_matches_rebuild(db_path)
+
+
+def test_float_drift_stays_within_tolerance(db_path, daos):
+    twin_dao, state_dao = daos
+    contract_id = _contract(twin_dao, state_dao, "汇总客户丁")
+    item_id = _item(twin_dao, state_dao, contract_id, 0.1)
+    for _ in range(3):
+        _link(twin_dao, state_dao, twin_dao.create_entity_twin("internal_project"), item_id)
+    # 三等分的 0.1 反复减去、加回
+    for index in range(50):
+        amount = 0.1 if index % 2 else 0.7
+        state_dao.append("payment_item", item_id, _item_data(contract_id, amount, planned=f"2031-{index % 12 + 1:02d}-01"))
+    _assert_matches_rebuild(db_path)
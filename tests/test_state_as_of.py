@@ -0,0 +1,70 @@
+"""
+TwinStateDAO.get_as_of：按生效日期取单条（走表达式索引），兼容未补零与缺失的日期
+"""
+import pytest
+
+from app.daos.twins.state_dao import TwinStateDAO
+from app.daos.twins.twin_dao import TwinDAO
+
+
+@pytest.fixture(scope="module")
+def daos(db_path):
+    return TwinDAO(db_path=db_path), TwinStateDAO(db_path=db_path)
+
+
+def _new_person(twin_dao, state_dao):
+    person_id = twin_dao.create_entity_twin("person")
+    state_dao.append("person", person_id, {"name": f"as-of {person_id}"})
+    return person_id
+
+
+def _assessment(twin_dao, state_dao, person_id, *versions):
+    twin_id = twin_dao.create_activity_twin("person_assessment", {"person_id": person_id})
+    for date, grade in versions:
+        state_dao.append(
+            "person_assessment", twin_id, {"assessment_period": "2024", "assessment_date": date, "grade": grade}
+        )
+    return twin_id
+
+
+def _grade(state_dao, as_of, **kwargs):
+    state = state_dao.get_as_of("person_assessment", "assessment_date", as_of, **kwargs)
+    return state.data["grade"] if state else None
+
+
+def test_version_history_beyond_one_hundred_versions(daos):
+    twin_dao, state_dao = daos
+    person_id = _new_person(twin_dao, state_dao)
+    versions = [(f"2020-{month:02d}-{day:02d}", "C") for month in range(1, 13) for day in range(1, 12)]
+    twin_id = _assessment(twin_dao, state_dao, person_id, *versions, ("2024-6-1", "A"), ("2024-06-01", "B"))
+
+    assert _grade(state_dao, "2024-05-31", twin_id=twin_id) == "C"
+    # 未补零的日期参与比较；同一生效日期取版本较新的一条
+    assert _grade(state_dao, "2024-06-30", twin_id=twin_id) == "B"
+    state_dao.append("person_assessment", twin_id, {"assessment_period": "2024", "assessment_date": "2024-6-1", "grade": "A"})
+    assert _grade(state_dao, "2024-06-30", twin_id=twin_id) == "A"
+    assert _grade(state_dao, "2019-12-31", twin_id=twin_id) is None
+
+
+def test_missing_date_is_earliest_unless_latest_only(daos):
+    twin_dao, state_dao = daos
+    person_id = _new_person(twin_dao, state_dao)
+    twin_id = _assessment(twin_dao, state_dao, person_id, ("", "D"))
+
+    assert _grade(state_dao, "2024-01-01", twin_id=twin_id) == "D"
+    assert _grade(state_dao, "2024-01-01", twin_id=twin_id, latest_only=True) is None
+
+
+def test_all_matching_twins_form_one_timeline(daos):
+    twin_dao, state_dao = daos
+    person_id = _new_person(twin_dao, state_dao)
+    _assessment(twin_dao, state_dao, person_id, ("2024-03-01", "B"), ("2024-09-01", "C"))
+    _assessment(twin_dao, state_dao, person_id, ("2024-6-15", "A"))
+    filters = {"person_id": person_id}
+
+    # 所有版本：取各 Twin 中生效日期 ≤ as_of 的最新一条，而不是只看第一个 Twin
+    assert _grade(state_dao, "2024-07-01", related_filters=filters) == "A"
+    assert _grade(state_dao, "2024-09-30", related_filters=filters) == "C"
+    # latest_only：只比较各 Twin 的最新状态（第一个 Twin 的 2024-03-01 版本不再参与）
+    assert _grade(state_dao, "2024-07-01", related_filters=filters, latest_only=True) == "A"
+    assert _grade(state_dao, "2024-05-01", related_filters=filters, latest_only=True) is None
@@ -0,0 +1,66 @@
+"""
+twin_facet：追加状态 / 删除 Twin 时增量维护的分面计数与全量重算一致
+"""
+import sqlite3
+
+import pytest
+
+from app.daos.twins.facet_dao import TWIN_FACET_TABLE, TwinFacetDAO
+from app.daos.twins.state_dao import TwinStateDAO
+from app.daos.twins.twin_dao import TwinDAO
+from app.services.facet_service import FacetService
+
+
+@pytest.fixture(scope="module")
+def daos(db_path):
+    return TwinDAO(db_path=db_path), TwinStateDAO(db_path=db_path), TwinFacetDAO(db_path=db_path)
+
+
+def _facet_rows(db_path, twin_name):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(
+            conn.execute(
+                f"SELECT field, value, count FROM {TWIN_FACET_TABLE} WHERE twin_name = ?", (twin_name,)
+            ).fetchall()
+        )
+
+
+def _assessment(grade, date="2024-06-30"):
+    return {"assessment_period": "2024", "assessment_date": date, "grade": grade}
+
+
+def test_incremental_counts_match_rebuild(db_path, daos):
+    twin_dao, state_dao, facet_dao = daos
+    person_id = twin_dao.create_entity_twin("person")
+    state_dao.append("person", person_id, {"name": "facet"})
+
+    created = [twin_dao.create_activity_twin("person_assessment", {"person_id": person_id}) for _ in range(4)]
+    for twin_id, grade in zip(created, ["A", "B", "B", "C"]):
+        state_dao.append("person_assessment", twin_id, _assessment(grade))
+    # 新版本改变取值、同取值的新版本、批量追加、删除 Twin
+    state_dao.append("person_assessment", created[0], _assessment("E", "2024-12-31"))
+    state_dao.append("person_assessment", created[1], _assessment("B", "2024-12-31"))
+    state_dao.append_many(
+        "person_assessment",
+        [(created[2], _assessment("A", "2025-01-31"), None), (created[3], _assessment("D", "2025-01-31"), None)],
+    )
+    twin_dao.delete_twin("person_assessment", created[1])
+
+    incremental = _facet_rows(db_path, "person_assessment")
+    total, counts = facet_dao.get_counts("person_assessment")
+    facet_dao.rebuild("person_assessment")
+
+    assert incremental == _facet_rows(db_path, "person_assessment")
+    with sqlite3.connect(db_path) as conn:
+        assert total == conn.execute("SELECT COUNT(DISTINCT twin_id) FROM person_assessment_history").fetchone()[0]
+    assert facet_dao.get_counts("person_assessment") == (total, counts)
+
+
+def test_unfiltered_total_matches_bitset_universe(db_path, daos):
+    service = FacetService(db_path=db_path)
+    unfiltered = service.get_facets("person_assessment")
+    grades = unfiltered["facets"]["grade"]["counts"]
+
+    assert sum(grades.values()) == unfiltered["total"]
+    for grade, count in grades.items():
+        assert service.get_facets("person_assessment", {"grade": grade})["total"] == count
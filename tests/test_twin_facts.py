@@ -0,0 +1,85 @@
+"""
+fact_*：追加状态、原地改写时间序列字段、删除 Twin 时刷新的事实行与全量重建一致
+"""
+import sqlite3
+
+import pytest
+
+from app.daos.twins.fact_dao import TwinFactDAO
+from app.daos.twins.state_dao import TwinStateDAO
+from app.daos.twins.twin_dao import TwinDAO
+
+
+@pytest.fixture(scope="module")
+def daos(db_path):
+    return TwinDAO(db_path=db_path), TwinStateDAO(db_path=db_path), TwinFactDAO(db_path=db_path)
+
+
+def _fact_rows(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+
+
+def _assert_matches_rebuild(db_path, fact_dao, twin_name, table):
+    incremental = _fact_rows(db_path, table)
+    fact_dao.rebuild(twin_name)
+    assert incremental == _fact_rows(db_path, table)
+    return incremental
+
+
+def _item_data(amount, status="待付款", actual=None):
+    return {
+        "client_contract_id": 1, "period": "事实测试", "amount": amount, "status": status,
+        "planned_payment_date": "2030-05-01", "actual_payment_date": actual,
+    }
+
+
+def test_versioned_fact_rows_match_rebuild(db_path, daos):
+    twin_dao, state_dao, fact_dao = daos
+    items = [twin_dao.create_entity_twin("payment_item") for _ in range(3)]
+    state_dao.append("payment_item", items[0], _item_data(100.0))
+    state_dao.append("payment_item", items[0], _item_data(120.0, "已付款", "2030-05-03"))
+    state_dao.append_many("payment_item", [(item_id, _item_data(50.0), None) for item_id in items[1:]])
+    state_dao.append_many("payment_item", [(items[1], _item_data(55.0), None), (items[1], _item_data(60.0), None)])
+    twin_dao.delete_twin("payment_item", items[2])
+
+    rows = _assert_matches_rebuild(db_path, fact_dao, "payment_item", "fact_payment_item")
+    by_id = {row[0]: row for row in rows}
+    assert by_id[items[0]][3:5] == (120.0, "已付款") and by_id[items[1]][3] == 60.0
+    assert items[2] not in by_id
+
+
+def test_time_series_fact_rows_match_rebuild(db_path, daos):
+    twin_dao, state_dao, fact_dao = daos
+    person_id = twin_dao.create_entity_twin("person")
+    company_id = twin_dao.create_entity_twin("company")
+    key = {"person_id": person_id, "company_id": company_id}
+
+    state_dao.append_many("person_company_payroll", [
+        (key, {"salary_period": period, "status": "待发放", "base_amount": 1000.0, "total_amount": 900.0}, period)
+        for period in ("2030-01", "2030-02", "2030-03")
+    ])
+    # 同一期重新生成
+    state_dao.append_many(
+        "person_company_payroll",
+        [(key, {"salary_period": "2030-02", "status": "待发放", "base_amount": 1100.0, "total_amount": 990.0}, "2030-02")],
+    )
+    rows = _assert_matches_rebuild(db_path, fact_dao, "person_company_payroll", "fact_payroll")
+
+    with sqlite3.connect(db_path) as conn:
+        payroll_id = conn.execute(
+            "SELECT id FROM person_company_payroll_activities WHERE person_id = ? AND company_id = ?",
+            (person_id, company_id),
+        ).fetchone()[0]
+    assert sorted(row[1] for row in rows if row[0] == payroll_id) == ["2030-01", "2030-02", "2030-03"]
+
+    # 原地改写事实列（status）与非事实列（input_fingerprint）
+    state_dao.set_time_series_fields(
+        "person_company_payroll", payroll_id,
+        {"2030-01": {"status": "已发放"}, "2030-03": {"input_fingerprint": "x"}},
+    )
+    _assert_matches_rebuild(db_path, fact_dao, "person_company_payroll", "fact_payroll")
+
+    twin_dao.delete_twin("person_company_payroll", payroll_id)
+    rows = _assert_matches_rebuild(db_path, fact_dao, "person_company_payroll", "fact_payroll")
+    assert payroll_id not in {row[0] for row in rows}
@@ -0,0 +1,85 @@
+"""
+twin_interval：追加版本时增量截断的区间行与按版本历史全量重建一致
+"""
+import sqlite3
+
+import pytest
+
+from app.daos.twins.interval_dao import TWIN_INTERVAL_TABLE, rebuild_twin_intervals
+from app.daos.twins.state_dao import TwinStateDAO
+from app.daos.twins.twin_dao import TwinDAO
+
+TWIN_NAME = "person_company_employment"
+
+
+@pytest.fixture(scope="module")
+def daos(db_path):
+    return TwinDAO(db_path=db_path), TwinStateDAO(db_path=db_path)
+
+
+def _interval_rows(db_path, twin_id):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            f"""
+            SELECT state_id, field, valid_from, valid_to, value FROM {TWIN_INTERVAL_TABLE}
+            WHERE twin_name = ? AND twin_id = ?
+            ORDER BY state_id, field
+            """,
+            (TWIN_NAME, twin_id),
+        ).fetchall()
+
+
+def _assert_matches_rebuild(db_path, twin_dao, twin_id):
+    incremental = _interval_rows(db_path, twin_id)
+    with sqlite3.connect(db_path) as conn:
+        rebuild_twin_intervals(conn.cursor(), twin_dao._get_twin_schema(TWIN_NAME), twin_id)
+        conn.commit()
+    assert incremental == _interval_rows(db_path, twin_id)
+    return incremental
+
+
+def _periods(rows):
+    """各版本的 (valid_from, valid_to)，按状态行 id 顺序"""
+    return [(valid_from, valid_to) for _, field, valid_from, valid_to, _ in rows if field == "salary"]
+
+
+def _version(person_id, company_id, salary, effective_date, change_type="转岗"):
+    return {
+        "person_id": person_id, "company_id": company_id,
+        "salary_type": "月薪", "salary": salary,
+        "change_type": change_type, "change_date": effective_date, "effective_date": effective_date,
+    }
+
+
+def test_incremental_intervals_match_rebuild(db_path, daos):
+    twin_dao, state_dao = daos
+    person_id = twin_dao.create_entity_twin("person")
+    company_id = twin_dao.create_entity_twin("company")
+    twin_id = twin_dao.create_activity_twin(TWIN_NAME, {"person_id": person_id, "company_id": company_id})
+
+    state_dao.append(TWIN_NAME, twin_id, _version(person_id, company_id, 10000.0, "2024-01-01", "入职"))
+    state_dao.append(TWIN_NAME, twin_id, _version(person_id, company_id, 12000.0, "2024-07-01"))
+    assert _periods(_assert_matches_rebuild(db_path, twin_dao, twin_id)) == [
+        ("2024-01-01", "2024-07-01"), ("2024-07-01", None),
+    ]
+
+    # 补录较早生效的版本：只截断相邻的前一版本，并接上后一版本的生效日期
+    state_dao.append(TWIN_NAME, twin_id, _version(person_id, company_id, 11000.0, "2024-3-15"))
+    assert _periods(_assert_matches_rebuild(db_path, twin_dao, twin_id)) == [
+        ("2024-01-01", "2024-03-15"), ("2024-07-01", None), ("2024-03-15", "2024-07-01"),
+    ]
+
+    # 同一生效日期的新版本覆盖较早写入者（后者得到空区间）
+    state_dao.append(TWIN_NAME, twin_id, _version(person_id, company_id, 12500.0, "2024-07-01"))
+    periods = _periods(_assert_matches_rebuild(db_path, twin_dao, twin_id))
+    assert periods[1] == ("2024-07-01", "2024-07-01") and periods[-1] == ("2024-07-01", None)
+
+    # 早于所有版本的补录、缺失生效日期的版本、批量追加
+    state_dao.append(TWIN_NAME, twin_id, _version(person_id, company_id, 9000.0, "2023-06-01", "入职"))
+    state_dao.append_many(TWIN_NAME, [
+        (twin_id, _version(person_id, company_id, 8000.0, None), None),
+        (twin_id, _version(person_id, company_id, 13000.0, "2024-03-15"), None),
+        (twin_id, _version(person_id, company_id, 15000.0, "2025-01-01"), None),
+    ])
+    periods = _periods(_assert_matches_rebuild(db_path, twin_dao, twin_id))
+    assert periods[-3:] == [("", "2023-06-01"), ("2024-03-15", "2024-07-01"), ("2025-01-01", None)]
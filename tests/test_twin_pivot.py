@@ -0,0 +1,38 @@
+"""
+时间序列 Twin 透视：Twin × 期数稠密矩阵，关联实体名称与矩阵取自同一快照
+"""
+import pytest
+
+from app.services.payroll_service import PayrollService
+from app.services.twin_service import TwinService
+
+COMPANY_ID = 4
+
+
+def test_pivot_payslips(db_path):
+    payroll = PayrollService(db_path=db_path)
+    for period in ("2025-01", "2025-03"):
+        assert not payroll.generate_payroll("company", COMPANY_ID, period)["errors"]
+    targets = payroll.resolve_targets("company", COMPANY_ID)
+
+    pivot = TwinService(db_path=db_path).pivot_time_series(
+        "person_company_payroll", "2025-01", "2025-03", fields=["total_amount"],
+        related_filters={"company_id": COMPANY_ID},
+    )
+
+    assert pivot["periods"] == ["2025-01", "2025-02", "2025-03"]
+    rows = pivot["rows"]
+    assert sorted(rows["person_id"]) == sorted(pid for pid, _ in targets)
+    assert all(rows["person_name"]) and set(rows["company_id"]) == {COMPANY_ID}
+    for person_id, amounts in zip(rows["person_id"], pivot["values"]["total_amount"]):
+        jan, feb, mar = amounts
+        assert feb is None and jan is not None and mar is not None
+        activity_id = payroll._find_payroll_activity(person_id, COMPANY_ID)
+        state = payroll.state_dao.list_states_in_range("person_company_payroll", activity_id, "2025-03", "2025-03")[0]
+        assert mar == state.data["total_amount"]
+
+
+@pytest.mark.parametrize("start, end", [("2025-1", "2025-03"), ("2025-03", "2025-01"), ("2000-01", "2020-01")])
+def test_pivot_rejects_bad_ranges(db_path, start, end):
+    with pytest.raises(ValueError):
+        TwinService(db_path=db_path).pivot_time_series("person_company_payroll", start, end)